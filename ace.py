@@ -1,8 +1,16 @@
+import argparse
+import ast
 import asyncio
+import atexit
+import importlib
 import json
 import logging.handlers
 import os
+import signal
+import sys
+from collections import OrderedDict
 from datetime import datetime
+from time import perf_counter
 
 import aiohttp
 import asyncpg
@@ -10,11 +18,25 @@ import coloredlogs
 from discord.ext import commands
 
 from config import *
+from utils.actionscheduler import ActionScheduler
 from utils.commanderrorlogic import CommandErrorLogic
+from utils.cluster import ClusterIPC, IPCUnavailable
+from utils.commandlog import CommandLogBuffer
+from utils.configsync import ConfigSync
 from utils.configtable import ConfigTable
 from utils.context import AceContext
 from utils.guildconfigrecord import GuildConfigRecord
+from utils.fastruntime import Runtime, enable_fast_runtime
 from utils.help import EditedMinimalHelpCommand, PaginatedHelpCommand
+from utils.loopmonitor import LoopMonitor
+from utils.memberpolicy import MemberPolicy
+from utils.messagecache import PolicyConnectionState
+from utils.metrics import (
+	COMMAND_LATENCY, COMMANDS, GATEWAY_EVENTS, HTTP_LATENCY, HTTP_REQUESTS, MetricsServer, install_bot_metrics
+)
+from utils.querystats import QueryStats, current_command
+from utils.queuelogging import DroppingQueueHandler
+from utils.webclient import WebClient
 from utils.string import po
 from utils.time import pretty_seconds
 
@@ -39,17 +61,46 @@ EXTENSIONS = (
 	'cogs.owner',
 )
 
+# loaded on their first command (or a minute after ready) instead of at startup.
+# only put extensions here that don't need to hear events from the start
+DEFERRED_EXTENSIONS = (
+	'cogs.meta',
+	'cogs.whois',
+)
+
+# imports from these are our own and are left to the extension loading itself
+LOCAL_PACKAGES = ('cogs', 'utils', 'config', 'ids')
 
-class AceBot(commands.Bot):
+DEFERRED_LOAD_DELAY = 60.0
+
+# opt-in, configs from before the metrics server don't have it
+METRICS_PORT = globals().get('METRICS_PORT')
+
+
+class AceBot(commands.AutoShardedBot):
 	support_link = 'https://discord.gg/X7abzRe'
 
 	ready: asyncio.Event
 	aiohttp: aiohttp.ClientSession
+	web: WebClient
 	db: asyncpg.pool
 	config: ConfigTable
+	config_sync: ConfigSync
+	command_log: CommandLogBuffer
+	ipc: ClusterIPC
+	query_stats: QueryStats
+	metrics_server: MetricsServer
+	loop_monitor: LoopMonitor
 	startup_time: datetime
 
-	def __init__(self, db, **kwargs):
+	def __init__(self, db, query_stats=None, runtime=None, lazy_members=False, cluster_id=None, cluster_count=1, **kwargs):
+		if lazy_members:
+			# members are chunked per guild by the member policy instead
+			kwargs.update(
+				chunk_guilds_at_startup=False,
+				member_cache_flags=MemberPolicy.cache_flags(kwargs['intents']),
+			)
+
 		super().__init__(
 			command_prefix=self.prefix_resolver,
 			owner_id=OWNER_ID,
@@ -61,13 +112,42 @@ class AceBot(commands.Bot):
 		)
 
 		self.db = db
-		self.config = ConfigTable(self, table='config', primary='guild_id', record_class=GuildConfigRecord)
+		self.query_stats = query_stats
+		self.runtime = runtime or Runtime()
+		self.member_policy = MemberPolicy(self, lazy=lazy_members)
+		self.actions = ActionScheduler(self.loop, self.http)
+		self.config = ConfigTable(self, table='config', primary='guild_id', record_class=GuildConfigRecord, preload=True)
+		self.config_sync = ConfigSync(self, DB_BIND)
+		self.command_log = CommandLogBuffer(self)
+
+		# cluster_id is None when running as a single process
+		self.cluster_id = cluster_id
+		self.cluster_count = cluster_count
+		self.ipc = None if cluster_id is None else ClusterIPC(self, DB_BIND, cluster_id, cluster_count)
+		self.ipc_handlers = dict(stats=self._ipc_stats, reload=self._ipc_reload, status=self._ipc_status)
+
+		if self.ipc is not None:
+			for name, handler in self.ipc_handlers.items():
+				self.ipc.register(name, handler)
 
 		self.ready = asyncio.Event()
 		self.startup_time = datetime.utcnow()
 
+		# each cluster serves metrics on its own port
+		self.metrics_server = None
+		if METRICS_PORT is not None:
+			self.metrics_server = MetricsServer('127.0.0.1', METRICS_PORT + (cluster_id or 0))
+
+		install_bot_metrics(self)
+
+		# started by setup() so it sees every task the bot creates
+		self.loop_monitor = LoopMonitor(self.loop)
+
 		aiohttp_log = logging.getLogger('aiotrace')
 
+		async def on_request_start(session, ctx, start):
+			ctx.started_at = perf_counter()
+
 		async def on_request_end(session, ctx, end):
 			resp = end.response
 			aiohttp_log.info(
@@ -75,17 +155,39 @@ class AceBot(commands.Bot):
 				str(resp.status), resp.reason, end.method.upper(), end.url, resp.content_type
 			)
 
+			HTTP_REQUESTS.inc(host=end.url.host, status=resp.status)
+			HTTP_LATENCY.observe(perf_counter() - ctx.started_at, host=end.url.host)
+
+		async def on_request_exception(session, ctx, exc):
+			HTTP_REQUESTS.inc(host=exc.url.host, status='error')
+			HTTP_LATENCY.observe(perf_counter() - ctx.started_at, host=exc.url.host)
+
 		trace_config = aiohttp.TraceConfig()
+		trace_config.on_request_start.append(on_request_start)
 		trace_config.on_request_end.append(on_request_end)
+		trace_config.on_request_exception.append(on_request_exception)
 
 		self.aiohttp = aiohttp.ClientSession(
 			loop=self.loop,
 			timeout=aiohttp.ClientTimeout(total=5),
 			trace_configs=[trace_config],
+			**self.runtime.session_kwargs()
 		)
 
+		# cached, retrying requests on top of the session
+		self.web = WebClient(self.aiohttp)
+
 		self.modified_times = dict()
 
+		# work cogs started from cog_unload, which shutdown waits for
+		self.unload_tasks = set()
+		self.deferred_extensions = set(DEFERRED_EXTENSIONS)
+
+		# how long each extension and startup step took, in seconds
+		self.extension_times = OrderedDict()
+		self.startup_times = OrderedDict()
+		self.connected_at = None
+
 		# help command. this is messy but it has to be because the lib doesn't really like you having
 		# two different help commands. maybe I will see if I can clean this up in the future
 		self.static_help_command = self.help_command
@@ -99,9 +201,42 @@ class AceBot(commands.Bot):
 	async def _help(self, ctx, *, command=None):
 		await ctx.send_help(command)
 
+	def _get_state(self, **options):
+		# same as AutoShardedClient._get_state, with the message cache policy
+		return PolicyConnectionState(
+			dispatch=self.dispatch, handlers=self._handlers, syncer=self._syncer,
+			hooks=self._hooks, http=self.http, loop=self.loop, **options
+		)
+
+	@property
+	def message_policy(self):
+		'''Priority channels and hit rate of the message cache.'''
+
+		return self._connection.message_policy
+
+	async def fetch_message_cached(self, channel, message_id):
+		'''Get a message from the message cache, or fetch it if not cached. Raises like channel.fetch_message.'''
+
+		message = self._connection._get_message(message_id)
+
+		if message is not None and message.channel.id == channel.id:
+			return message
+
+		message = await channel.fetch_message(message_id)
+
+		# the lib doesn't cache fetched messages. keep the ones from priority channels around
+		cache = self._connection._messages
+		if cache is not None and self.message_policy.is_priority(message) and message not in cache:
+			cache.append(message)
+
+		return message
+
 	async def on_connect(self):
 		log.info('Connected...')
 
+		if self.connected_at is None:
+			self.connected_at = perf_counter()
+
 	async def on_resumed(self):
 		log.info('Resumed...')
 
@@ -111,13 +246,115 @@ class AceBot(commands.Bot):
 
 	async def on_ready(self):
 		if not self.ready.is_set():
-			self.load_extensions()
+			eager = [name for name in EXTENSIONS if name not in self.deferred_extensions]
+
+			start = perf_counter()
+			await self.prewarm_imports(eager)
+			self.startup_times['Import dependencies'] = perf_counter() - start
+
+			start = perf_counter()
+			self.load_extensions(eager)
+			self.startup_times['Load extensions'] = perf_counter() - start
+
+			# start listening before filling caches so no change slips through
+			start = perf_counter()
+			self.config_sync.start()
+			await self.preload_configs()
+			self.startup_times['Preload configs'] = perf_counter() - start
+
+			if self.connected_at is not None:
+				self.startup_times['Connect to ready'] = perf_counter() - self.connected_at
+
+			# needs extensions and configs loaded to know which guilds to chunk
+			self.loop.create_task(self.member_policy.start())
+
+			self.loop.call_later(DEFERRED_LOAD_DELAY, self.load_deferred_extensions)
+
+			if self.ipc is not None:
+				self.ipc.start()
+
+			if self.metrics_server is not None:
+				try:
+					await self.metrics_server.start()
+				except OSError as exc:
+					log.warning('Failed starting metrics server: %s', str(exc))
 
 			self.loop.create_task(self.update_dbl())
 
 			self.ready.set()
 			log.info('Ready! %s', po(self.user))
 
+	def shard_filter(self, column='guild_id'):
+		'''SQL condition matching rows that belong to guilds on the shards of this process.'''
+
+		if self.shard_ids is None:
+			return 'TRUE'
+
+		return '({0} >> 22) % {1} IN ({2})'.format(column, self.shard_count, ', '.join(map(str, self.shard_ids)))
+
+	async def cluster_request(self, name, data=None):
+		'''Run an IPC handler on every cluster. Returns a dict of cluster id to result. Raises IPCUnavailable if IPC is down.'''
+
+		if self.ipc is None:
+			return {0: await self.ipc_handlers[name](data)}
+
+		return await self.ipc.request(name, data)
+
+	async def _ipc_stats(self, data):
+		text, voice, members = 0, 0, 0
+
+		for guild in self.guilds:
+			members += guild.member_count
+			for channel in guild.channels:
+				if isinstance(channel, discord.TextChannel):
+					text += 1
+				elif isinstance(channel, discord.VoiceChannel):
+					voice += 1
+
+		return dict(
+			shards=list(self.shards.keys()),
+			guilds=len(self.guilds),
+			members=members,
+			users=len(self.users),
+			text=text,
+			voice=voice,
+			latency=self.latency,
+		)
+
+	async def _ipc_reload(self, data):
+		return self.load_extensions()
+
+	async def _ipc_status(self, data):
+		await self.change_presence()
+		await self.change_presence(activity=BOT_ACTIVITY)
+
+	@property
+	def config_tables(self):
+		'''All ConfigTables of the bot and its loaded cogs.'''
+
+		tables = [self.config]
+
+		for cog in self.cogs.values():
+			config = getattr(cog, 'config', None)
+			if isinstance(config, ConfigTable):
+				tables.append(config)
+
+		return tables
+
+	async def preload_configs(self):
+		'''Fill config caches for all current guilds in one query per table.'''
+
+		guild_ids = [guild.id for guild in self.guilds]
+		tables = [table for table in self.config_tables if table.preload]
+
+		results = await asyncio.gather(
+			*(table.preload_entries(guild_ids) for table in tables), return_exceptions=True
+		)
+
+		for table, result in zip(tables, results):
+			if isinstance(result, Exception):
+				log.warning('Failed preloading table %s: %s', table.table, str(result))
+
 	async def on_message(self, message):
 		if message.guild is None or message.author.bot:
 			return
@@ -125,9 +362,35 @@ class AceBot(commands.Bot):
 		if not self.ready.is_set():
 			await self.ready.wait()
 
+		self.member_policy.touch(message.author)
+
 		await self.process_commands(message)
 
+	def could_be_command(self, message: discord.Message):
+		'''Cheap in-memory check run before building a context. False means the message is definitely not a command.'''
+
+		content = message.content
+
+		# bot mentions bring up the help menu
+		if content.startswith('<@'):
+			return True
+
+		gc = self.config.peek(message.guild.id)
+
+		if gc is not None:
+			prefix = gc.prefix or DEFAULT_PREFIX
+		elif self.config.known_missing(message.guild.id):
+			prefix = DEFAULT_PREFIX
+		else:
+			# prefix not known without a query, so let the full path figure it out
+			return True
+
+		return content.startswith(prefix)
+
 	async def process_commands(self, message: discord.Message):
+		if not self.could_be_command(message):
+			return
+
 		ctx: AceContext = await self.get_context(message, cls=AceContext)
 
 		# if messages starts with a bot mention...
@@ -140,12 +403,22 @@ class AceBot(commands.Bot):
 			return
 
 		if ctx.command is None:
-			return
+			# might be a command from an extension that hasn't been loaded yet
+			if ctx.prefix is None or not ctx.invoked_with or not self.load_deferred_extensions():
+				return
+
+			ctx = await self.get_context(message, cls=AceContext)
+
+			if ctx.command is None:
+				return
 
 		perms = ctx.perms
 		if not perms.send_messages or not perms.read_message_history:
 			return
 
+		# lets query stats attribute queries to this command
+		current_command.set(ctx.command.qualified_name)
+
 		await self.invoke(ctx)
 
 	async def prefix_resolver(self, bot, message):
@@ -155,10 +428,10 @@ class AceBot(commands.Bot):
 		gc = await self.config.get_entry(message.guild.id)
 		return gc.prefix or DEFAULT_PREFIX
 
-	def load_extensions(self):
+	def load_extensions(self, names=EXTENSIONS):
 		reloaded = list()
 
-		for name in EXTENSIONS:
+		for name in names:
 			file_name = name.replace('.', '/') + '.py'
 
 			if os.path.isfile(file_name):
@@ -170,24 +443,91 @@ class AceBot(commands.Bot):
 
 					log.debug('Loading %s', name)
 
+					start = perf_counter()
 					self.load_extension(name)
+					self.extension_times[name] = perf_counter() - start
+
 					self.modified_times[name] = mtime
+					self.deferred_extensions.discard(name)
 
 					reloaded.append(name)
 
 		return reloaded
 
+	def load_deferred_extensions(self):
+		'''Load extensions held back at startup. Returns list of loaded extensions.'''
+
+		if not self.deferred_extensions:
+			return list()
+
+		loaded = self.load_extensions([name for name in EXTENSIONS if name in self.deferred_extensions])
+		log.info('Loaded deferred extensions: %s', ', '.join(loaded))
+
+		return loaded
+
+	async def prewarm_imports(self, names):
+		'''Import the third party modules extensions depend on in a thread pool.
+
+		Loading an extension is synchronous, so this keeps the slow part of it from blocking the event loop.'''
+
+		modules = set()
+
+		for name in names:
+			file_name = name.replace('.', '/') + '.py'
+
+			if not os.path.isfile(file_name):
+				continue
+
+			with open(file_name, 'r', encoding='utf-8') as f:
+				tree = ast.parse(f.read())
+
+			for node in tree.body:
+				if isinstance(node, ast.Import):
+					modules.update(alias.name for alias in node.names)
+				elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+					modules.add(node.module)
+
+		modules = list(
+			module for module in modules
+			if module.partition('.')[0] not in LOCAL_PACKAGES and module not in sys.modules
+		)
+
+		results = await asyncio.gather(
+			*(self.loop.run_in_executor(None, importlib.import_module, module) for module in modules),
+			return_exceptions=True
+		)
+
+		for module, result in zip(modules, results):
+			if isinstance(result, Exception):
+				log.warning('Failed importing %s ahead of time: %s', module, str(result))
+
+	async def on_socket_response(self, msg):
+		if msg.get('op') == 0:
+			GATEWAY_EVENTS.inc(type=msg.get('t'))
+
 	async def on_command(self, ctx):
+		ctx.invoked_at = perf_counter()
+
 		spl = ctx.message.content.split('\n')
 		log.info('%s in %s: %s', po(ctx.author), po(ctx.guild), spl[0] + (' ...' if len(spl) > 1 else ''))
 
+	def record_command(self, ctx, status):
+		# commands that fail before being invoked (not found, checks) never hit on_command
+		if ctx.invoked_at is None:
+			return
+
+		name = ctx.command.qualified_name
+
+		COMMANDS.inc(command=name, status=status)
+		COMMAND_LATENCY.observe(perf_counter() - ctx.invoked_at, command=name)
+
 	async def on_command_completion(self, ctx: AceContext):
-		await ctx.db.execute(
-			'INSERT INTO log (guild_id, channel_id, user_id, timestamp, command) VALUES ($1, $2, $3, $4, $5)',
-			ctx.guild.id, ctx.channel.id, ctx.author.id, datetime.utcnow(), ctx.command.qualified_name
-		)
+		self.record_command(ctx, 'ok')
+		self.command_log.add(ctx)
 
 	async def on_command_error(self, ctx, exc):
+		self.record_command(ctx, 'error')
+
 		async with CommandErrorLogic(ctx, exc) as handler:
 			if isinstance(exc, commands.CommandInvokeError):
 				if isinstance(exc.original, discord.HTTPException):
@@ -225,17 +565,70 @@ class AceBot(commands.Bot):
 			elif isinstance(exc, discord.DiscordException):
 				handler.oops()
 
+	async def on_member_join(self, member):
+		self.member_policy.on_member_join(member)
+
 	async def on_guild_join(self, guild):
 		log.info('Join guild %s', po(guild))
+		self.member_policy.on_guild_join(guild)
 		await self.update_dbl()
 
 	async def on_guild_remove(self, guild):
 		log.info('Left guild %s', po(guild))
+
+		# no reason to keep config for guilds we're not in
+		for table in self.config_tables:
+			if len(table.primary) == 1:
+				await table.clear_entry(guild.id)
 		await self.update_dbl()
 
 	async def on_guild_unavailable(self, guild):
 		pass  # log.info('Unavailable guild %s', str(guild))
 
+	async def close(self):
+		log.info('Shutting down...')
+
+		# make sure queued writes hit the database before the connection goes away
+		await self.command_log.close()
+
+		for table in self.config_tables:
+			try:
+				await table.flush()
+			except (asyncpg.PostgresError, OSError) as exc:
+				log.warning('Failed writing pending records for table %s: %s', table.table, str(exc))
+
+		# cogs hand off their pending writes from cog_unload, so unload them while the connections are still up
+		for extension in tuple(self.extensions):
+			try:
+				self.unload_extension(extension)
+			except Exception:
+				log.exception('Failed unloading extension %s', extension)
+
+		if self.unload_tasks:
+			await asyncio.wait(self.unload_tasks)
+
+		await self.config_sync.close()
+
+		if self.ipc is not None:
+			await self.ipc.close()
+
+		if self.metrics_server is not None:
+			await self.metrics_server.close()
+
+		self.loop_monitor.stop()
+
+		await super().close()
+
+	def unload_task(self, coro):
+		'''Run coro for a cog that's being unloaded. On shutdown these are waited for before the connections close.'''
+
+		task = self.loop.create_task(coro)
+
+		self.unload_tasks.add(task)
+		task.add_done_callback(self.unload_tasks.discard)
+
+		return task
+
 	@property
 	def invite_link(self):
 		return 'https://discordapp.com/oauth2/authorize?&client_id={0}&scope=bot&permissions={1}'.format(
@@ -253,7 +646,15 @@ class AceBot(commands.Bot):
 
 		url = 'https://discordbots.org/api/bots/{}/stats'.format(self.user.id)
 
-		server_count = len(self.guilds)
+		try:
+			stats = await self.cluster_request('stats')
+		except IPCUnavailable:
+			# right after startup or while the listener reconnects. our own count is better than no update at all
+			log.info('Cluster IPC is down, posting own guild count to DBL')
+			stats = {self.cluster_id: await self._ipc_stats(None)}
+
+		server_count = sum(cluster['guilds'] for cluster in stats.values() if cluster is not None)
+
 		data = dict(server_count=server_count)
 
 		headers = {
@@ -268,10 +669,10 @@ class AceBot(commands.Bot):
 				log.info('Failed updating DBL: %s - %s', resp.reason, await resp.text())
 
 
-def setup_logger():
+def setup_logger(file_name='logs/log.log'):
 	# init first log file
-	if not os.path.isfile('logs/log.log'):
-		open('logs/log.log', 'w+')
+	if not os.path.isfile(file_name):
+		open(file_name, 'w+')
 
 	# set logging levels for various libs
 	logging.getLogger('discord').setLevel(logging.INFO)
@@ -290,19 +691,29 @@ def setup_logger():
 
 	)
 
-	file = logging.handlers.TimedRotatingFileHandler('logs/log.log', when='midnight', encoding='utf-8-sig')
+	file = logging.handlers.TimedRotatingFileHandler(file_name, when='midnight', encoding='utf-8-sig')
 	file.setFormatter(fmt)
 	file.setLevel(logging.INFO)
 
-	# get the __main__ logger and add handlers
+	# move the terminal and file handlers behind a queue, so formatting and writing happens on a background thread
 	root = logging.getLogger()
 	root.setLevel(LOG_LEVEL)
-	root.addHandler(file)
+
+	handlers = list(root.handlers) + [file]
+
+	for handler in root.handlers[:]:
+		root.removeHandler(handler)
+
+	queue_handler = DroppingQueueHandler(handlers)
+	root.addHandler(queue_handler)
+
+	queue_handler.start()
+	atexit.register(queue_handler.stop)
 
 	return logging.getLogger(__name__)
 
 
-async def setup():
+async def setup(args, runtime):
 	# create folders
 	for path in ('data', 'logs', 'error', 'feedback', 'ahk_eval'):
 		if not os.path.exists(path):
@@ -317,14 +728,9 @@ async def setup():
 
 	discord.Embed = Embed
 
-	def patched_execute(old):
-		async def new(self, query, args, limit, timeout, return_status=False):
-			log.debug(query)
-			return await old(self, query, args, limit, timeout, return_status)
-
-		return new
-
-	asyncpg.Connection._execute = patched_execute(asyncpg.Connection._execute)
+	# record timings of all queries
+	query_stats = QueryStats()
+	query_stats.install()
 
 	# connect to db
 	log.info('Creating postgres pool')
@@ -335,7 +741,29 @@ async def setup():
 
 	# init bot
 	log.info('Initializing bot')
-	bot = AceBot(db=db, loop=loop, intents=BOT_INTENTS, allowed_mentions=allowed_mentions)
+	if args.cluster_id is None:
+		# one process, one shard
+		shard_kwargs = dict(shard_count=1)
+	else:
+		log.info('Running as cluster %s of %s with shards %s', args.cluster_id, args.cluster_count, args.shard_ids)
+		shard_kwargs = dict(
+			cluster_id=args.cluster_id, cluster_count=args.cluster_count,
+			shard_ids=args.shard_ids, shard_count=args.shard_count
+		)
+
+	bot = AceBot(
+		db=db, query_stats=query_stats, runtime=runtime, lazy_members=args.lazy_members, loop=loop,
+		intents=BOT_INTENTS, allowed_mentions=allowed_mentions, **shard_kwargs
+	)
+
+	bot.loop_monitor.start()
+
+	# shut down gracefully so buffered data gets written
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		try:
+			loop.add_signal_handler(sig, lambda: loop.create_task(bot.close()))
+		except NotImplementedError:
+			pass  # not supported on windows
 
 	# start it
 	log.info('Logging in and starting bot')
@@ -343,7 +771,28 @@ async def setup():
 
 
 if __name__ == '__main__':
-	log = setup_logger()
+	# these are passed by launcher.py when running in cluster mode
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--cluster-id', type=int)
+	parser.add_argument('--cluster-count', type=int, default=1)
+	parser.add_argument('--shard-count', type=int)
+	parser.add_argument('--shard-ids', type=int, nargs='+')
+	parser.add_argument('--fast-runtime', action='store_true', help='Use uvloop, orjson and aiodns where installed.')
+	parser.add_argument('--lazy-members', action='store_true', help='Only keep full member lists of guilds that need them.')
+	parser.add_argument('--api-base', help='Use another Discord API, like the one from benchmarks/discordsim.py.')
+	args = parser.parse_args()
+
+	if args.cluster_id is None:
+		log = setup_logger()
+	else:
+		log = setup_logger('logs/cluster-{0}.log'.format(args.cluster_id))
+
+	if args.api_base is not None:
+		discord.http.Route.BASE = args.api_base
+
+	# has to happen before the loop is created
+	runtime = enable_fast_runtime() if args.fast_runtime else Runtime()
+
 	loop = asyncio.get_event_loop()
 
-	loop.run_until_complete(setup())
+	loop.run_until_complete(setup(args, runtime))
@@ -0,0 +1,1038 @@
+'''Local stand-in for the Discord gateway and REST API, for load testing the bot without a network.
+
+Start the simulator, then the bot pointed at it from another terminal:
+	python -m benchmarks.discordsim --duration 120 --messages 100 --reactions 10 --joins 1 --bulk-deletes 0.1
+	python ace.py --api-base http://127.0.0.1:8765/api/v7
+
+The bot still needs its database. Any token is accepted. The simulator makes synthetic guilds with text channels, roles
+and members, and once a shard has identified it streams MESSAGE_CREATE, MESSAGE_REACTION_ADD/REMOVE, GUILD_MEMBER_ADD
+and MESSAGE_DELETE_BULK events at the given rates (per second, over all guilds). A share of messages are commands and
+some members burst identical messages, which exercises the command pipeline and anti-spam.
+
+Starboards, role selectors and security settings live in the bot's database. Set them up in the simulated guilds by
+passing --setup with a file of messages, one per line, which the owner of each guild sends in its first channel before
+the streams start. Reactions use the emojis given with --emojis.
+
+The REST calls the bot makes are answered from the simulated state and echoed on the gateway the way Discord does, so
+role changes, bans and deleted messages show up in the bot's cache. Buckets are rate limited like Discord's if
+--rest-limit is set. On exit the calls are summarized per route, with the time since the last synthetic event in the
+same channel (or guild, for guild routes) as an estimate of how long the bot took to react. --record writes every call
+as a JSON line.
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import signal
+import string
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timezone
+from time import monotonic, time
+
+from aiohttp import WSMsgType, web
+
+DISCORD_EPOCH = 1420070400000
+
+HEARTBEAT_INTERVAL = 41250
+
+# members sent with GUILD_CREATE, larger guilds have to be chunked
+LARGE_THRESHOLD = 250
+CHUNK_SIZE = 1000
+
+# recent messages kept per channel, for reactions, bulk deletes and fetches
+CHANNEL_HISTORY = 500
+
+EVERYONE_PERMISSIONS = 104324673
+ADMINISTRATOR = 8
+
+COMMANDS = ('flip', 'ball will this work', 'choose tea coffee', 'server', 'about')
+
+WORDS = tuple(''.join(random.Random(idx).choices(string.ascii_lowercase, k=2 + idx % 7)) for idx in range(500))
+
+
+class Snowflakes:
+	def __init__(self):
+		self.last = 0
+
+	def __call__(self):
+		flake = (int(time() * 1000) - DISCORD_EPOCH) << 22
+
+		# ids from the same millisecond still have to be unique and increasing
+		self.last = max(flake, self.last + 1)
+		return self.last
+
+
+def isoformat(timestamp=None):
+	return datetime.fromtimestamp(timestamp or time(), timezone.utc).isoformat()
+
+
+def user_data(user_id, name, bot=False):
+	return dict(id=str(user_id), username=name, discriminator='{0:04d}'.format(user_id % 10000), avatar=None, bot=bot)
+
+
+class Guild:
+	def __init__(self, guild_id, name, owner_id):
+		self.id = guild_id
+		self.name = name
+		self.owner_id = owner_id
+
+		self.roles = OrderedDict()  # role id -> role data
+		self.channels = OrderedDict()  # channel id -> channel data
+		self.members = OrderedDict()  # user id -> member data
+		self.bans = set()
+
+		self.joined_at = isoformat()
+
+	def data(self, members):
+		return dict(
+			id=str(self.id), name=self.name, icon=None, splash=None, discovery_splash=None, owner_id=str(self.owner_id),
+			region='us-east', afk_channel_id=None, afk_timeout=300, verification_level=0,
+			default_message_notifications=0, explicit_content_filter=0, mfa_level=0, features=list(), emojis=list(),
+			system_channel_id=None, rules_channel_id=None, premium_tier=0, preferred_locale='en-US',
+			large=len(self.members) > LARGE_THRESHOLD, unavailable=False, member_count=len(self.members),
+			joined_at=self.joined_at, voice_states=list(), presences=list(),
+			roles=list(self.roles.values()), channels=list(self.channels.values()), members=members,
+		)
+
+
+class Session:
+	'''One identified gateway connection.'''
+
+	def __init__(self, ws, shard_id, shard_count):
+		self.ws = ws
+		self.shard_id = shard_id
+		self.shard_count = shard_count
+		self.seq = 0
+
+	def owns(self, guild_id):
+		return (guild_id >> 22) % self.shard_count == self.shard_id
+
+	async def send(self, op, d, t=None):
+		if t is not None:
+			self.seq += 1
+
+		await self.ws.send_str(json.dumps(dict(op=op, d=d, s=self.seq if t is not None else None, t=t)))
+
+
+class RouteStats:
+	__slots__ = ('calls', 'limited', 'errors', 'lags')
+
+	def __init__(self):
+		self.calls = 0
+		self.limited = 0
+		self.errors = 0
+		self.lags = list()
+
+
+def percentile(values, pct):
+	if not values:
+		return None
+
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def route(method, path):
+	'''Mark a handler for a REST route. Path parameters in braces are passed as ints.'''
+
+	# ids are digits, so /users/@me doesn't match /users/{user_id}
+	pattern = re.compile('^' + re.sub(r'{(\w+)}', lambda match: '(?P<{0}>{1})'.format(
+		match.group(1), '[^/]+' if match.group(1) == 'emoji' else r'\d+'
+	), path) + '$')
+
+	def decorator(func):
+		func.__route__ = (method, path, pattern)
+		return func
+
+	return decorator
+
+
+class Simulator:
+	def __init__(self, args):
+		self.args = args
+		self.rng = random.Random(args.seed)
+		self.snowflake = Snowflakes()
+
+		self.bot_id = self.snowflake()
+		self.guilds = OrderedDict()
+		self.users = dict()  # user id -> user data
+
+		self.sessions = list()
+		self.identified = asyncio.Event()
+
+		self.messages = dict()  # message id -> message data
+		self.history = defaultdict(lambda: deque(maxlen=CHANNEL_HISTORY))  # channel id -> message ids
+		self.reacted = OrderedDict()  # (channel id, message id, user id, emoji) -> None
+
+		# synthetic events, to estimate how long the bot takes to respond
+		self.last_event = dict()  # channel or guild id -> monotonic()
+		self.events = defaultdict(int)
+
+		self.routes = defaultdict(RouteStats)
+		self.unhandled = defaultdict(int)
+		self.buckets = dict()  # bucket -> (remaining, reset at)
+
+		self.record = None
+		self.started_at = None
+
+		self.handlers = list(
+			getattr(self, name).__route__ + (getattr(self, name),)
+			for name in dir(self) if hasattr(getattr(self, name), '__route__')
+		)
+
+		self.build()
+
+		self.max_messages = CHANNEL_HISTORY * sum(len(guild.channels) for guild in self.guilds.values())
+
+	def build(self):
+		args = self.args
+
+		self.users[self.bot_id] = user_data(self.bot_id, 'AceBot', bot=True)
+
+		for idx in range(args.guilds):
+			owner_id = self.add_user()
+			guild = Guild(self.snowflake(), 'Guild {0}'.format(idx), owner_id)
+
+			everyone = dict(
+				id=str(guild.id), name='@everyone', permissions=str(EVERYONE_PERMISSIONS), position=0, color=0,
+				hoist=False, managed=False, mentionable=False
+			)
+			guild.roles[guild.id] = everyone
+
+			for position, name in enumerate(('Muted', 'Member', 'Helper', 'Bot'), 1):
+				role_id = self.snowflake()
+				permissions = ADMINISTRATOR if name == 'Bot' else 0
+
+				guild.roles[role_id] = dict(everyone, id=str(role_id), name=name, permissions=str(permissions), position=position)
+
+			for position in range(args.channels):
+				channel_id = self.snowflake()
+				guild.channels[channel_id] = dict(
+					id=str(channel_id), type=0, guild_id=str(guild.id), name='channel-{0}'.format(position),
+					position=position, permission_overwrites=list(), topic=None, nsfw=False, parent_id=None,
+					last_message_id=None, rate_limit_per_user=0
+				)
+
+			# the last role made is the bot's
+			self.add_member(guild, self.bot_id, [role_id])
+			self.add_member(guild, owner_id)
+
+			for _ in range(args.members):
+				self.add_member(guild, self.add_user())
+
+			self.guilds[guild.id] = guild
+
+	def add_user(self):
+		user_id = self.snowflake()
+		self.users[user_id] = user_data(user_id, 'user{0}'.format(len(self.users)))
+		return user_id
+
+	def add_member(self, guild, user_id, roles=()):
+		member = dict(
+			user=self.users[user_id], nick=None, roles=list(str(role_id) for role_id in roles), joined_at=isoformat(),
+			deaf=False, mute=False
+		)
+
+		guild.members[user_id] = member
+		return member
+
+	def session_for(self, guild_id):
+		for session in self.sessions:
+			if session.owns(guild_id):
+				return session
+
+	async def dispatch(self, guild_id, t, d):
+		session = self.session_for(guild_id)
+
+		if session is None:
+			return
+
+		try:
+			await session.send(0, d, t)
+		except ConnectionError:
+			pass
+
+	def mark(self, kind, *ids):
+		now = monotonic()
+
+		for _id in ids:
+			self.last_event[_id] = now
+
+		self.events[kind] += 1
+
+	# gateway
+
+	async def gateway(self, request):
+		ws = web.WebSocketResponse(max_msg_size=0)
+		await ws.prepare(request)
+
+		await ws.send_str(json.dumps(dict(op=10, d=dict(heartbeat_interval=HEARTBEAT_INTERVAL), s=None, t=None)))
+
+		session = None
+
+		try:
+			async for msg in ws:
+				if msg.type is not WSMsgType.TEXT:
+					continue
+
+				payload = json.loads(msg.data)
+				op, d = payload.get('op'), payload.get('d')
+
+				if op == 1:
+					await ws.send_str(json.dumps(dict(op=11, d=None, s=None, t=None)))
+
+				elif op == 2:
+					shard_id, shard_count = d.get('shard') or (0, 1)
+					session = Session(ws, shard_id, shard_count)
+					await self.identify(session)
+
+				elif op == 6:
+					# no resuming, start over
+					await ws.send_str(json.dumps(dict(op=9, d=False, s=None, t=None)))
+
+				elif op == 8 and session is not None:
+					await self.request_members(session, d)
+		finally:
+			if session in self.sessions:
+				self.sessions.remove(session)
+
+		return ws
+
+	async def identify(self, session):
+		guilds = list(guild for guild in self.guilds.values() if session.owns(guild.id))
+
+		await session.send(0, dict(
+			v=7, user=self.users[self.bot_id], private_channels=list(), session_id=str(self.snowflake()),
+			guilds=list(dict(id=str(guild.id), unavailable=True) for guild in guilds),
+			shard=[session.shard_id, session.shard_count],
+		), 'READY')
+
+		for guild in guilds:
+			if len(guild.members) > LARGE_THRESHOLD:
+				members = list(guild.members[user_id] for user_id in (self.bot_id, guild.owner_id))
+			else:
+				members = list(guild.members.values())
+
+			await session.send(0, guild.data(members), 'GUILD_CREATE')
+
+		self.sessions.append(session)
+		self.identified.set()
+
+	async def request_members(self, session, d):
+		guild_ids = d['guild_id'] if isinstance(d['guild_id'], list) else [d['guild_id']]
+
+		for guild_id in guild_ids:
+			guild = self.guilds.get(int(guild_id))
+
+			if guild is None:
+				continue
+
+			not_found = list()
+
+			if d.get('user_ids'):
+				members = list()
+
+				for user_id in d['user_ids']:
+					member = guild.members.get(int(user_id))
+
+					if member is None:
+						not_found.append(user_id)
+					else:
+						members.append(member)
+			else:
+				query = (d.get('query') or '').lower()
+				members = list(member for member in guild.members.values() if member['user']['username'].startswith(query))
+
+				if d.get('limit'):
+					members = members[:d['limit']]
+
+			chunks = list(members[idx:idx + CHUNK_SIZE] for idx in range(0, len(members), CHUNK_SIZE)) or [list()]
+
+			for idx, chunk in enumerate(chunks):
+				await session.send(0, dict(
+					guild_id=str(guild.id), members=chunk, chunk_index=idx, chunk_count=len(chunks),
+					not_found=not_found, nonce=d.get('nonce')
+				), 'GUILD_MEMBERS_CHUNK')
+
+	# REST
+
+	async def rest(self, request):
+		method = request.method
+		path = '/' + request.match_info['path']
+
+		for route_method, template, pattern, handler in self.handlers:
+			if route_method != method:
+				continue
+
+			match = pattern.match(path)
+			if match is not None:
+				break
+		else:
+			self.unhandled['{0} {1}'.format(method, path)] += 1
+			return web.json_response(dict(message='404: Not Found', code=0), status=404)
+
+		params = dict((key, value if key == 'emoji' else int(value)) for key, value in match.groupdict().items())
+
+		key = '{0} {1}'.format(method, template)
+		stats = self.routes[key]
+		stats.calls += 1
+
+		channel_id, guild_id = params.get('channel_id'), params.get('guild_id')
+		last = self.last_event.get(channel_id or guild_id)
+		lag = None if last is None else monotonic() - last
+
+		headers = self.rate_limit(template, channel_id, guild_id)
+
+		if headers is not None and headers['X-RateLimit-Remaining'] == '-1':
+			stats.limited += 1
+			retry_after = float(headers.pop('X-RateLimit-Reset-After'))
+			# the lib takes a 429 without a Via header for a cloudflare ban
+			headers.update({'X-RateLimit-Remaining': '0', 'Via': '1.1 google'})
+
+			self.log_call(method, template, path, 429, lag)
+			return web.json_response(
+				dict(message='You are being rate limited.', retry_after=retry_after * 1000, **{'global': False}),
+				status=429, headers=headers
+			)
+
+		if lag is not None:
+			stats.lags.append(lag)
+
+		body = dict()
+		if request.content_type == 'multipart/form-data':
+			# file uploads, payload_json holds the rest of the message
+			form = await request.post()
+			if 'payload_json' in form:
+				body = json.loads(form['payload_json'])
+		elif request.can_read_body:
+			body = await request.json() or dict()
+
+		status, data = await handler(params, body, request.query)
+
+		if status >= 400:
+			stats.errors += 1
+
+		self.log_call(method, template, path, status, lag)
+
+		if status == 204:
+			return web.Response(status=204, headers=headers)
+
+		return web.json_response(data, status=status, headers=headers)
+
+	def rate_limit(self, template, channel_id, guild_id):
+		limit = self.args.rest_limit
+
+		if not limit:
+			return None
+
+		bucket = '{0}:{1}:{2}'.format(channel_id, guild_id, template)
+		now = time()
+
+		remaining, reset_at = self.buckets.get(bucket, (limit, now + self.args.rest_period))
+
+		if reset_at <= now:
+			remaining, reset_at = limit, now + self.args.rest_period
+
+		remaining -= 1
+		self.buckets[bucket] = (max(remaining, 0), reset_at)
+
+		return {
+			'X-RateLimit-Limit': str(limit),
+			'X-RateLimit-Remaining': str(max(remaining, -1)),
+			'X-RateLimit-Reset': '{0:.3f}'.format(reset_at),
+			'X-RateLimit-Reset-After': '{0:.3f}'.format(reset_at - now),
+			'X-RateLimit-Bucket': bucket,
+		}
+
+	def log_call(self, method, template, path, status, lag):
+		if self.record is None:
+			return
+
+		self.record.write(json.dumps(dict(
+			at=round(monotonic() - self.started_at, 6), method=method, route=template, path=path, status=status,
+			lag=None if lag is None else round(lag, 6)
+		)) + '\n')
+
+	def error(self, status, message, code=0):
+		return status, dict(message=message, code=code)
+
+	@route('GET', '/gateway')
+	async def get_gateway(self, params, body, query):
+		return 200, dict(url=self.ws_url)
+
+	@route('GET', '/gateway/bot')
+	async def get_bot_gateway(self, params, body, query):
+		return 200, dict(
+			url=self.ws_url, shards=self.args.shards,
+			session_start_limit=dict(total=1000, remaining=1000, reset_after=0, max_concurrency=16)
+		)
+
+	@route('GET', '/users/@me')
+	async def get_me(self, params, body, query):
+		return 200, self.users[self.bot_id]
+
+	@route('GET', '/oauth2/applications/@me')
+	async def get_application(self, params, body, query):
+		owner = next(iter(self.guilds.values())).owner_id
+		return 200, dict(
+			id=str(self.bot_id), name='AceBot', icon=None, description='', rpc_origins=None, bot_public=True,
+			bot_require_code_grant=False, owner=self.users[owner], summary='', verify_key='', team=None
+		)
+
+	@route('GET', '/users/{user_id}')
+	async def get_user(self, params, body, query):
+		user = self.users.get(params['user_id'])
+		return (200, user) if user is not None else self.error(404, 'Unknown User', 10013)
+
+	def find_channel(self, channel_id):
+		for guild in self.guilds.values():
+			channel = guild.channels.get(channel_id)
+			if channel is not None:
+				return guild, channel
+
+		return None, None
+
+	@route('GET', '/channels/{channel_id}')
+	async def get_channel(self, params, body, query):
+		guild, channel = self.find_channel(params['channel_id'])
+		return (200, channel) if channel is not None else self.error(404, 'Unknown Channel', 10003)
+
+	@route('POST', '/channels/{channel_id}/typing')
+	async def trigger_typing(self, params, body, query):
+		return 204, None
+
+	def make_message(self, guild, channel_id, author_id, content, embeds=()):
+		message = dict(
+			id=str(self.snowflake()), channel_id=str(channel_id), guild_id=str(guild.id), author=self.users[author_id],
+			content=content, timestamp=isoformat(), edited_timestamp=None, tts=False, mention_everyone=False,
+			mentions=list(), mention_roles=list(), attachments=list(), embeds=list(embeds), reactions=list(),
+			pinned=False, type=0, flags=0,
+		)
+
+		member = guild.members.get(author_id)
+		if member is not None:
+			message['member'] = dict((key, value) for key, value in member.items() if key != 'user')
+
+		self.messages[int(message['id'])] = message
+		self.history[channel_id].append(int(message['id']))
+
+		# history only keeps so many, forget the rest
+		while len(self.messages) > self.max_messages:
+			self.messages.pop(next(iter(self.messages)))
+
+		return message
+
+	@route('POST', '/channels/{channel_id}/messages')
+	async def create_message(self, params, body, query):
+		guild, channel = self.find_channel(params['channel_id'])
+
+		if channel is None:
+			return self.error(404, 'Unknown Channel', 10003)
+
+		embeds = list()
+		if body.get('embed'):
+			embeds.append(body['embed'])
+
+		message = self.make_message(guild, params['channel_id'], self.bot_id, body.get('content') or '', embeds)
+		await self.dispatch(guild.id, 'MESSAGE_CREATE', message)
+
+		return 200, message
+
+	def get_message_data(self, params):
+		message = self.messages.get(params['message_id'])
+
+		if message is None or int(message['channel_id']) != params['channel_id']:
+			return None
+
+		return message
+
+	@route('GET', '/channels/{channel_id}/messages/{message_id}')
+	async def get_message(self, params, body, query):
+		message = self.get_message_data(params)
+		return (200, message) if message is not None else self.error(404, 'Unknown Message', 10008)
+
+	@route('GET', '/channels/{channel_id}/messages')
+	async def get_messages(self, params, body, query):
+		limit = int(query.get('limit', 50))
+		before = int(query['before']) if 'before' in query else None
+		after = int(query['after']) if 'after' in query else None
+
+		ids = list(
+			message_id for message_id in self.history[params['channel_id']]
+			if message_id in self.messages and (before is None or message_id < before) and (after is None or message_id > after)
+		)
+
+		# like discord, the messages closest to after when only after is given, otherwise the newest ones
+		ids = ids[:limit] if after is not None and before is None else ids[-limit:]
+
+		return 200, list(self.messages[message_id] for message_id in reversed(ids))
+
+	@route('PATCH', '/channels/{channel_id}/messages/{message_id}')
+	async def edit_message(self, params, body, query):
+		message = self.get_message_data(params)
+
+		if message is None:
+			return self.error(404, 'Unknown Message', 10008)
+
+		if 'content' in body:
+			message['content'] = body['content'] or ''
+
+		if 'embed' in body:
+			message['embeds'] = list() if body['embed'] is None else [body['embed']]
+
+		message['edited_timestamp'] = isoformat()
+
+		await self.dispatch(int(message['guild_id']), 'MESSAGE_UPDATE', message)
+
+		return 200, message
+
+	@route('DELETE', '/channels/{channel_id}/messages/{message_id}')
+	async def delete_message(self, params, body, query):
+		message = self.messages.pop(params['message_id'], None)
+
+		if message is None:
+			return self.error(404, 'Unknown Message', 10008)
+
+		await self.dispatch(int(message['guild_id']), 'MESSAGE_DELETE', dict(
+			id=message['id'], channel_id=message['channel_id'], guild_id=message['guild_id']
+		))
+
+		return 204, None
+
+	@route('POST', '/channels/{channel_id}/messages/bulk-delete')
+	async def bulk_delete_messages(self, params, body, query):
+		guild, channel = self.find_channel(params['channel_id'])
+
+		if channel is None:
+			return self.error(404, 'Unknown Channel', 10003)
+
+		ids = list(message_id for message_id in body.get('messages', ()) if self.messages.pop(int(message_id), None))
+
+		await self.dispatch(guild.id, 'MESSAGE_DELETE_BULK', dict(
+			ids=ids, channel_id=str(params['channel_id']), guild_id=str(guild.id)
+		))
+
+		return 204, None
+
+	async def _reaction(self, params, event):
+		message = self.get_message_data(params)
+
+		if message is None:
+			return self.error(404, 'Unknown Message', 10008)
+
+		await self.dispatch(int(message['guild_id']), event, dict(
+			user_id=str(self.bot_id), channel_id=message['channel_id'], message_id=message['id'],
+			guild_id=message['guild_id'], emoji=dict(id=None, name=params['emoji'])
+		))
+
+		return 204, None
+
+	@route('PUT', '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me')
+	async def add_own_reaction(self, params, body, query):
+		return await self._reaction(params, 'MESSAGE_REACTION_ADD')
+
+	@route('DELETE', '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/@me')
+	async def remove_own_reaction(self, params, body, query):
+		return await self._reaction(params, 'MESSAGE_REACTION_REMOVE')
+
+	@route('DELETE', '/channels/{channel_id}/messages/{message_id}/reactions/{emoji}/{user_id}')
+	async def remove_reaction(self, params, body, query):
+		return 204, None
+
+	@route('GET', '/guilds/{guild_id}')
+	async def get_guild(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+
+		if guild is None:
+			return self.error(404, 'Unknown Guild', 10004)
+
+		data = guild.data(list())
+		data.update(approximate_member_count=len(guild.members), approximate_presence_count=0)
+		return 200, data
+
+	@route('GET', '/guilds/{guild_id}/members/{user_id}')
+	async def get_member(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+		member = None if guild is None else guild.members.get(params['user_id'])
+
+		return (200, member) if member is not None else self.error(404, 'Unknown Member', 10007)
+
+	async def _member_update(self, guild, member):
+		await self.dispatch(guild.id, 'GUILD_MEMBER_UPDATE', dict(
+			guild_id=str(guild.id), user=member['user'], roles=member['roles'], nick=member['nick'],
+			joined_at=member['joined_at'], premium_since=None
+		))
+
+	async def _member_role(self, params, add):
+		guild = self.guilds.get(params['guild_id'])
+		member = None if guild is None else guild.members.get(params['user_id'])
+
+		if member is None:
+			return self.error(404, 'Unknown Member', 10007)
+
+		role_id = str(params['role_id'])
+		if role_id not in guild.roles and params['role_id'] not in guild.roles:
+			return self.error(404, 'Unknown Role', 10011)
+
+		if add and role_id not in member['roles']:
+			member['roles'].append(role_id)
+		elif not add and role_id in member['roles']:
+			member['roles'].remove(role_id)
+
+		await self._member_update(guild, member)
+		return 204, None
+
+	@route('PUT', '/guilds/{guild_id}/members/{user_id}/roles/{role_id}')
+	async def add_member_role(self, params, body, query):
+		return await self._member_role(params, True)
+
+	@route('DELETE', '/guilds/{guild_id}/members/{user_id}/roles/{role_id}')
+	async def remove_member_role(self, params, body, query):
+		return await self._member_role(params, False)
+
+	@route('PATCH', '/guilds/{guild_id}/members/{user_id}')
+	async def edit_member(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+		member = None if guild is None else guild.members.get(params['user_id'])
+
+		if member is None:
+			return self.error(404, 'Unknown Member', 10007)
+
+		if 'roles' in body:
+			member['roles'] = list(str(role_id) for role_id in body['roles'])
+
+		if 'nick' in body:
+			member['nick'] = body['nick']
+
+		await self._member_update(guild, member)
+		return 204, None
+
+	async def _remove_member(self, guild, user_id):
+		member = guild.members.pop(user_id, None)
+
+		if member is not None:
+			await self.dispatch(guild.id, 'GUILD_MEMBER_REMOVE', dict(guild_id=str(guild.id), user=member['user']))
+
+		return member
+
+	@route('DELETE', '/guilds/{guild_id}/members/{user_id}')
+	async def kick_member(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+
+		if guild is None or await self._remove_member(guild, params['user_id']) is None:
+			return self.error(404, 'Unknown Member', 10007)
+
+		return 204, None
+
+	@route('PUT', '/guilds/{guild_id}/bans/{user_id}')
+	async def ban_member(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+		user = self.users.get(params['user_id'])
+
+		if guild is None or user is None:
+			return self.error(404, 'Unknown User', 10013)
+
+		guild.bans.add(params['user_id'])
+
+		await self.dispatch(guild.id, 'GUILD_BAN_ADD', dict(guild_id=str(guild.id), user=user))
+		await self._remove_member(guild, params['user_id'])
+
+		return 204, None
+
+	@route('DELETE', '/guilds/{guild_id}/bans/{user_id}')
+	async def unban_member(self, params, body, query):
+		guild = self.guilds.get(params['guild_id'])
+
+		if guild is None or params['user_id'] not in guild.bans:
+			return self.error(404, 'Unknown Ban', 10026)
+
+		guild.bans.discard(params['user_id'])
+
+		await self.dispatch(guild.id, 'GUILD_BAN_REMOVE', dict(guild_id=str(guild.id), user=self.users[params['user_id']]))
+		return 204, None
+
+	# event streams
+
+	def random_member(self, guild):
+		# the bot and the owner are the first two
+		members = list(guild.members)
+		return members[self.rng.randrange(2, len(members))] if len(members) > 2 else guild.owner_id
+
+	def random_text(self):
+		return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 20)))
+
+	async def send_message(self, guild, channel_id, author_id, content):
+		message = self.make_message(guild, channel_id, author_id, content)
+		self.mark('MESSAGE_CREATE', channel_id, guild.id)
+		await self.dispatch(guild.id, 'MESSAGE_CREATE', message)
+
+	async def emit_message(self):
+		args = self.args
+
+		guild = self.rng.choice(list(self.guilds.values()))
+		channel_id = self.rng.choice(list(guild.channels))
+		author_id = self.random_member(guild)
+
+		roll = self.rng.random()
+
+		if roll < args.spam_ratio:
+			content = self.random_text()
+
+			for _ in range(args.spam_burst):
+				await self.send_message(guild, channel_id, author_id, content)
+
+		elif roll < args.spam_ratio + args.command_ratio:
+			await self.send_message(guild, channel_id, author_id, args.prefix + self.rng.choice(COMMANDS))
+
+		else:
+			await self.send_message(guild, channel_id, author_id, self.random_text())
+
+	def reaction_data(self, guild, channel_id, message_id, user_id, emoji):
+		return dict(
+			user_id=str(user_id), channel_id=str(channel_id), message_id=str(message_id), guild_id=str(guild.id),
+			emoji=dict(id=None, name=emoji)
+		)
+
+	async def emit_reaction(self):
+		guild = self.rng.choice(list(self.guilds.values()))
+		channel_id = self.rng.choice(list(guild.channels))
+
+		recent = list(message_id for message_id in self.history[channel_id] if message_id in self.messages)[-50:]
+
+		if not recent:
+			return
+
+		message_id = self.rng.choice(recent)
+		user_id = self.random_member(guild)
+		emoji = self.rng.choice(self.args.emojis)
+
+		key = (channel_id, message_id, user_id, emoji)
+		if key in self.reacted:
+			return
+
+		self.reacted[key] = None
+
+		data = self.reaction_data(guild, channel_id, message_id, user_id, emoji)
+		data['member'] = guild.members.get(user_id)
+
+		self.mark('MESSAGE_REACTION_ADD', channel_id, guild.id)
+		await self.dispatch(guild.id, 'MESSAGE_REACTION_ADD', data)
+
+	async def emit_unreaction(self):
+		if not self.reacted:
+			return
+
+		# mostly recent reactions get taken back
+		keys = list(self.reacted)[-100:]
+		key = self.rng.choice(keys)
+		del self.reacted[key]
+
+		channel_id, message_id, user_id, emoji = key
+		guild, _ = self.find_channel(channel_id)
+
+		self.mark('MESSAGE_REACTION_REMOVE', channel_id, guild.id)
+		await self.dispatch(guild.id, 'MESSAGE_REACTION_REMOVE', self.reaction_data(guild, channel_id, message_id, user_id, emoji))
+
+	async def emit_join(self):
+		guild = self.rng.choice(list(self.guilds.values()))
+		member = self.add_member(guild, self.add_user())
+
+		self.mark('GUILD_MEMBER_ADD', guild.id)
+		await self.dispatch(guild.id, 'GUILD_MEMBER_ADD', dict(member, guild_id=str(guild.id)))
+
+	async def emit_bulk_delete(self):
+		guild = self.rng.choice(list(self.guilds.values()))
+		channel_id = self.rng.choice(list(guild.channels))
+
+		ids = list(message_id for message_id in self.history[channel_id] if message_id in self.messages)[-self.args.bulk_size:]
+
+		if not ids:
+			return
+
+		for message_id in ids:
+			del self.messages[message_id]
+
+		self.mark('MESSAGE_DELETE_BULK', channel_id, guild.id)
+		await self.dispatch(guild.id, 'MESSAGE_DELETE_BULK', dict(
+			ids=list(str(message_id) for message_id in ids), channel_id=str(channel_id), guild_id=str(guild.id)
+		))
+
+	async def stream(self, rate, emit):
+		'''Call emit rate times per second, catching up if the loop falls behind.'''
+
+		if rate <= 0:
+			return
+
+		start = monotonic()
+		done = 0
+
+		while True:
+			due = int((monotonic() - start) * rate)
+
+			while done < due:
+				await emit()
+				done += 1
+
+			await asyncio.sleep(max(0.001, start + (done + 1) / rate - monotonic()))
+
+	async def run_setup(self):
+		with open(self.args.setup, encoding='utf-8') as f:
+			lines = list(line.strip() for line in f if line.strip())
+
+		for guild in self.guilds.values():
+			channel_id = next(iter(guild.channels))
+
+			for line in lines:
+				await self.send_message(guild, channel_id, guild.owner_id, line)
+				await asyncio.sleep(self.args.setup_delay)
+
+	async def run(self, ws_url):
+		self.ws_url = ws_url
+
+		print('Waiting for the bot to identify...')
+		await self.identified.wait()
+
+		# give the bot time to finish starting up
+		await asyncio.sleep(self.args.warmup)
+
+		if self.args.setup:
+			print('Sending setup messages...')
+			await self.run_setup()
+
+		print('Streaming events for {0} seconds'.format(self.args.duration))
+
+		self.events.clear()
+		self.routes.clear()
+		self.started_at = monotonic()
+
+		args = self.args
+		streams = (
+			(args.messages, self.emit_message),
+			(args.reactions, self.emit_reaction),
+			(args.unreactions, self.emit_unreaction),
+			(args.joins, self.emit_join),
+			(args.bulk_deletes, self.emit_bulk_delete),
+		)
+
+		tasks = list(asyncio.ensure_future(self.stream(rate, emit)) for rate, emit in streams)
+
+		try:
+			await asyncio.sleep(args.duration)
+		finally:
+			for task in tasks:
+				task.cancel()
+
+		# leave the bot time to catch up before summarizing
+		await asyncio.sleep(args.cooldown)
+
+	def report(self):
+		elapsed = monotonic() - self.started_at if self.started_at else 0.0
+
+		print('\n{0:<24} {1:>10} {2:>10}'.format('Event', 'Sent', 'Per sec'))
+
+		for kind, count in sorted(self.events.items()):
+			print('{0:<24} {1:>10,d} {2:>10.1f}'.format(kind, count, count / elapsed if elapsed else 0.0))
+
+		def ms(value):
+			return '' if value is None else '{0:.1f}'.format(value * 1000)
+
+		print('\n{0:<64} {1:>8} {2:>6} {3:>6} {4:>8} {5:>8} {6:>8}'.format(
+			'Route', 'Calls', '429s', 'Errors', 'p50 ms', 'p95 ms', 'p99 ms'
+		))
+
+		for key, stats in sorted(self.routes.items(), key=lambda item: item[1].calls, reverse=True):
+			print('{0:<64} {1:>8,d} {2:>6,d} {3:>6,d} {4:>8} {5:>8} {6:>8}'.format(
+				key, stats.calls, stats.limited, stats.errors,
+				ms(percentile(stats.lags, 0.5)), ms(percentile(stats.lags, 0.95)), ms(percentile(stats.lags, 0.99))
+			))
+
+		if self.unhandled:
+			print('\nUnhandled routes:')
+
+			for key, count in sorted(self.unhandled.items(), key=lambda item: item[1], reverse=True):
+				print('{0:>8,d} {1}'.format(count, key))
+
+
+async def main(args):
+	sim = Simulator(args)
+
+	app = web.Application()
+	app.router.add_get('/gateway', sim.gateway)
+	app.router.add_route('*', '/api/{version}/{path:.*}', sim.rest)
+
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+
+	site = web.TCPSite(runner, args.host, args.port)
+	await site.start()
+
+	print('Simulating {0} guilds with {1} channels and {2} members each'.format(args.guilds, args.channels, args.members))
+	print('Start the bot with: python ace.py --api-base http://{0}:{1}/api/v7'.format(args.host, args.port))
+
+	if args.record:
+		sim.record = open(args.record, 'w', encoding='utf-8')
+
+	run = asyncio.ensure_future(sim.run('ws://{0}:{1}/gateway'.format(args.host, args.port)))
+
+	# ctrl+c stops early but still prints the summary
+	try:
+		asyncio.get_event_loop().add_signal_handler(signal.SIGINT, run.cancel)
+	except NotImplementedError:
+		pass  # not supported on windows
+
+	try:
+		await run
+	except asyncio.CancelledError:
+		pass
+	finally:
+		sim.report()
+
+		if sim.record is not None:
+			sim.record.close()
+
+		await runner.cleanup()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Local Discord gateway and REST simulator.')
+
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--shards', type=int, default=1, help='Shard count returned by /gateway/bot.')
+	parser.add_argument('--seed', type=int, default=1)
+
+	parser.add_argument('--guilds', type=int, default=10)
+	parser.add_argument('--channels', type=int, default=5, help='Text channels per guild.')
+	parser.add_argument('--members', type=int, default=200, help='Members per guild.')
+
+	parser.add_argument('--messages', type=float, default=50.0, help='MESSAGE_CREATE per second.')
+	parser.add_argument('--reactions', type=float, default=5.0, help='MESSAGE_REACTION_ADD per second.')
+	parser.add_argument('--unreactions', type=float, default=1.0, help='MESSAGE_REACTION_REMOVE per second.')
+	parser.add_argument('--joins', type=float, default=0.5, help='GUILD_MEMBER_ADD per second.')
+	parser.add_argument('--bulk-deletes', type=float, default=0.0, help='MESSAGE_DELETE_BULK per second.')
+	parser.add_argument('--bulk-size', type=int, default=10, help='Messages removed per bulk delete.')
+
+	parser.add_argument('--prefix', default='.')
+	parser.add_argument('--command-ratio', type=float, default=0.05, help='Share of messages that are commands.')
+	parser.add_argument('--spam-ratio', type=float, default=0.01, help='Share of messages that start a spam burst.')
+	parser.add_argument('--spam-burst', type=int, default=8, help='Identical messages in a spam burst.')
+	parser.add_argument('--emojis', nargs='+', default=['\N{WHITE MEDIUM STAR}'], help='Emojis to react with.')
+
+	parser.add_argument('--rest-limit', type=int, default=5, help='Requests per bucket per period, 0 to disable.')
+	parser.add_argument('--rest-period', type=float, default=5.0, help='Rate limit period in seconds.')
+
+	parser.add_argument('--setup', help='File of messages the guild owners send before streaming starts.')
+	parser.add_argument('--setup-delay', type=float, default=0.5)
+	parser.add_argument('--warmup', type=float, default=5.0, help='Seconds to wait after the first shard identifies.')
+	parser.add_argument('--duration', type=float, default=60.0)
+	parser.add_argument('--cooldown', type=float, default=5.0, help='Seconds to wait for the bot after streaming ends.')
+	parser.add_argument('--record', help='Write every REST call as a JSON line to this file.')
+
+	args = parser.parse_args()
+
+	try:
+		asyncio.get_event_loop().run_until_complete(main(args))
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,187 @@
+'''Per-message and per-request cost with the default and the fast runtime profile.
+
+Run from the repository root with requirements and requirements-fast.txt installed:
+	python -m benchmarks.fast_runtime
+
+Each profile runs in its own process, since the event loop policy and patched decoders can't be undone. Messages are
+synthetic MESSAGE_CREATE payloads decoded the way the gateway decodes them, then dispatched as a task each, like the
+lib does. Requests go to a local aiohttp server returning a JSON document and are decoded with resp.json().
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import subprocess
+import sys
+from time import perf_counter
+
+import aiohttp
+from aiohttp import web
+
+MESSAGES = 50000
+REQUESTS = 5000
+CONCURRENCY = 20
+ROUNDS = 3
+
+PROFILES = ('default', 'fast')
+
+
+def make_payloads():
+	rng = random.Random(1)
+	payloads = list()
+
+	for idx in range(MESSAGES):
+		content = ' '.join(
+			''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(rng.randint(1, 30))
+		)
+
+		payloads.append(json.dumps(dict(op=0, s=idx, t='MESSAGE_CREATE', d=dict(
+			id=str(rng.getrandbits(63)),
+			channel_id=str(rng.getrandbits(63)),
+			guild_id=str(rng.getrandbits(63)),
+			content=content,
+			timestamp='2021-05-01T12:00:00.000000+00:00',
+			tts=False,
+			mention_everyone=False,
+			mentions=[],
+			mention_roles=[],
+			attachments=[],
+			embeds=[],
+			pinned=False,
+			type=0,
+			author=dict(id=str(rng.getrandbits(63)), username='user', discriminator='0001', avatar=None),
+			member=dict(roles=[str(rng.getrandbits(63)) for _ in range(5)], joined_at='2020-01-01T00:00:00+00:00'),
+		))))
+
+	return payloads
+
+
+def make_document():
+	rng = random.Random(2)
+	return json.dumps(list(
+		dict(id=idx, name=''.join(rng.choices(string.ascii_letters, k=12)), score=rng.random(), tags=['a', 'b', 'c'])
+		for idx in range(100)
+	))
+
+
+async def measure_messages(loads):
+	payloads = make_payloads()
+	loop = asyncio.get_event_loop()
+	seen = 0
+
+	async def handler(msg):
+		nonlocal seen
+		seen += len(msg['d']['content'])
+
+	best = None
+
+	for _ in range(ROUNDS):
+		start = perf_counter()
+
+		tasks = list(loop.create_task(handler(loads(raw))) for raw in payloads)
+		await asyncio.gather(*tasks)
+
+		elapsed = perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+
+	return best / MESSAGES
+
+
+async def measure_requests(runtime):
+	document = make_document()
+
+	async def handle(request):
+		return web.Response(text=document, content_type='application/json')
+
+	app = web.Application()
+	app.router.add_get('/', handle)
+
+	runner = web.AppRunner(app, access_log=None)
+	await runner.setup()
+
+	site = web.TCPSite(runner, 'localhost', 0)
+	await site.start()
+
+	port = site._server.sockets[0].getsockname()[1]
+	url = 'http://localhost:{0}/'.format(port)
+
+	best = None
+
+	async with aiohttp.ClientSession(**runtime.session_kwargs()) as session:
+		semaphore = asyncio.Semaphore(CONCURRENCY)
+
+		async def request():
+			async with semaphore:
+				async with session.get(url) as resp:
+					await resp.json()
+
+		for _ in range(ROUNDS):
+			start = perf_counter()
+			await asyncio.gather(*(request() for _ in range(REQUESTS)))
+
+			elapsed = perf_counter() - start
+			best = elapsed if best is None else min(best, elapsed)
+
+	await runner.cleanup()
+
+	return best / REQUESTS
+
+
+def run_profile(profile):
+	import discord.gateway
+
+	from utils.fastruntime import Runtime, enable_fast_runtime
+
+	runtime = enable_fast_runtime() if profile == 'fast' else Runtime()
+
+	# the same reference the gateway decodes with, patched or not
+	loads = discord.gateway.json.loads
+
+	loop = asyncio.get_event_loop()
+
+	result = dict(
+		runtime=runtime.name,
+		message=loop.run_until_complete(measure_messages(loads)),
+		request=loop.run_until_complete(measure_requests(runtime)),
+	)
+
+	print(json.dumps(result))
+
+
+def main():
+	results = dict()
+
+	for profile in PROFILES:
+		output = subprocess.run(
+			(sys.executable, '-m', 'benchmarks.fast_runtime', '--profile', profile),
+			check=True, stdout=subprocess.PIPE, universal_newlines=True
+		).stdout
+
+		results[profile] = json.loads(output.strip().splitlines()[-1])
+
+	before, after = results['default'], results['fast']
+
+	print('{0:,d} messages, {1:,d} requests ({2} concurrent), best of {3} rounds'.format(
+		MESSAGES, REQUESTS, CONCURRENCY, ROUNDS
+	))
+	print('fast profile: {0}\n'.format(after['runtime']))
+
+	print('{0:>16} {1:>12} {2:>12} {3:>8}'.format('', 'default', 'fast', 'speedup'))
+
+	for key in ('message', 'request'):
+		print('{0:>16} {1:>10.2f}us {2:>10.2f}us {3:>7.2f}x'.format(
+			'per ' + key, before[key] * 1e6, after[key] * 1e6, before[key] / after[key]
+		))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--profile', choices=PROFILES)
+	args = parser.parse_args()
+
+	if args.profile is None:
+		main()
+	else:
+		run_profile(args.profile)
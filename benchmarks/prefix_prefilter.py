@@ -0,0 +1,118 @@
+'''Per-message cost of AceBot.process_commands for guild chat, with and without the prefix prefilter.
+
+Run from the repository root with requirements installed:
+	python -m benchmarks.prefix_prefilter
+
+No connection to Discord or the database is made, so config.py isn't needed and placeholders are used instead. Guild
+configs are put in the cache directly, the same way they are after startup preloading.
+'''
+
+import asyncio
+import logging
+import random
+import string
+import sys
+from time import perf_counter
+from types import ModuleType, SimpleNamespace
+
+import discord
+
+DEFAULT_PREFIX = '.'
+
+# ace star imports config.py, which is per instance and not in the repo. it gets discord from there too, like the
+# config in INSTALL.md
+config = ModuleType('config')
+config.__dict__.update(
+	discord=discord, DESCRIPTION='benchmark', BOT_TOKEN=None, BOT_INTENTS=discord.Intents.none(),
+	DEFAULT_PREFIX=DEFAULT_PREFIX, OWNER_ID=0, DB_BIND=None, LOG_LEVEL=logging.INFO, BOT_ACTIVITY=None,
+	CLOUDAHK_URL=None, CLOUDAHK_USER=None, CLOUDAHK_PASS=None, METRICS_PORT=None,
+	DBL_KEY=None, THECATAPI_KEY=None, WOLFRAM_KEY=None, APIXU_KEY=None,
+)
+sys.modules['config'] = config
+
+from ace import AceBot
+
+GUILDS = 500
+MESSAGES = 50000
+ROUNDS = 5
+
+# most guild messages are chat, a few look like (unknown) commands
+COMMAND_RATIO = 0.02
+
+# messages per second the bot sees, for turning per-message cost into loop time
+RATES = (50, 500, 5000)
+
+
+def make_messages(bot, guild_ids):
+	rng = random.Random(1)
+	messages = list()
+
+	for _ in range(MESSAGES):
+		words = (''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(rng.randint(1, 20)))
+		content = ' '.join(words)
+
+		if rng.random() < COMMAND_RATIO:
+			content = DEFAULT_PREFIX + content
+
+		messages.append(SimpleNamespace(
+			content=content,
+			guild=SimpleNamespace(id=rng.choice(guild_ids)),
+			author=SimpleNamespace(id=rng.randint(1, 1 << 60), bot=False),
+			_state=bot._connection,
+		))
+
+	return messages
+
+
+async def measure(bot, messages):
+	best = None
+
+	for _ in range(ROUNDS):
+		start = perf_counter()
+
+		for message in messages:
+			await bot.process_commands(message)
+
+		elapsed = perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+
+	return best / len(messages)
+
+
+async def main():
+	bot = AceBot(db=None, shard_count=1, intents=discord.Intents.none())
+	bot._connection.user = SimpleNamespace(id=1, mention='<@1>')
+
+	# unknown commands would otherwise load the deferred cogs in the middle of a round
+	bot.deferred_extensions = set()
+
+	guild_ids = list(range(1000, 1000 + GUILDS))
+
+	for idx, guild_id in enumerate(guild_ids):
+		await bot.config.insert_record(dict(id=idx, guild_id=guild_id, prefix=None, mod_role_id=None))
+
+	messages = make_messages(bot, guild_ids)
+
+	after = await measure(bot, messages)
+
+	# the old path builds a context for every message
+	bot.could_be_command = lambda message: True
+	before = await measure(bot, messages)
+
+	print('{0:,d} messages, {1:.0%} prefixed, best of {2} rounds\n'.format(MESSAGES, COMMAND_RATIO, ROUNDS))
+	print('{0:>24} {1:>12} {2:>12}'.format('', 'before', 'after'))
+	print('{0:>24} {1:>10.2f}us {2:>10.2f}us'.format('per message', before * 1e6, after * 1e6))
+
+	for rate in RATES:
+		print('{0:>24} {1:>11.2%} {2:>11.2%}'.format(
+			'loop time at {0:,d} msg/s'.format(rate), before * rate, after * rate
+		))
+
+	print('\nspeedup: {0:.1f}x'.format(before / after))
+
+	await bot.command_log.close()
+	await bot.aiohttp.close()
+
+
+if __name__ == '__main__':
+	asyncio.get_event_loop().run_until_complete(main())
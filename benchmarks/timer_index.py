@@ -0,0 +1,143 @@
+'''Cost of the timers' next-record lookup as the timer tables grow, with and without their indexes.
+
+Run from the repository root with config.py in place and the database running:
+	python -m benchmarks.timer_index
+
+Everything happens in temporary tables shaped like mod_timer and remind, so no real data is touched. For each size the
+lookup the timers run is explained with EXPLAIN (ANALYZE, FORMAT JSON), first on the old created_at + duration
+expression and an unindexed remind_on, then on the indexed due_at and remind_on columns.
+'''
+
+import asyncio
+import json
+
+import asyncpg
+
+from config import DB_BIND
+
+SIZES = (1000, 10000, 100000, 1000000)
+ROUNDS = 5
+
+# share of mutes without a duration, which the timer never picks up
+NO_DURATION = 0.2
+
+SETUP = '''
+CREATE TEMP TABLE bench_mod_timer (
+	id			SERIAL UNIQUE,
+	guild_id	BIGINT NOT NULL,
+	user_id		BIGINT NOT NULL,
+	created_at	TIMESTAMP NOT NULL,
+	duration	INTERVAL NULL,
+	due_at		TIMESTAMP NULL
+);
+
+CREATE TEMP TABLE bench_remind (
+	id			SERIAL UNIQUE,
+	guild_id	BIGINT NOT NULL,
+	user_id		BIGINT NOT NULL,
+	remind_on	TIMESTAMP NOT NULL
+);
+'''
+
+FILL = '''
+INSERT INTO bench_mod_timer (guild_id, user_id, created_at, duration, due_at)
+SELECT g, g, created_at, duration, created_at + duration
+FROM (
+	SELECT
+		g,
+		now()::timestamp - random() * INTERVAL '30 days' AS created_at,
+		CASE WHEN random() < {0} THEN NULL ELSE random() * INTERVAL '60 days' END AS duration
+	FROM generate_series(1, $1) AS g
+) AS rows;
+
+INSERT INTO bench_remind (guild_id, user_id, remind_on)
+SELECT g, g, now()::timestamp + random() * INTERVAL '365 days' FROM generate_series(1, $1) AS g;
+'''.format(NO_DURATION)
+
+INDEXES = '''
+CREATE INDEX bench_mod_timer_due_at_idx ON bench_mod_timer (due_at) WHERE due_at IS NOT NULL;
+CREATE INDEX bench_remind_remind_on_idx ON bench_remind (remind_on);
+'''
+
+LOOKUPS = dict(
+	mod_timer_old='SELECT * FROM bench_mod_timer WHERE duration IS NOT NULL ORDER BY created_at + duration LIMIT 1',
+	mod_timer_new='SELECT * FROM bench_mod_timer WHERE due_at IS NOT NULL ORDER BY due_at LIMIT 1',
+	remind='SELECT * FROM bench_remind WHERE remind_on IS NOT NULL ORDER BY remind_on LIMIT 1',
+)
+
+
+async def explain(con, query):
+	'''Best execution time in ms, and the node reading the table with how many rows it produced.'''
+
+	best = None
+	node = None
+
+	for _ in range(ROUNDS):
+		plan = json.loads(await con.fetchval('EXPLAIN (ANALYZE, FORMAT JSON) ' + query))[0]
+
+		if best is None or plan['Execution Time'] < best:
+			best = plan['Execution Time']
+			node = plan['Plan']
+
+	# walk down to the node that reads the table
+	while 'Plans' in node:
+		node = node['Plans'][0]
+
+	return best, node['Node Type'], node.get('Actual Rows', 0)
+
+
+async def measure(con, size):
+	# rolled back at the end, which also throws the tables away
+	transaction = con.transaction()
+	await transaction.start()
+
+	try:
+		await con.execute(SETUP)
+
+		# a prepared statement can't run several statements, so fill the tables one at a time
+		for statement in FILL.split(';'):
+			if statement.strip():
+				await con.execute(statement, size)
+
+		await con.execute('ANALYZE bench_mod_timer; ANALYZE bench_remind')
+
+		before = dict(
+			mod_timer=await explain(con, LOOKUPS['mod_timer_old']),
+			remind=await explain(con, LOOKUPS['remind']),
+		)
+
+		await con.execute(INDEXES)
+		await con.execute('ANALYZE bench_mod_timer; ANALYZE bench_remind')
+
+		after = dict(
+			mod_timer=await explain(con, LOOKUPS['mod_timer_new']),
+			remind=await explain(con, LOOKUPS['remind']),
+		)
+	finally:
+		await transaction.rollback()
+
+	return before, after
+
+
+async def main():
+	con = await asyncpg.connect(DB_BIND)
+
+	print('Next-record lookup, best of {0} runs\n'.format(ROUNDS))
+	print('{0:>10} {1:<10} {2:>36} {3:>36}'.format('rows', 'table', 'before', 'after'))
+
+	def fmt(result):
+		ms, node, rows = result
+		return '{0:>8.3f}ms {1} ({2:,d} rows)'.format(ms, node, rows)
+
+	try:
+		for size in SIZES:
+			before, after = await measure(con, size)
+
+			for table in ('mod_timer', 'remind'):
+				print('{0:>10,d} {1:<10} {2:>36} {3:>36}'.format(size, table, fmt(before[table]), fmt(after[table])))
+	finally:
+		await con.close()
+
+
+if __name__ == '__main__':
+	asyncio.get_event_loop().run_until_complete(main())
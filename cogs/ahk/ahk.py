@@ -19,6 +19,7 @@ from config import CLOUDAHK_PASS, CLOUDAHK_URL, CLOUDAHK_USER
 from ids import *
 from utils.docs_parser import parse_docs
 from utils.html2markdown import HTML2Markdown
+from utils.metrics import timed_task
 from utils.pager import Pager
 
 log = logging.getLogger(__name__)
@@ -82,6 +83,11 @@ class AutoHotkey(AceMixin, commands.Cog):
 			big_box=False, max_len=512
 		)
 
+		self.bot.member_policy.add_check('ahk', lambda guild: guild.id == AHK_GUILD_ID)
+
+		if EMOJI_SUGGESTIONS_CHAN_ID is not None:
+			self.bot.message_policy.priority_channels.add(EMOJI_SUGGESTIONS_CHAN_ID)
+
 		self.forum_thread_channel = self.bot.get_channel(FORUM_THRD_CHAN_ID)
 		self.rss_time = datetime.now(tz=timezone(timedelta(hours=1))) - timedelta(minutes=1)
 
@@ -95,11 +101,13 @@ class AutoHotkey(AceMixin, commands.Cog):
 		return datetime.strptime(date_str[:-3] + date_str[-2:], "%Y-%m-%dT%H:%M:%S%z")
 
 	@tasks.loop(minutes=14)
+	@timed_task('ahk_rss')
 	async def rss(self):
-		async with self.bot.aiohttp.request('get', RSS_URL) as resp:
-			if resp.status != 200:
-				return
-			xml_rss = await resp.text('UTF-8')
+		# short ttl, so each run revalidates the feed instead of downloading it again
+		resp = await self.bot.web.get(RSS_URL, ttl=60.0)
+		if resp.status != 200:
+			return
+		xml_rss = resp.text('UTF-8')
 
 		xml = BeautifulSoup(xml_rss, 'xml')
 
@@ -236,7 +244,7 @@ class AutoHotkey(AceMixin, commands.Cog):
 			return
 
 		try:
-			message: discord.Message = await channel.fetch_message(reaction.message_id)
+			message: discord.Message = await self.bot.fetch_message_cached(channel, reaction.message_id)
 		except discord.HTTPException:
 			return
 
@@ -543,11 +551,11 @@ class AutoHotkey(AceMixin, commands.Cog):
 			'$top': 1,
 		}
 
-		async with ctx.http.get(url, params=params) as resp:
-			if resp.status != 200:
-				raise commands.CommandError('Query failed.')
+		resp = await ctx.web.get(url, params=params, ttl=3600.0)
+		if resp.status != 200:
+			raise commands.CommandError('Query failed.')
 
-			json = await resp.json()
+		json = resp.json()
 
 		if 'results' not in json or not json['results']:
 			raise commands.CommandError('No results.')
@@ -576,11 +584,11 @@ class AutoHotkey(AceMixin, commands.Cog):
 
 		url = 'https://api.github.com/repos/Lexikos/AutoHotkey_L/releases'
 
-		async with ctx.http.get(url) as resp:
-			if resp.status != 200:
-				raise commands.CommandError('Query failed.')
+		resp = await ctx.web.get(url, ttl=600.0)
+		if resp.status != 200:
+			raise commands.CommandError('Query failed.')
 
-			js = await resp.json()
+		js = resp.json()
 
 		latest = js[0]
 		asset = latest['assets'][0]
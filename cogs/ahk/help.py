@@ -14,6 +14,7 @@ from ids import (
 	GET_HELP_CHAN_ID, IGNORE_ACTIVE_CHAN_IDS, OPEN_CATEGORY_ID, RULES_CHAN_ID
 )
 from utils.context import is_mod
+from utils.metrics import timed_task
 from utils.string import po
 from utils.time import pretty_timedelta
 from config import GAME_PRED_URL
@@ -51,6 +52,11 @@ class AutoHotkeyHelpSystem(AceMixin, commands.Cog):
 		self.channel_reclaimer.start()
 		self.claimed_messages = dict()
 
+		# help channels get looked at long after the messages in them were sent
+		self.bot.message_policy.priority_categories.update(
+			category_id for category_id in (OPEN_CATEGORY_ID, ACTIVE_CATEGORY_ID) if category_id is not None
+		)
+
 	async def classify(self, text):
 		async with self.bot.aiohttp.post(GAME_PRED_URL, data=dict(q=text)) as resp:
 			if resp.status != 200:
@@ -93,6 +99,7 @@ class AutoHotkeyHelpSystem(AceMixin, commands.Cog):
 			f.write(dumps(self.claimed_channel))
 
 	@tasks.loop(**CHECK_FREE_EVERY)
+	@timed_task('channel_reclaimer')
 	async def channel_reclaimer(self):
 		on_age = datetime.utcnow() - FREE_AFTER
 
@@ -32,11 +32,11 @@ class Dwitter(AceMixin, commands.Cog):
 			await self.dwitterlink(message, group[1])
 
 	async def dwitterlink(self, message, id):
-		async with self.bot.aiohttp.get(self.url + 'api/dweets/' + id) as resp:
-			if resp.status != 200:
-				return
+		resp = await self.bot.web.get(self.url + 'api/dweets/' + id, ttl=3600.0)
+		if resp.status != 200:
+			return
 
-			dweet = await resp.json()
+		dweet = resp.json()
 
 		if 'link' not in dweet:
 			return
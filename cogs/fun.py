@@ -11,10 +11,12 @@ import bs4
 import discord
 from bs4 import BeautifulSoup
 from discord.ext import commands, tasks
+from discord.http import Route
 from fuzzywuzzy import process
 
 from cogs.mixins import AceMixin
 from config import APIXU_KEY, THECATAPI_KEY, WOLFRAM_KEY
+from utils.metrics import timed_task
 from utils.time import pretty_timedelta
 
 QUERY_ERROR = commands.CommandError('Query failed, try again later.')
@@ -53,6 +55,10 @@ BALL_RESPONSES = [
 	"Don't count on it", 'My reply is no', 'My sources say no', 'Outlook not so good', 'Very doubtful'
 ]
 
+# comics never change, the latest one does
+XKCD_TTL = 24 * 3600.0
+XKCD_LATEST_TTL = 600.0
+
 QUERY_EXCEPTIONS = (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError, commands.CommandError)
 
 log = logging.getLogger(__name__)
@@ -90,7 +96,7 @@ class Fun(AceMixin, commands.Cog):
 
 		e.add_field(
 			name='Owner',
-			value=guild.owner.mention
+			value='<@{0}>'.format(guild.owner_id)
 		)
 
 		e.add_field(
@@ -132,34 +138,43 @@ class Fun(AceMixin, commands.Cog):
 
 		# MEMBERS
 
-		statuses = dict(
-			online=0,
-			idle=0,
-			dnd=0,
-			offline=0
-		)
+		if guild.chunked:
+			statuses = dict(
+				online=0,
+				idle=0,
+				dnd=0,
+				offline=0
+			)
 
-		total_online = 0
-
-		for member in guild.members:
-			status_str = str(member.status)
-			if status_str != "offline":
-				total_online += 1
-			statuses[status_str] += 1
-
-		member_desc = '{} {} {} {} {} {} {} {}'.format(
-			'<:online:635022092903120906>',
-			statuses['online'],
-			'<:idle:635022068290813952>',
-			statuses['idle'],
-			'<:dnd:635022045952081941>',
-			statuses['dnd'],
-			'<:offline:635022116462264320>',
-			statuses['offline']
-		)
+			total_online = 0
+
+			for member in guild.members:
+				status_str = str(member.status)
+				if status_str != "offline":
+					total_online += 1
+				statuses[status_str] += 1
+
+			member_desc = '{} {} {} {} {} {} {} {}'.format(
+				'<:online:635022092903120906>',
+				statuses['online'],
+				'<:idle:635022068290813952>',
+				statuses['idle'],
+				'<:dnd:635022045952081941>',
+				statuses['dnd'],
+				'<:offline:635022116462264320>',
+				statuses['offline']
+			)
+		else:
+			# not all members are cached, so ask discord for approximate counts instead
+			data = await self.bot.http.request(
+				Route('GET', '/guilds/{guild_id}', guild_id=guild.id), params=dict(with_counts='true')
+			)
+
+			total_online = data['approximate_presence_count']
+			member_desc = '<:online:635022092903120906> {}'.format(total_online)
 
 		e.add_field(
-			name='Members ({}/{})'.format(total_online, len(guild.members)),
+			name='Members ({}/{})'.format(total_online, guild.member_count),
 			value=member_desc, inline=False
 		)
 
@@ -432,6 +447,7 @@ class Fun(AceMixin, commands.Cog):
 			return None
 
 	@tasks.loop(hours=1.0)
+	@timed_task('cache_bill_vids')
 	async def cache_bill_vids(self):
 		'''Requests the bill videos from the website. 
 		Caching is done in order to speed up searching'''
@@ -445,10 +461,10 @@ class Fun(AceMixin, commands.Cog):
 	async def get_bill_data(self, file):
 		"""Get bill videos/songs and return the beautifulsoup object"""
 
-		async with self.bot.aiohttp.get(BILL_WURTZ_URL + file + '.html') as resp:
-			if resp.status != 200:
-				raise commands.CommandError('Request failed.')
-			content = await resp.text()
+		resp = await self.bot.web.get(BILL_WURTZ_URL + file + '.html')
+		if resp.status != 200:
+			raise commands.CommandError('Request failed.')
+		content = resp.text()
 
 		soup = BeautifulSoup(content, 'lxml')
 
@@ -550,7 +566,7 @@ class Fun(AceMixin, commands.Cog):
 
 		url = 'https://xkcd.com/info.0.json'
 
-		comic_json = await self.get_xkcd_json(url)
+		comic_json = await self.get_xkcd_json(url, ttl=XKCD_LATEST_TTL)
 		e = self.make_xkcd_embed(comic_json)
 
 		await ctx.send(embed=e)
@@ -560,10 +576,10 @@ class Fun(AceMixin, commands.Cog):
 
 		url = 'https://c.xkcd.com/random/comic/'
 
-		async with ctx.http.get(url) as resp:
-			if resp.status != 200:
-				raise commands.CommandError('Request failed.')
-			num = str(resp.url).lstrip('https://xkcd.com/').rstrip('/')
+		resp = await ctx.web.get(url)
+		if resp.status != 200:
+			raise commands.CommandError('Request failed.')
+		num = str(resp.url).lstrip('https://xkcd.com/').rstrip('/')
 
 		url = 'https://xkcd.com/{}/info.0.json'.format(num)
 		comic_json = await self.get_xkcd_json(url)
@@ -577,35 +593,34 @@ class Fun(AceMixin, commands.Cog):
 		relevant_xkcd_url = 'https://relevantxkcd.appspot.com/process?action=xkcd&query='
 		search_url = relevant_xkcd_url + urllib.parse.quote(search)
 
-		async with ctx.http.get(search_url) as resp:
-			text = await resp.text()
-			results = text.split('\n')
-			num = results[2].split(' ')[0]
+		resp = await ctx.web.get(search_url, ttl=3600.0)
+		results = resp.text().split('\n')
+		num = results[2].split(' ')[0]
 
-			e = await self.get_xkcd_comic(ctx, num)
+		e = await self.get_xkcd_comic(ctx, num)
 
-			more_results = f'[More results]({search_url})'
-			relevance = '**Relevancy:** {}%\n{}\n\n'.format(str(round(float(results[0]) * 100, 2)), more_results)
-			e.description = relevance + e.description
+		more_results = f'[More results]({search_url})'
+		relevance = '**Relevancy:** {}%\n{}\n\n'.format(str(round(float(results[0]) * 100, 2)), more_results)
+		e.description = relevance + e.description
 
-			await ctx.send(embed=e)
+		await ctx.send(embed=e)
 
 	async def get_xkcd_comic(self, ctx, id):
 		url = f'https://xkcd.com/{id}/info.0.json'
-		async with ctx.http.get(url) as resp:
-			if resp.status != 200:
-				raise commands.CommandError('Request failed.')
-			comic_json = await resp.json()
+		resp = await ctx.web.get(url, ttl=XKCD_TTL)
+		if resp.status != 200:
+			raise commands.CommandError('Request failed.')
+		comic_json = resp.json()
 		e = self.make_xkcd_embed(comic_json)
 		return e
 
-	async def get_xkcd_json(self, url):
-		async with self.bot.aiohttp.get(url) as resp:
-			if resp.status == 404:
-				raise commands.CommandError('Comic does not exist.')
-			if resp.status != 200:
-				raise commands.CommandError('Request failed.')
-			return await resp.json()
+	async def get_xkcd_json(self, url, ttl=XKCD_TTL):
+		resp = await self.bot.web.get(url, ttl=ttl)
+		if resp.status == 404:
+			raise commands.CommandError('Comic does not exist.')
+		if resp.status != 200:
+			raise commands.CommandError('Request failed.')
+		return resp.json()
 
 	def make_xkcd_embed(self, comic_json):
 		comic_url = 'https://xkcd.com/{}'.format(comic_json['num'])
@@ -628,10 +643,10 @@ class Fun(AceMixin, commands.Cog):
 
 		async with ctx.typing():
 			try:
-				async with ctx.http.get(WOOF_URL + 'woof', params=WOOF_HEADERS) as resp:
-					if resp.status != 200:
-						raise QUERY_ERROR
-					file = await resp.text()
+				resp = await ctx.web.get(WOOF_URL + 'woof', params=WOOF_HEADERS)
+				if resp.status != 200:
+					raise QUERY_ERROR
+				file = resp.text()
 
 				if file.lower().endswith('.webm'):
 					log.info('woof got webm, reinvoking...')
@@ -653,10 +668,10 @@ class Fun(AceMixin, commands.Cog):
 
 		async with ctx.typing():
 			try:
-				async with ctx.http.get(MEOW_URL, headers=MEOW_HEADERS) as resp:
-					if resp.status != 200:
-						raise QUERY_ERROR
-					json = await resp.json()
+				resp = await ctx.web.get(MEOW_URL, headers=MEOW_HEADERS)
+				if resp.status != 200:
+					raise QUERY_ERROR
+				json = resp.json()
 
 				data = json[0]
 				img_url = data['url']
@@ -673,10 +688,10 @@ class Fun(AceMixin, commands.Cog):
 
 		async with ctx.typing():
 			try:
-				async with ctx.http.get(QUACK_URL) as resp:
-					if resp.status != 200:
-						raise QUERY_ERROR
-					json = await resp.json()
+				resp = await ctx.web.get(QUACK_URL)
+				if resp.status != 200:
+					raise QUERY_ERROR
+				json = resp.json()
 
 				img_url = json['url']
 
@@ -692,10 +707,10 @@ class Fun(AceMixin, commands.Cog):
 
 		async with ctx.typing():
 			try:
-				async with ctx.http.get(FLOOF_URL) as resp:
-					if resp.status != 200:
-						raise QUERY_ERROR
-					json = await resp.json()
+				resp = await ctx.web.get(FLOOF_URL)
+				if resp.status != 200:
+					raise QUERY_ERROR
+				json = resp.json()
 
 				img_url = json['image']
 
@@ -714,10 +729,10 @@ class Fun(AceMixin, commands.Cog):
 
 		async with ctx.typing():
 			try:
-				async with ctx.http.get(MEOW_URL, params=dict(breed_ids=choice(MEOW_BREEDS)), headers=MEOW_HEADERS) as resp:
-					if resp.status != 200:
-						raise QUERY_ERROR
-					json = await resp.json()
+				resp = await ctx.web.get(MEOW_URL, params=dict(breed_ids=choice(MEOW_BREEDS)), headers=MEOW_HEADERS)
+				if resp.status != 200:
+					raise QUERY_ERROR
+				json = resp.json()
 
 				data = json[0]
 
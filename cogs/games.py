@@ -7,6 +7,7 @@ from random import choice, randrange, sample
 from typing import Optional
 from urllib.parse import unquote
 
+import aiohttp
 import discord
 from discord.ext import commands
 from fuzzywuzzy import fuzz, process
@@ -134,7 +135,7 @@ class Games(AceMixin, commands.Cog):
 	def __init__(self, bot):
 		super().__init__(bot)
 
-		self.config = ConfigTable(bot, 'trivia', ('guild_id', 'user_id'))
+		self.config = ConfigTable(bot, 'trivia', ('guild_id', 'user_id'), max_size=4096, ttl=3600.0)
 
 		self.trivia_categories = None
 
@@ -142,17 +143,18 @@ class Games(AceMixin, commands.Cog):
 
 	async def get_trivia_categories(self):
 		try:
-			async with self.bot.aiohttp.get(API_CATEGORY_LIST_URL) as resp:
-				if resp.status != 200:
-					log.info('Failed getting trivia categories, trying again in 10 seconds...')
-					await asyncio.sleep(10)
-					asyncio.create_task(self.get_trivia_categories())
-					return
+			resp = await self.bot.web.get(API_CATEGORY_LIST_URL)
+		except (aiohttp.ClientError, asyncio.TimeoutError):
+			return
 
-				res = await resp.json()
-		except asyncio.TimeoutError:
+		if resp.status != 200:
+			log.info('Failed getting trivia categories, trying again in 10 seconds...')
+			await asyncio.sleep(10)
+			asyncio.create_task(self.get_trivia_categories())
 			return
 
+		res = resp.json()
+
 		categories = dict()
 
 		for category in res['trivia_categories']:
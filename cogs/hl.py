@@ -89,7 +89,7 @@ class Highlighter(AceMixin, commands.Cog):
 			return
 
 		try:
-			message = await channel.fetch_message(payload.message_id)
+			message = await self.bot.fetch_message_cached(channel, payload.message_id)
 		except discord.HTTPException:
 			return
 
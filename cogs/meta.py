@@ -52,6 +52,9 @@ class Meta(AceMixin, commands.Cog):
 	async def stats(self, ctx, member: MaybeMemberConverter = None):
 		'''Show bot or user command stats.'''
 
+		# include commands still waiting in the log buffer
+		await self.bot.command_log.flush()
+
 		if member is None:
 			await self._stats_guild(ctx)
 		else:
@@ -168,6 +171,8 @@ class Meta(AceMixin, commands.Cog):
 	async def about(self, ctx, *, command: str = None):
 		'''Show info about the bot or a command.'''
 
+		await self.bot.command_log.flush()
+
 		if command is None:
 			await self._about_bot(ctx)
 		else:
@@ -187,18 +192,14 @@ class Meta(AceMixin, commands.Cog):
 		invokes = await self.db.fetchval('SELECT COUNT(*) FROM log')
 		e.add_field(name='Command invokes', value='{0:,d}'.format(invokes))
 
-		guilds, text, voice, users = 0, 0, 0, 0
-
-		for guild in self.bot.guilds:
-			guilds += 1
-			users += len(guild.members)
-			for channel in guild.channels:
-				if isinstance(channel, discord.TextChannel):
-					text += 1
-				elif isinstance(channel, discord.VoiceChannel):
-					voice += 1
+		# sum up over all clusters. unique users is only unique per cluster, but close enough
+		stats = [cluster for cluster in (await self.bot.cluster_request('stats')).values() if cluster is not None]
 
-		unique = len(self.bot.users)
+		guilds = sum(cluster['guilds'] for cluster in stats)
+		users = sum(cluster['members'] for cluster in stats)
+		unique = sum(cluster['users'] for cluster in stats)
+		text = sum(cluster['text'] for cluster in stats)
+		voice = sum(cluster['voice'] for cluster in stats)
 
 		e.add_field(name='Servers', value=str(guilds))
 
@@ -15,10 +15,11 @@ from discord.ext import commands
 
 from cogs.mixins import AceMixin
 from ids import AHK_GUILD_ID, RULES_MSG_ID
+from utils.actionscheduler import BAN, BULK_DELETE, MEMBER, MEMBER_ROLE, MESSAGE, Priority, bucket
 from utils.configtable import ConfigTable, ConfigTableRecord
 from utils.context import AceContext, can_prompt, is_mod
 from utils.converters import MaxLengthConverter, MaybeMemberConverter, RangeConverter
-from utils.databasetimer import DatabaseTimer
+from utils.databasetimer import ColumnTimer
 from utils.fakeuser import FakeUser
 from utils.pager import Pager
 from utils.string import po
@@ -173,21 +174,6 @@ class SecurityConfigRecord(ConfigTableRecord):
 		)
 
 
-class EventTimer(DatabaseTimer):
-	async def get_record(self):
-		return await self.bot.db.fetchrow(
-			'SELECT * FROM mod_timer WHERE duration IS NOT NULL AND created_at + duration < $1 '
-			'ORDER BY created_at + duration LIMIT 1',
-			datetime.utcnow() + self.MAX_SLEEP
-		)
-
-	async def cleanup_record(self, record):
-		await self.bot.db.execute('DELETE FROM mod_timer WHERE id=$1', record.get('id'))
-
-	def when(self, record):
-		return record.get('created_at') + record.get('duration')
-
-
 # ripped from RoboDanny
 class BannedMember(commands.Converter):
 	async def convert(self, ctx, argument):
@@ -270,8 +256,21 @@ class Moderation(AceMixin, commands.Cog):
 	def __init__(self, bot):
 		super().__init__(bot)
 
-		self.config = ConfigTable(bot, 'mod_config', 'guild_id', record_class=SecurityConfigRecord)
-		self.event_timer = EventTimer(bot, 'event_complete')
+		self.config = ConfigTable(
+			bot, 'mod_config', 'guild_id', record_class=SecurityConfigRecord, preload=True, write_delay=5.0
+		)
+
+		self.event_timer = ColumnTimer(bot, 'event_complete', table='mod_timer', column='due_at')
+
+		# anti-spam acts on members, so those guilds keep their full member list
+		self.bot.member_policy.add_check('security', self._security_enabled)
+
+	def cog_unload(self):
+		self.bot.unload_task(self.config.flush())
+
+	def _security_enabled(self, guild):
+		conf = self.config.peek(guild.id)
+		return conf is not None and (conf.spam_action is not None or conf.mention_action is not None)
 
 	@commands.Cog.listener()
 	async def on_log(self, guild, subject, action=None, severity=Severity.LOW, message=None, **fields):
@@ -326,7 +325,9 @@ class Moderation(AceMixin, commands.Cog):
 		'''Ban a member. Requires Ban Members perms.'''
 
 		try:
-			await member.ban(reason=reason, delete_message_days=0)
+			await self.bot.actions.run(
+				Priority.MODERATION, bucket(BAN, guild=ctx.guild), member.ban, reason=reason, delete_message_days=0
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Failed banning member.')
 
@@ -350,7 +351,9 @@ class Moderation(AceMixin, commands.Cog):
 			return
 
 		try:
-			await ctx.guild.unban(member.user, reason=reason)
+			await self.bot.actions.run(
+				Priority.MODERATION, bucket(BAN, guild=ctx.guild), ctx.guild.unban, member.user, reason=reason
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Failed unbanning member.')
 
@@ -376,7 +379,9 @@ class Moderation(AceMixin, commands.Cog):
 			raise commands.CommandError('Member already muted.')
 
 		try:
-			await member.add_roles(mute_role, reason=reason)
+			await self.bot.actions.run(
+				Priority.MODERATION, bucket(MEMBER_ROLE, guild=ctx.guild), member.add_roles, mute_role, reason=reason
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Mute failed.')
 
@@ -411,7 +416,10 @@ class Moderation(AceMixin, commands.Cog):
 		pretty_author = po(ctx.author)
 
 		try:
-			await member.remove_roles(mute_role, reason='Unmuted by {0}'.format(pretty_author))
+			await self.bot.actions.run(
+				Priority.MODERATION, bucket(MEMBER_ROLE, guild=ctx.guild), member.remove_roles, mute_role,
+				reason='Unmuted by {0}'.format(pretty_author)
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Failed removing mute role.')
 
@@ -433,7 +441,6 @@ class Moderation(AceMixin, commands.Cog):
 
 		now = datetime.utcnow()
 		duration = amount * unit
-		until = now + duration
 
 		if await ctx.is_mod(member):
 			raise commands.CommandError('Can\'t mute this member.')
@@ -452,20 +459,23 @@ class Moderation(AceMixin, commands.Cog):
 		async with self.db.acquire() as con:
 			async with con.transaction():
 				try:
-					await con.execute(
-						'INSERT INTO mod_timer (guild_id, user_id, mod_id, event, created_at, duration, reason, userdata) '
-						'VALUES ($1, $2, $3, $4, $5, $6, $7, $8)',
-						ctx.guild.id, member.id, ctx.author.id, 'MUTE', now, duration, reason, self._craft_user_data(member)
+					record = await con.fetchrow(
+						'INSERT INTO mod_timer (guild_id, user_id, mod_id, event, created_at, duration, due_at, reason, userdata) '
+						'VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING *',
+						ctx.guild.id, member.id, ctx.author.id, 'MUTE', now, duration, now + duration, reason,
+						self._craft_user_data(member)
 					)
 				except UniqueViolationError:
 					raise commands.CommandError('Member is already muted.')
 
 				try:
-					await member.add_roles(mute_role)
+					await self.bot.actions.run(
+						Priority.MODERATION, bucket(MEMBER_ROLE, guild=ctx.guild), member.add_roles, mute_role
+					)
 				except discord.HTTPException:
 					raise commands.CommandError('Failed adding mute role.')
 
-		self.event_timer.maybe_restart(until)
+		self.event_timer.add(record)
 
 		pretty_duration = pretty_timedelta(duration)
 
@@ -487,7 +497,6 @@ class Moderation(AceMixin, commands.Cog):
 
 		now = datetime.utcnow()
 		duration = amount * unit
-		until = now + duration
 
 		on_guild = isinstance(member, discord.Member)
 
@@ -526,21 +535,25 @@ class Moderation(AceMixin, commands.Cog):
 		async with self.db.acquire() as con:
 			async with con.transaction():
 				try:
-					await self.db.execute(
-						'INSERT INTO mod_timer (guild_id, user_id, mod_id, event, created_at, duration, reason, userdata) '
-						'VALUES ($1, $2, $3, $4, $5, $6, $7, $8)',
-						ctx.guild.id, member.id, ctx.author.id, 'BAN', now, duration, reason, self._craft_user_data(member)
+					record = await self.db.fetchrow(
+						'INSERT INTO mod_timer (guild_id, user_id, mod_id, event, created_at, duration, due_at, reason, userdata) '
+						'VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING *',
+						ctx.guild.id, member.id, ctx.author.id, 'BAN', now, duration, now + duration, reason,
+						self._craft_user_data(member)
 					)
 				except UniqueViolationError:
 					# this *should* never happen but I'd rather leave it in
 					raise commands.CommandError('Member is already tempbanned.')
 
 				try:
-					await ctx.guild.ban(member, delete_message_days=0, reason=reason)
+					await self.bot.actions.run(
+						Priority.MODERATION, bucket(BAN, guild=ctx.guild), ctx.guild.ban, member,
+						delete_message_days=0, reason=reason
+					)
 				except discord.HTTPException:
 					raise commands.CommandError('Failed tempbanning member.')
 
-		self.event_timer.maybe_restart(until)
+		self.event_timer.add(record)
 
 		try:
 			await ctx.send('{0} tempbanned for {1}.'.format(str(member), pretty_duration))
@@ -599,12 +612,13 @@ class Moderation(AceMixin, commands.Cog):
 		if not should_continue:
 			return
 
-		await self.db.execute(
-			'UPDATE mod_timer SET duration=$1 WHERE guild_id=$2 AND user_id=$3 AND event=$4',
+		record = await self.db.fetchrow(
+			'UPDATE mod_timer SET duration=$1, due_at=created_at + $1 WHERE guild_id=$2 AND user_id=$3 AND event=$4 RETURNING *',
 			duration, ctx.guild.id, member.user.id, 'BAN'
 		)
 
-		self.event_timer.restart_task()
+		if record is not None:
+			self.event_timer.add(record)
 
 		self.bot.dispatch(
 			'log', ctx.guild, member.user, action='TEMPBAN UPDATE', severity=Severity.HIGH, message=ctx.message,
@@ -641,15 +655,18 @@ class Moderation(AceMixin, commands.Cog):
 		if guild is None:
 			return
 
-		member = guild.get_member(user_id)
+		member = await self.bot.member_policy.resolve(guild, user_id)
 		if member is None:
 			return
 
-		mod = guild.get_member(mod_id)
+		mod = await self.bot.member_policy.resolve(guild, mod_id)
 		pretty_mod = '(ID: {0})'.format(str(mod_id)) if mod is None else po(mod)
 
 		try:
-			await member.remove_roles(mute_role, reason='Completed tempmute issued by {0}'.format(pretty_mod))
+			await self.bot.actions.run(
+				Priority.MODERATION, bucket(MEMBER_ROLE, guild=guild), member.remove_roles, mute_role,
+				reason='Completed tempmute issued by {0}'.format(pretty_mod)
+			)
 		except discord.HTTPException:
 			return
 
@@ -670,7 +687,7 @@ class Moderation(AceMixin, commands.Cog):
 		if guild is None:
 			return
 
-		mod = guild.get_member(mod_id)
+		mod = await self.bot.member_policy.resolve(guild, mod_id)
 		pretty_mod = '(ID: {0})'.format(str(mod_id)) if mod is None else po(mod)
 
 		member = FakeUser(user_id, guild, **userdata)
@@ -712,9 +729,9 @@ class Moderation(AceMixin, commands.Cog):
 			guild.id, user.id, 'BAN'
 		)
 
-		# also restart timer if the next in line *was* that tempban
+		# also unschedule the tempban
 		if _id is not None:
-			self.event_timer.restart_if(lambda r: r.get('id') == _id)
+			self.event_timer.remove(_id)
 
 			self.bot.dispatch(
 				'log', guild, user, action='TEMPBAN CANCELLED', severity=Severity.RESOLVED,
@@ -748,7 +765,8 @@ class Moderation(AceMixin, commands.Cog):
 				after.guild.id, after.id, 'MUTE'
 			)
 
-			self.event_timer.restart_if(lambda r: r.get('id') == _id)
+			if _id is not None:
+				self.event_timer.remove(_id)
 
 		elif after_has:  # not strictly necessary but more explicit
 			# mute role added
@@ -786,7 +804,10 @@ class Moderation(AceMixin, commands.Cog):
 
 		reason = 'Re-muting newly joined member who was previously muted'
 
-		await member.add_roles(mute_role, reason=reason)
+		await self.bot.actions.run(
+			Priority.MODERATION, bucket(MEMBER_ROLE, guild=member.guild), member.add_roles, mute_role, reason=reason
+		)
+
 		self.bot.dispatch('log', member.guild, member, action='MUTE', severity=Severity.LOW, reason=reason)
 
 	@commands.command()
@@ -810,12 +831,15 @@ class Moderation(AceMixin, commands.Cog):
 			return msg.author.id == user.id and all_check(msg)
 
 		try:
-			await ctx.message.delete()
+			await self.bot.actions.run(Priority.MODERATION, bucket(MESSAGE, channel=ctx.channel), ctx.message.delete)
 		except discord.HTTPException:
 			pass
 
 		try:
-			deleted = await ctx.channel.purge(limit=message_count, check=all_check if user is None else user_check)
+			deleted = await self.bot.actions.run(
+				Priority.MODERATION, bucket(BULK_DELETE, channel=ctx.channel), ctx.channel.purge,
+				limit=message_count, check=all_check if user is None else user_check
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Failed deleting messages. Does the bot have the necessary permissions?')
 
@@ -948,7 +972,10 @@ class Moderation(AceMixin, commands.Cog):
 			limit = max(0, min(PURGE_LIMIT, args.check))
 
 		try:
-			deleted_messages = await ctx.channel.purge(limit=limit, check=predicate, before=before, after=after)
+			deleted_messages = await self.bot.actions.run(
+				Priority.MODERATION, bucket(BULK_DELETE, channel=ctx.channel), ctx.channel.purge,
+				limit=limit, check=predicate, before=before, after=after
+			)
 		except discord.HTTPException:
 			raise commands.CommandError('Error occurred when deleting messages.')
 
@@ -1050,13 +1077,18 @@ class Moderation(AceMixin, commands.Cog):
 				if mute_role is None:
 					raise ValueError('No mute role set.')
 
-				await member.add_roles(mute_role, reason=reason)
+				await self.bot.actions.run(
+					Priority.MODERATION, bucket(MEMBER_ROLE, guild=guild), member.add_roles, mute_role, reason=reason
+				)
 
 			elif action is SecurityAction.KICK:
-				await member.kick(reason=reason)
+				await self.bot.actions.run(Priority.MODERATION, bucket(MEMBER, guild=guild), member.kick, reason=reason)
 
 			elif action is SecurityAction.BAN:
-				await member.ban(delete_message_days=delete_message_days, reason=reason)
+				await self.bot.actions.run(
+					Priority.MODERATION, bucket(BAN, guild=guild), member.ban,
+					delete_message_days=delete_message_days, reason=reason
+				)
 
 		except Exception as exc:
 			# log error if something happened
@@ -1184,6 +1216,7 @@ class Moderation(AceMixin, commands.Cog):
 		if action is None:
 			data = 'Anti-spam disabled.'
 		else:
+			self.bot.member_policy.require_full(ctx.guild)
 			data = self._craft_string(ctx, 'spam', conf, now=True)
 
 		await ctx.send(data)
@@ -1219,6 +1252,7 @@ class Moderation(AceMixin, commands.Cog):
 		if action is None:
 			data = 'Anti-mention disabled.'
 		else:
+			self.bot.member_policy.require_full(ctx.guild)
 			data = self._craft_string(ctx, 'mention', conf, now=True)
 
 		await ctx.send(data)
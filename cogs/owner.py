@@ -16,11 +16,12 @@ from discord.mixins import Hashable
 from tabulate import tabulate
 
 from cogs.mixins import AceMixin
-from config import BOT_ACTIVITY
 from utils.context import AceContext
 from utils.converters import MaxValueConverter
+from utils.loopmonitor import task_origin
 from utils.lookup import DiscordLookup
 from utils.pager import Pager
+from utils.queuelogging import DroppingQueueHandler
 from utils.string import shorten
 from utils.time import pretty_datetime, pretty_timedelta
 
@@ -193,8 +194,10 @@ class Owner(AceMixin, commands.Cog):
 	async def get(self, ctx, *, query: commands.clean_content):
 		'''Run a meta-python query.'''
 
+		members = await self.bot.member_policy.members_of(ctx.guild)
+
 		try:
-			res = DiscordLookup(ctx, query).run()
+			res = DiscordLookup(ctx, query, members).run()
 		except Exception as exc:
 			raise commands.CommandError('{}\n\n{}'.format(exc.__class__.__name__, str(exc)))
 
@@ -247,6 +250,201 @@ class Owner(AceMixin, commands.Cog):
 
 		await ctx.send('```{0}```'.format(tabulate(data, headers)))
 
+	@commands.command()
+	async def cluster(self, ctx):
+		'''Print stats for each cluster process.'''
+
+		results = await self.bot.cluster_request('stats')
+
+		data = list()
+
+		for cluster_id in range(self.bot.cluster_count):
+			stats = results.get(cluster_id)
+
+			if stats is None:
+				data.append((cluster_id, 'NO RESPONSE', '', '', ''))
+				continue
+
+			shards = stats['shards']
+
+			data.append((
+				cluster_id,
+				'{0}-{1}'.format(shards[0], shards[-1]) if len(shards) > 1 else str(shards[0]),
+				format(stats['guilds'], ',d'),
+				format(stats['members'], ',d'),
+				'{0:.0f} ms'.format(stats['latency'] * 1000),
+			))
+
+		headers = ('Cluster', 'Shards', 'Guilds', 'Members', 'Latency')
+
+		await ctx.send('```{0}```'.format(tabulate(data, headers)))
+
+	@commands.group(invoke_without_command=True)
+	async def queries(self, ctx, count: int = 10, sort_by='total'):
+		'''List the top queries by total time. Can also sort by calls, avg, max or rows.'''
+
+		stats = self.bot.query_stats
+
+		if stats is None:
+			raise commands.CommandError('Query stats are not enabled.')
+
+		if sort_by not in ('total', 'calls', 'avg', 'max', 'rows'):
+			raise commands.CommandError('Can\'t sort by that.')
+
+		def ms(seconds):
+			return 'N/A' if seconds is None else '{0:.1f}'.format(seconds * 1000)
+
+		data = list()
+
+		for stat in stats.top(count, key=sort_by):
+			origin, _ = stat.origins.most_common(1)[0]
+
+			data.append((
+				shorten(stat.query, 80),
+				format(stat.calls, ',d'),
+				ms(stat.total),
+				ms(stat.avg),
+				ms(stat.percentile(stats.BOUNDS, 0.95)),
+				ms(stat.max),
+				format(stat.rows, ',d'),
+				origin,
+			))
+
+		if not data:
+			raise commands.CommandError('No queries recorded.')
+
+		table = tabulate(data, ('Query', 'Calls', 'Total ms', 'Avg ms', 'p95 ms', 'Max ms', 'Rows', 'Top origin'))
+
+		if len(table) > 1994:
+			fp = io.BytesIO(table.encode('utf-8'))
+			await ctx.send('Too many results...', file=discord.File(fp, 'queries.txt'))
+		else:
+			await ctx.send('```' + table + '```')
+
+	@queries.command(name='slow')
+	async def queries_slow(self, ctx, threshold_ms: int = None):
+		'''Set the slow query log threshold. Leave argument empty to disable the slow query log.'''
+
+		self.bot.query_stats.slow_threshold = None if threshold_ms is None else threshold_ms / 1000
+
+		if threshold_ms is None:
+			await ctx.send('Slow query log disabled.')
+		else:
+			await ctx.send('Logging queries slower than {0} ms.'.format(threshold_ms))
+
+	@queries.command(name='reset')
+	async def queries_reset(self, ctx):
+		'''Clear all recorded query stats.'''
+
+		self.bot.query_stats.reset()
+		await ctx.send('Query stats cleared.')
+
+	@commands.command()
+	async def lag(self, ctx, stall: int = None):
+		'''Print event loop lag and the worst stalls. Pass a stall number to see its stack.'''
+
+		monitor = self.bot.loop_monitor
+		stalls = monitor.worst_stalls()
+
+		if stall is not None:
+			if not 0 < stall <= len(stalls):
+				raise commands.CommandError('No stall with that number.')
+
+			stack = ''.join(stalls[stall - 1].stack)
+
+			fp = io.BytesIO(stack.encode('utf-8'))
+			await ctx.send(file=discord.File(fp, 'stall-{0}.txt'.format(stall)))
+			return
+
+		summary = (
+			('Samples', format(monitor.samples, ',d')),
+			('Avg lag', '{0:.1f} ms'.format(monitor.avg_lag * 1000)),
+			('Max lag', '{0:.1f} ms'.format(monitor.max_lag * 1000)),
+			('Threshold', '{0:.0f} ms'.format(monitor.threshold * 1000)),
+		)
+
+		data = list()
+
+		for idx, entry in enumerate(stalls, 1):
+			# innermost frame is what was blocking
+			where = entry.stack[-1].strip().splitlines()[0] if entry.stack else ''
+			data.append((idx, '{0:.0f} ms'.format(entry.duration * 1000), pretty_datetime(entry.at), shorten(where, 80)))
+
+		text = tabulate(summary)
+
+		if data:
+			text += '\n\n' + tabulate(data, ('#', 'Blocked', 'At', 'Where'))
+
+		await ctx.send('```{0}```'.format(text))
+
+	@commands.command()
+	async def tasks(self, ctx):
+		'''List live asyncio tasks grouped by what they run.'''
+
+		now = datetime.utcnow()
+		created_at = self.bot.loop_monitor.created_at
+
+		groups = dict()
+
+		for task in asyncio.all_tasks():
+			origin = task_origin(task)
+			count, oldest = groups.get(origin, (0, None))
+
+			at = created_at.get(task)
+			if at is not None and (oldest is None or at < oldest):
+				oldest = at
+
+			groups[origin] = (count + 1, oldest)
+
+		data = list(
+			(shorten(origin, 60), count, 'N/A' if oldest is None else pretty_timedelta(now - oldest) or '< 1 second')
+			for origin, (count, oldest) in sorted(groups.items(), key=lambda item: item[1][0], reverse=True)
+		)
+
+		table = tabulate(data, ('Origin', 'Tasks', 'Oldest'))
+
+		if len(table) > 1994:
+			fp = io.BytesIO(table.encode('utf-8'))
+			await ctx.send('{0} tasks'.format(sum(count for count, _ in groups.values())), file=discord.File(fp, 'tasks.txt'))
+		else:
+			await ctx.send('```' + table + '```')
+
+	@commands.command()
+	async def startup(self, ctx):
+		'''Print startup and extension load timings.'''
+
+		def ms(seconds):
+			return '{0:.1f} ms'.format(seconds * 1000)
+
+		steps = list((name, ms(seconds)) for name, seconds in self.bot.startup_times.items())
+
+		extensions = sorted(self.bot.extension_times.items(), key=lambda item: item[1], reverse=True)
+		extensions = list((name, ms(seconds)) for name, seconds in extensions)
+		extensions.extend((name, 'deferred') for name in sorted(self.bot.deferred_extensions))
+
+		await ctx.send('```{0}\n\n{1}```'.format(
+			tabulate(steps, ('Step', 'Time')),
+			tabulate(extensions, ('Extension', 'Load time'))
+		))
+
+	@commands.command()
+	async def cmdlog(self, ctx):
+		'''Print command log buffer stats.'''
+
+		buf = self.bot.command_log
+		latency = buf.last_flush_latency
+
+		data = (
+			('Queued', format(buf.depth, ',d')),
+			('Written', format(buf.flushed, ',d')),
+			('Dropped', format(buf.dropped, ',d')),
+			('Last flush size', format(buf.last_flush_size, ',d')),
+			('Last flush latency', 'N/A' if latency is None else '{0:.2f} ms'.format(latency * 1000)),
+			('Max flush latency', '{0:.2f} ms'.format(buf.max_flush_latency * 1000)),
+		)
+
+		await ctx.send('```{0}```'.format(tabulate(data)))
+
 	@commands.command()
 	async def test(self, ctx):
 		raise ValueError('test')
@@ -259,6 +457,25 @@ class Owner(AceMixin, commands.Cog):
 		logging.getLogger().setLevel(lvl)
 		await ctx.send('Logging level is {0}'.format(lvl))
 
+	@commands.command()
+	async def logqueue(self, ctx):
+		'''Print logging queue stats.'''
+
+		handlers = list(h for h in logging.getLogger().handlers if isinstance(h, DroppingQueueHandler))
+
+		if not handlers:
+			raise commands.CommandError('Logging is not queued.')
+
+		handler = handlers[0]
+
+		data = (
+			('Queued', format(handler.depth, ',d')),
+			('Max size', format(handler.max_size, ',d')),
+			('Dropped', format(handler.dropped, ',d')),
+		)
+
+		await ctx.send('```{0}```'.format(tabulate(data)))
+
 	@commands.command()
 	async def ping(self, ctx):
 		'''Check response time.'''
@@ -290,7 +507,8 @@ class Owner(AceMixin, commands.Cog):
 	async def _reload(self, ctx):
 		'''Reload edited extensions.'''
 
-		reloaded = self.bot.load_extensions()
+		results = await self.bot.cluster_request('reload')
+		reloaded = sorted(set(name for result in results.values() if result for name in result))
 
 		if reloaded:
 			log.info('Reloaded cogs: %s', ', '.join(reloaded))
@@ -302,22 +520,115 @@ class Owner(AceMixin, commands.Cog):
 	async def decache(self, ctx, guild_id: int):
 		'''Clear cache of table data of a specific guild.'''
 
-		configs = (
-			self.bot.config,
-			self.bot.get_cog('Starboard').config,
-			self.bot.get_cog('Moderation').config,
-			self.bot.get_cog('Welcome').config,
-			self.bot.get_cog('Roles').config,
-		)
-
 		cleared = []
 
-		for config in configs:
+		for config in self.bot.config_tables:
 			if await config.clear_entry(guild_id):
 				cleared.append(config)
 
 		await ctx.send('Cleared entries for:\n```\n{0}\n```'.format('\n'.join(config.table for config in cleared)))
 
+	@commands.command()
+	async def msgcache(self, ctx, count: int = 10):
+		'''Print message cache usage, hit rate and the guilds with the most cached messages.'''
+
+		cache = self.bot._connection._messages
+		policy = self.bot.message_policy
+
+		if cache is None:
+			raise commands.CommandError('Message cache is disabled.')
+
+		pools = list(
+			(name, format(len(pool.messages), ',d'), format(pool.max_size, ',d'), format(pool.guild_quota, ',d'), format(pool.evicted, ',d'))
+			for name, pool in (('Normal', cache.normal), ('Priority', cache.priority))
+		)
+
+		hit_rate = 'N/A' if policy.hit_rate is None else '{0:.1%}'.format(policy.hit_rate)
+
+		counts = sorted(cache.guild_counts().items(), key=lambda item: item[1], reverse=True)[:count]
+		guilds = list((str(self.bot.get_guild(guild_id) or guild_id), format(cached, ',d')) for guild_id, cached in counts)
+
+		await ctx.send('```{0}\n\nHit rate: {1} of {2:,d} lookups\nPriority channels: {3}, categories: {4}\n\n{5}```'.format(
+			tabulate(pools, ('Pool', 'Cached', 'Max', 'Per guild', 'Evicted')),
+			hit_rate, policy.hits + policy.misses,
+			len(policy.priority_channels), len(policy.priority_categories),
+			tabulate(guilds, ('Guild', 'Cached'))
+		))
+
+	@commands.command()
+	async def webstats(self, ctx):
+		'''Print outbound HTTP stats per host.'''
+
+		data = list()
+
+		for host, stats in sorted(self.bot.web.stats.items(), key=lambda item: item[1].requests, reverse=True):
+			data.append((
+				host,
+				format(stats.requests, ',d'),
+				'N/A' if stats.hit_rate is None else '{0:.1%}'.format(stats.hit_rate),
+				format(stats.revalidated, ',d'),
+				format(stats.retries, ',d'),
+				format(stats.errors, ',d'),
+				'{0:.1f}'.format(stats.avg * 1000),
+				'{0:.1f}'.format(stats.max * 1000),
+			))
+
+		if not data:
+			raise commands.CommandError('No requests made yet.')
+
+		await ctx.send('```{0}```'.format(
+			tabulate(data, ('Host', 'Requests', 'Hit rate', '304s', 'Retries', 'Errors', 'Avg ms', 'Max ms'))
+		))
+
+	@commands.command()
+	async def actions(self, ctx):
+		'''Print action scheduler stats per priority.'''
+
+		scheduler = self.bot.actions
+
+		data = list(
+			(
+				priority.name.title(),
+				format(stats.scheduled, ',d'),
+				format(stats.coalesced, ',d'),
+				format(stats.completed, ',d'),
+				format(stats.failed, ',d'),
+				'{0:.1f}'.format(stats.avg_wait * 1000),
+				'{0:.1f}'.format(stats.max_wait * 1000),
+			)
+			for priority, stats in scheduler.stats.items()
+		)
+
+		await ctx.send('```{0}\n\nQueued: {1:,d}, running: {2:,d} (limit {3:,d})```'.format(
+			tabulate(data, ('Priority', 'Scheduled', 'Coalesced', 'Done', 'Failed', 'Avg wait ms', 'Max wait ms')),
+			scheduler.queued, scheduler.running, scheduler.max_concurrency
+		))
+
+	@commands.command()
+	async def cachestats(self, ctx):
+		'''Print config table cache stats.'''
+
+		data = list()
+
+		for config in self.bot.config_tables:
+			stats = config.stats
+			lookups = stats['hits'] + stats['misses']
+
+			data.append((
+				config.table,
+				format(stats['entries'], ',d'),
+				format(stats['non_existent'], ',d'),
+				format(stats['hits'], ',d'),
+				format(stats['misses'], ',d'),
+				format(stats['evictions'], ',d'),
+				format(stats['pending'], ',d'),
+				'{0:.1f}%'.format(stats['hits'] / lookups * 100) if lookups else 'N/A',
+			))
+
+		headers = ('Table', 'Entries', 'Missing', 'Hits', 'Misses', 'Evictions', 'Pending', 'Hit rate')
+
+		await ctx.send('```{0}```'.format(tabulate(data, headers)))
+
 	@commands.command(aliases=['g'])
 	@commands.bot_has_permissions(embed_links=True)
 	async def google(self, ctx, *, query: str):
@@ -390,8 +701,7 @@ class Owner(AceMixin, commands.Cog):
 	async def status(self, ctx):
 		'''Refresh the status of the bot in case Discord cleared it.'''
 
-		await self.bot.change_presence()
-		await self.bot.change_presence(activity=BOT_ACTIVITY)
+		await self.bot.cluster_request('status')
 
 	@commands.command()
 	async def pm(self, ctx, user: discord.User, *, content: str):
@@ -165,12 +165,12 @@ class Reminders(AceMixin, commands.Cog):
 		if count > MAX_REMINDERS:
 			raise commands.CommandError(f'Sorry, you can\'t have more than {MAX_REMINDERS} active reminders at once.')
 
-		await self.db.execute(
-			'INSERT INTO remind (guild_id, channel_id, user_id, message_id, made_on, remind_on, message) VALUES ($1, $2, $3, $4, $5, $6, $7)',
+		record = await self.db.fetchrow(
+			'INSERT INTO remind (guild_id, channel_id, user_id, message_id, made_on, remind_on, message) VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING *',
 			ctx.guild.id, ctx.channel.id, ctx.author.id, ctx.message.id, now, when, message
 		)
 
-		self.timer.maybe_restart(when)
+		self.timer.add(record)
 
 		remind_in = when - now
 		remind_in += timedelta(microseconds=1000000 - (remind_in.microseconds % 1000000))
@@ -199,14 +199,14 @@ class Reminders(AceMixin, commands.Cog):
 	async def delreminder(self, ctx, *, reminder_id: SerialConverter()):
 		'''Delete a reminder. Must be your own reminder.'''
 
-		res = await self.db.execute(
-			'DELETE FROM remind WHERE id=$1 AND guild_id=$2 AND user_id=$3',
+		_id = await self.db.fetchval(
+			'DELETE FROM remind WHERE id=$1 AND guild_id=$2 AND user_id=$3 RETURNING id',
 			reminder_id, ctx.guild.id, ctx.author.id
 		)
 
-		if res == 'DELETE 1':
+		if _id is not None:
 			await ctx.send('Reminder deleted.')
-			self.timer.restart_if(lambda record: record.get('id') == reminder_id)
+			self.timer.remove(_id)
 		else:
 			raise commands.CommandError('Reminder not found, or you do not own it.')
 
@@ -5,6 +5,7 @@ import discord
 from discord.ext import commands
 
 from cogs.mixins import AceMixin
+from utils.actionscheduler import MEMBER_ROLE, MESSAGE, Priority, bucket
 from utils.configtable import ConfigTable
 from utils.context import can_prompt
 from utils.converters import EmojiConverter, MaxLengthConverter
@@ -72,7 +73,7 @@ class CustomRoleConverter(commands.RoleConverter):
 		if role.id in (other_role.role_id for selector in ctx.head.selectors for other_role in selector.roles):
 			raise commands.CommandError('This role already exists somewhere else.')
 
-		if ctx.author != ctx.guild.owner and role >= ctx.author.top_role:
+		if ctx.author.id != ctx.guild.owner_id and role >= ctx.author.top_role:
 			raise commands.CommandError('Sorry, you can\'t add roles higher than your top role.')
 
 		config = await ctx.bot.config.get_entry(ctx.guild.id)
@@ -363,7 +364,10 @@ class Roles(AceMixin, commands.Cog):
 		self.footer_tasks = dict()
 		self.footer_lock = asyncio.Lock()
 
-		self.config = ConfigTable(bot, table='role', primary='guild_id')
+		self.config = ConfigTable(bot, table='role', primary='guild_id', preload=True, write_delay=5.0)
+
+	def cog_unload(self):
+		self.bot.unload_task(self.config.flush())
 
 	async def bot_check(self, ctx):
 		return (ctx.channel.id, ctx.author.id) not in self.editing
@@ -809,6 +813,7 @@ class Roles(AceMixin, commands.Cog):
 				)
 
 		await conf.update(channel_id=ctx.channel.id, message_ids=list(msg.id for msg in msgs))
+		self.bot.message_policy.priority_channels.add(ctx.channel.id)
 
 	@commands.Cog.listener()
 	async def on_raw_reaction_add(self, payload):
@@ -828,6 +833,8 @@ class Roles(AceMixin, commands.Cog):
 		if channel_id != conf.channel_id or message_id not in conf.message_ids:
 			return
 
+		self.bot.message_policy.priority_channels.add(channel_id)
+
 		guild = self.bot.get_guild(guild_id)
 		if guild is None:
 			return
@@ -836,11 +843,11 @@ class Roles(AceMixin, commands.Cog):
 		if channel is None:
 			return
 
-		message = await channel.fetch_message(message_id)
+		message = await self.bot.fetch_message_cached(channel, message_id)
 		if message is None:
 			return
 
-		member = guild.get_member(user_id)
+		member = payload.member or await self.bot.member_policy.resolve(guild, user_id)
 		if member is None:
 			return
 
@@ -880,10 +887,16 @@ class Roles(AceMixin, commands.Cog):
 
 		try:
 			if do_add:
-				await member.add_roles(role, reason='Added through role selector')
+				await self.bot.actions.run(
+					Priority.ROLES, bucket(MEMBER_ROLE, guild=guild), member.add_roles, role,
+					reason='Added through role selector'
+				)
 				desc = '{}: added role {}'.format(member.display_name, role.name)
 			else:
-				await member.remove_roles(role, reason='Removed through role selector')
+				await self.bot.actions.run(
+					Priority.ROLES, bucket(MEMBER_ROLE, guild=guild), member.remove_roles, role,
+					reason='Removed through role selector'
+				)
 				desc = '{}: removed role {}'.format(member.display_name, role.name)
 		except discord.HTTPException:
 			desc = 'Unable to toggle role {}. Does the bot have Manage Roles permissions?'.format(role.name)
@@ -912,7 +925,10 @@ class Roles(AceMixin, commands.Cog):
 		embed.set_footer(text=text)
 
 		try:
-			await message.edit(embed=embed)
+			await self.bot.actions.run(
+				Priority.REPLY, bucket(MESSAGE, channel=message.channel), message.edit,
+				embed=embed, coalesce=('edit', message.id)
+			)
 		except discord.HTTPException:
 			pass
 
@@ -6,9 +6,11 @@ from asyncpg.exceptions import UniqueViolationError
 from discord.ext import commands, tasks
 
 from cogs.mixins import AceMixin
+from utils.actionscheduler import MESSAGE, MESSAGES, Priority, bucket
 from utils.configtable import ConfigTable, ConfigTableRecord
 from utils.context import can_prompt, is_mod
 from utils.converters import param_name
+from utils.metrics import timed_task
 from utils.string import yesno
 
 log = logging.getLogger(__name__)
@@ -73,7 +75,9 @@ class Starboard(AceMixin, commands.Cog):
 	def __init__(self, bot):
 		super().__init__(bot)
 
-		self.config = ConfigTable(bot, table='starboard', primary='guild_id', record_class=StarboardConfigRecord)
+		self.config = ConfigTable(
+			bot, table='starboard', primary='guild_id', record_class=StarboardConfigRecord, preload=True, write_delay=5.0
+		)
 
 		self.purge_query = '''
 			SELECT id, guild_id, channel_id, star_message_id
@@ -85,10 +89,17 @@ class Starboard(AceMixin, commands.Cog):
 
 		self.purger.start()
 
+	def cog_unload(self):
+		self.bot.unload_task(self.config.flush())
+
 	@tasks.loop(minutes=20)
+	@timed_task('starboard_purger')
 	async def purger(self):
 		'''Purges old and underperforming stars depending on guild starboard settings.'''
 
+		# settings are read straight from the table below
+		await self.config.flush()
+
 		boards = await self.db.fetch(
 			'SELECT guild_id, channel_id, threshold FROM starboard WHERE locked IS FALSE AND threshold IS NOT NULL'
 		)
@@ -112,8 +123,10 @@ class Starboard(AceMixin, commands.Cog):
 				to_delete.append(row.get('id'))
 
 				try:
-					star_message = await star_channel.fetch_message(row.get('star_message_id'))
-					await star_message.delete()
+					star_message = await self.bot.fetch_message_cached(star_channel, row.get('star_message_id'))
+					await self.bot.actions.run(
+						Priority.BACKGROUND, bucket(MESSAGE, channel=star_channel), star_message.delete
+					)
 				except discord.HTTPException:
 					continue
 
@@ -195,6 +208,9 @@ class Starboard(AceMixin, commands.Cog):
 
 		await board.update(channel_id=channel.id)
 
+		# losing this would leave an orphaned starboard channel
+		await board.flush()
+
 		await ctx.send('Starboard channel created! {}'.format(channel.mention))
 
 	@starboard.command()
@@ -277,7 +293,7 @@ class Starboard(AceMixin, commands.Cog):
 		star_channel = await self._get_star_channel(ctx.guild)
 
 		try:
-			message = await star_channel.fetch_message(row.get('star_message_id'))
+			message = await self.bot.fetch_message_cached(star_channel, row.get('star_message_id'))
 		except discord.HTTPException:
 			raise SB_STAR_MSG_NOT_FOUND_ERROR
 
@@ -367,14 +383,14 @@ class Starboard(AceMixin, commands.Cog):
 			raise SB_ORIG_MSG_NOT_FOUND_ERROR
 
 		try:
-			message = await channel.fetch_message(row.get('message_id'))
+			message = await self.bot.fetch_message_cached(channel, row.get('message_id'))
 		except discord.HTTPException:
 			raise SB_ORIG_MSG_NOT_FOUND_ERROR
 
 		star_channel = await self._get_star_channel(ctx.guild)
 
 		try:
-			star_message = await star_channel.fetch_message(row.get('star_message_id'))
+			star_message = await self.bot.fetch_message_cached(star_channel, row.get('star_message_id'))
 		except discord.HTTPException:
 			raise SB_STAR_MSG_NOT_FOUND_ERROR
 
@@ -456,7 +472,7 @@ class Starboard(AceMixin, commands.Cog):
 		if star_message_id is not None:
 			try:
 				star_channel = await self._get_star_channel(ctx.guild)
-				star_message = await star_channel.fetch_message(star_message_id)
+				star_message = await self.bot.fetch_message_cached(star_channel, star_message_id)
 				await star_message.delete()
 			except (discord.HTTPException, commands.CommandError):
 				pass
@@ -465,9 +481,9 @@ class Starboard(AceMixin, commands.Cog):
 
 	async def post_star(self, star_channel, message, starrer_count):
 		try:
-			star_message = await star_channel.send(
-				self.get_header(message.id, starrer_count),
-				embed=self.get_embed(message, starrer_count)
+			star_message = await self.bot.actions.run(
+				Priority.STARBOARD, bucket(MESSAGES, channel=star_channel), star_channel.send,
+				self.get_header(message.id, starrer_count), embed=self.get_embed(message, starrer_count)
 			)
 			await star_message.add_reaction(STAR_EMOJI)
 		except discord.HTTPException:
@@ -610,7 +626,7 @@ class Starboard(AceMixin, commands.Cog):
 			else:
 				# if we have the record we catch fetch the starred message
 				try:
-					star_message = await star_channel.fetch_message(star_message_id)
+					star_message = await self.bot.fetch_message_cached(star_channel, star_message_id)
 				except discord.HTTPException:
 					raise SB_STAR_MSG_NOT_FOUND_ERROR
 
@@ -640,12 +656,17 @@ class Starboard(AceMixin, commands.Cog):
 		except commands.CommandError:
 			return
 
+		# messages in channels people star in, and on the starboard itself, are kept cached longer
+		self.bot.message_policy.priority_channels.add(payload.channel_id)
+		if board.channel_id is not None:
+			self.bot.message_policy.priority_channels.add(board.channel_id)
+
 		# attempt to get the message
 		channel = self.bot.get_channel(payload.channel_id)
 		if channel is None:
 			return
 
-		starrer = channel.guild.get_member(payload.user_id)
+		starrer = payload.member or await self.bot.member_policy.resolve(channel.guild, payload.user_id)
 		if starrer is None:
 			return
 
@@ -653,7 +674,7 @@ class Starboard(AceMixin, commands.Cog):
 			return
 
 		try:
-			message = await channel.fetch_message(payload.message_id)
+			message = await self.bot.fetch_message_cached(channel, payload.message_id)
 		except discord.HTTPException:
 			return
 
@@ -745,12 +766,12 @@ class Starboard(AceMixin, commands.Cog):
 			return
 
 		try:
-			star_message = await star_channel.fetch_message(row.get('star_message_id'))
+			star_message = await self.bot.fetch_message_cached(star_channel, row.get('star_message_id'))
 		except discord.HTTPException:
 			return
 
 		try:
-			await star_message.delete()
+			await self.bot.actions.run(Priority.STARBOARD, bucket(MESSAGE, channel=star_channel), star_message.delete)
 		except discord.HTTPException:
 			return
 
@@ -791,7 +812,7 @@ class Starboard(AceMixin, commands.Cog):
 		to_delete = list()
 		for sm in sms:
 			try:
-				message = await star_channel.fetch_message(sm.get('star_message_id'))
+				message = await self.bot.fetch_message_cached(star_channel, sm.get('star_message_id'))
 			except discord.HTTPException:
 				continue
 
@@ -809,7 +830,12 @@ class Starboard(AceMixin, commands.Cog):
 
 		embed = star_message.embeds[0]
 		embed.colour = self.star_gradient_colour(stars)
-		await star_message.edit(content=self.get_header(message_id, stars), embed=embed)
+
+		# a burst of stars only needs the last edit
+		await self.bot.actions.run(
+			Priority.STARBOARD, bucket(MESSAGE, channel=star_message.channel), star_message.edit,
+			content=self.get_header(message_id, stars), embed=embed, coalesce=('edit', star_message.id)
+		)
 
 	def get_header(self, message_id, stars):
 		return f'{self.star_emoji(stars)} **{stars}**  `ID: {message_id}`'
@@ -10,6 +10,8 @@ from cogs.mixins import AceMixin
 from utils.context import AceContext, can_prompt
 from utils.converters import LengthConverter, MaybeMemberConverter
 from utils.pager import Pager
+from utils.tagindex import TagIndex
+from utils.taguses import TagUseBuffer
 from utils.time import pretty_datetime
 
 log = logging.getLogger(__name__)
@@ -52,12 +54,7 @@ class TagCreateConverter(LengthConverter):
 		if ctx.cog.tag_is_being_made(ctx, tag_name):
 			raise commands.BadArgument('Tag with that name is currently being made elsewhere.')
 
-		exist_id = await ctx.bot.db.fetchval(
-			'SELECT id FROM tag WHERE guild_id=$1 AND (name=$2 OR alias=$2)',
-			ctx.guild.id, tag_name
-		)
-
-		if exist_id is not None:
+		if await ctx.cog.index.get(ctx.guild.id, tag_name) is not None:
 			raise commands.BadArgument('Tag name is already in use.')
 
 		return tag_name
@@ -75,10 +72,7 @@ class TagEditConverter(commands.Converter):
 	async def convert(self, ctx, tag_name):
 		tag_name = tag_name.lower()
 
-		rec = await ctx.bot.db.fetchrow(
-			'SELECT * FROM tag WHERE guild_id=$1 AND (name=$2 OR alias=$2)',
-			ctx.guild.id, tag_name
-		)
+		rec = await ctx.cog.index.get(ctx.guild.id, tag_name)
 
 		if rec is None:
 			raise ACCESS_ERROR
@@ -100,10 +94,7 @@ class TagViewConverter(commands.Converter):
 	async def convert(self, ctx, tag_name):
 		tag_name = tag_name.lower()
 
-		rec = await ctx.bot.db.fetchrow(
-			'SELECT * FROM tag WHERE guild_id=$1 AND (name=$2 OR alias=$2)',
-			ctx.guild.id, tag_name
-		)
+		rec = await ctx.cog.index.get(ctx.guild.id, tag_name)
 
 		if rec is not None:
 			return tag_name, rec
@@ -155,6 +146,12 @@ class Tags(AceMixin, commands.Cog):
 
 		self._being_made = dict()
 
+		self.index = TagIndex(bot)
+		self.uses = TagUseBuffer(bot, self.index)
+
+	def cog_unload(self):
+		self.bot.unload_task(self.uses.close())
+
 	async def bot_check(self, ctx):
 		try:
 			being_made = self._being_made[ctx.guild.id]
@@ -203,8 +200,8 @@ class Tags(AceMixin, commands.Cog):
 
 	async def create_tag(self, ctx, tag_name, content):
 		try:
-			await self.db.execute(
-				'INSERT INTO tag (name, guild_id, user_id, created_at, content) VALUES ($1, $2, $3, $4, $5)',
+			record = await self.db.fetchrow(
+				'INSERT INTO tag (name, guild_id, user_id, created_at, content) VALUES ($1, $2, $3, $4, $5) RETURNING *',
 				tag_name, ctx.guild.id, ctx.author.id, datetime.utcnow(), content
 			)
 		except asyncpg.UniqueViolationError:
@@ -212,6 +209,8 @@ class Tags(AceMixin, commands.Cog):
 		except Exception:
 			raise commands.CommandError('Failed to create tag for unknown reasons.')
 
+		self.index.put(record)
+
 	@commands.group(invoke_without_command=True)
 	async def tag(self, ctx, *, tag_name: TagViewConverter = None):
 		'''Retrieve a tags content.'''
@@ -223,10 +222,7 @@ class Tags(AceMixin, commands.Cog):
 		tag_name, record = tag_name
 		await ctx.send(record.get('content'), allowed_mentions=discord.AllowedMentions.none())
 
-		await self.db.execute(
-			'UPDATE tag SET uses=$2, viewed_at=$3 WHERE id=$1',
-			record.get('id'), record.get('uses') + 1, datetime.utcnow()
-		)
+		self.uses.add(record, datetime.utcnow())
 
 	@tag.command(aliases=['add', 'new'])
 	async def create(self, ctx, tag_name: tag_create_converter, *, content: str = None):
@@ -246,11 +242,15 @@ class Tags(AceMixin, commands.Cog):
 
 		new_content = await self.craft_tag_contents(ctx, new_content)
 
+		edited_at = datetime.utcnow()
+
 		await self.db.execute(
 			'UPDATE tag SET content=$2, edited_at=$3 WHERE id=$1',
-			record.get('id'), new_content, datetime.utcnow()
+			record.get('id'), new_content, edited_at
 		)
 
+		self.index.update(ctx.guild.id, record.get('id'), content=new_content, edited_at=edited_at)
+
 		await ctx.send(f"Tag \'{record.get('name')}\' edited.")
 
 	@tag.command(aliases=['remove'])
@@ -263,6 +263,8 @@ class Tags(AceMixin, commands.Cog):
 
 		tag_name, record = tag_name
 		await self.db.execute('DELETE FROM tag WHERE id=$1', record.get('id'))
+		self.index.remove(ctx.guild.id, record.get('id'))
+		self.uses.discard(record.get('id'))
 
 		await ctx.send(f"Tag \'{record.get('name')}\' deleted.")
 
@@ -273,19 +275,27 @@ class Tags(AceMixin, commands.Cog):
 
 		if member is None:
 			tags = await self.db.fetch(
-				'SELECT name, alias, uses FROM tag WHERE guild_id=$1 ORDER BY uses DESC',
+				'SELECT id, name, alias, uses FROM tag WHERE guild_id=$1',
 				ctx.guild.id
 			)
 		else:
 			tags = await self.db.fetch(
-				'SELECT name, alias, uses FROM tag WHERE guild_id=$1 AND user_id=$2 ORDER BY uses DESC',
+				'SELECT id, name, alias, uses FROM tag WHERE guild_id=$1 AND user_id=$2',
 				ctx.guild.id, member.id
 			)
 
 		if not tags:
 			raise commands.CommandError('No tags found.')
 
-		tag_list = [(record.get('name'), record.get('alias'), record.get('uses')) for record in tags]
+		# sorted here so uses not yet written are counted too
+		pending = self.uses.guild_pending(ctx.guild.id)
+
+		tag_list = [
+			(record.get('name'), record.get('alias'), record.get('uses') + pending.get(record.get('id'), 0))
+			for record in tags
+		]
+
+		tag_list.sort(key=lambda tag: tag[2], reverse=True)
 
 		p = TagPager(ctx, tag_list)
 		p.member = member
@@ -384,6 +394,8 @@ class Tags(AceMixin, commands.Cog):
 			record.get('id'), new_name
 		)
 
+		self.index.update(ctx.guild.id, record.get('id'), name=new_name)
+
 		await ctx.send(f"Tag \'{record.get('name')}\' renamed to \'{new_name}\'.")
 
 	@tag.command()
@@ -398,6 +410,8 @@ class Tags(AceMixin, commands.Cog):
 			record.get('id'), alias
 		)
 
+		self.index.update(ctx.guild.id, record.get('id'), alias=alias)
+
 		if alias is None:
 			await ctx.send(f"Alias cleared for \'{record.get('name')}\'")
 		else:
@@ -410,7 +424,7 @@ class Tags(AceMixin, commands.Cog):
 
 		tag_name, record = tag_name
 
-		owner = ctx.guild.get_member(record.get('user_id'))
+		owner = await self.bot.member_policy.resolve(ctx.guild, record.get('user_id'))
 
 		if owner is None:
 			nick = 'Unknown User'
@@ -426,18 +440,25 @@ class Tags(AceMixin, commands.Cog):
 		e.set_author(name=nick, icon_url=avatar)
 		e.add_field(name='Owner', value=owner.mention if owner else nick)
 
+		uses = self.uses.uses(record)
+		pending = self.uses.guild_pending(ctx.guild.id)
+
 		rank = await self.db.fetchval(
-			'SELECT COUNT(id) FROM tag WHERE guild_id=$1 AND uses > $2',
-			ctx.guild.id, record.get('uses') + 1
+			'''
+			SELECT COUNT(tag.id) FROM tag
+			LEFT JOIN unnest($3::INT[], $4::INT[]) AS pending (id, count) ON pending.id = tag.id
+			WHERE tag.guild_id=$1 AND tag.uses + COALESCE(pending.count, 0) > $2
+			''',
+			ctx.guild.id, uses, list(pending.keys()), list(pending.values())
 		)
 
 		e.add_field(name='Rank', value=f'#{rank + 1}')
 
-		e.add_field(name='Uses', value=record.get('uses'))
+		e.add_field(name='Uses', value=uses)
 
 		alias = record.get('alias')
 		created_at = record.get('created_at')
-		viewed_at = record.get('viewed_at')
+		viewed_at = self.uses.viewed_at(record)
 		edited_at = record.get('edited_at')
 
 		if alias is not None:
@@ -478,6 +499,7 @@ class Tags(AceMixin, commands.Cog):
 		res = await self.db.execute('UPDATE tag SET user_id=$1 WHERE id=$2', new_owner.id, record.get('id'))
 
 		if res == 'UPDATE 1':
+			self.index.update(ctx.guild.id, record.get('id'), user_id=new_owner.id)
 			await ctx.send('Tag \'{}\' transferred to \'{}\''.format(record.get('name'), new_owner.display_name))
 		else:
 			raise commands.CommandError('Unknown error occured.')
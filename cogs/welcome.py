@@ -6,6 +6,7 @@ from discord.ext import commands
 
 
 from cogs.mixins import AceMixin
+from utils.actionscheduler import MESSAGES, Priority, bucket
 from utils.string import po
 from utils.configtable import ConfigTable, ConfigTableRecord
 
@@ -45,7 +46,7 @@ class Welcome(AceMixin, commands.Cog):
 	def __init__(self, bot):
 		super().__init__(bot)
 
-		self.config = ConfigTable(bot, 'welcome', 'guild_id', WelcomeRecord)
+		self.config = ConfigTable(bot, 'welcome', 'guild_id', WelcomeRecord, preload=True)
 
 	async def cog_check(self, ctx):
 		return await ctx.is_mod()
@@ -86,7 +87,7 @@ class Welcome(AceMixin, commands.Cog):
 		log.info('Sending welcome message for %s in %s', po(member), po(member.guild))
 
 		try:
-			await channel.send(message)
+			await self.bot.actions.run(Priority.BACKGROUND, bucket(MESSAGES, channel=channel), channel.send, message)
 		except discord.HTTPException:
 			pass
 
@@ -67,7 +67,9 @@ class WhoIs(AceMixin, commands.Cog):
 		now = datetime.utcnow()
 		e = discord.Embed()
 
-		for idx, member in enumerate(sorted(ctx.guild.members, key=lambda m: m.joined_at, reverse=True)):
+		members = await self.bot.member_policy.members_of(ctx.guild)
+
+		for idx, member in enumerate(sorted(members, key=lambda m: m.joined_at, reverse=True)):
 			if idx >= count:
 				break
 
@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+import aiohttp
+
+from config import BOT_TOKEN
+from utils.cluster import shard_slices
+
+log = logging.getLogger('launcher')
+
+GATEWAY_URL = 'https://discord.com/api/v8/gateway/bot'
+RESTART_DELAY = 10.0
+
+
+async def recommended_shard_count():
+	headers = {'Authorization': 'Bot ' + BOT_TOKEN}
+
+	async with aiohttp.ClientSession() as session:
+		async with session.get(GATEWAY_URL, headers=headers) as resp:
+			resp.raise_for_status()
+			data = await resp.json()
+
+	return data['shards']
+
+
+class Cluster:
+	'''One bot process running a slice of the shards. Restarted if it exits unexpectedly.'''
+
+	def __init__(self, cluster_id, cluster_count, shard_ids, shard_count, fast_runtime=False, lazy_members=False):
+		self.cluster_id = cluster_id
+		self.args = (
+			'--cluster-id', str(cluster_id),
+			'--cluster-count', str(cluster_count),
+			'--shard-count', str(shard_count),
+			'--shard-ids', *map(str, shard_ids),
+		)
+
+		if fast_runtime:
+			self.args += ('--fast-runtime',)
+
+		if lazy_members:
+			self.args += ('--lazy-members',)
+
+		self.process = None
+		self.stopping = False
+
+	async def run(self):
+		while not self.stopping:
+			log.info('Starting cluster %s', self.cluster_id)
+
+			self.process = await asyncio.create_subprocess_exec(sys.executable, 'ace.py', *self.args)
+			code = await self.process.wait()
+
+			if self.stopping:
+				break
+
+			log.warning('Cluster %s exited with code %s, restarting in %s seconds', self.cluster_id, code, RESTART_DELAY)
+			await asyncio.sleep(RESTART_DELAY)
+
+		log.info('Cluster %s stopped', self.cluster_id)
+
+	def stop(self):
+		self.stopping = True
+
+		if self.process is not None and self.process.returncode is None:
+			self.process.terminate()
+
+
+async def main(args):
+	shard_count = args.shards or await recommended_shard_count()
+	cluster_count = max(1, min(args.clusters or os.cpu_count() or 1, shard_count))
+
+	log.info('Launching %s shards over %s clusters', shard_count, cluster_count)
+
+	clusters = list(
+		Cluster(cluster_id, cluster_count, shard_ids, shard_count, args.fast_runtime, args.lazy_members)
+		for cluster_id, shard_ids in enumerate(shard_slices(shard_count, cluster_count))
+	)
+
+	loop = asyncio.get_event_loop()
+
+	def stop():
+		log.info('Stopping all clusters')
+		for cluster in clusters:
+			cluster.stop()
+
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		try:
+			loop.add_signal_handler(sig, stop)
+		except NotImplementedError:
+			pass  # not supported on windows
+
+	await asyncio.gather(*(cluster.run() for cluster in clusters))
+
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO, format='{asctime} [{levelname}] {name}: {message}', style='{')
+
+	parser = argparse.ArgumentParser(description='Run the bot as multiple processes, each handling a slice of the shards.')
+	parser.add_argument('-c', '--clusters', type=int, help='Amount of processes. Defaults to the CPU count.')
+	parser.add_argument('-s', '--shards', type=int, help='Total amount of shards. Defaults to what Discord recommends.')
+	parser.add_argument('--fast-runtime', action='store_true', help='Run the clusters with the fast runtime profile.')
+	parser.add_argument('--lazy-members', action='store_true', help='Run the clusters with lazy member caching.')
+
+	asyncio.get_event_loop().run_until_complete(main(parser.parse_args()))
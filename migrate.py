@@ -1,4 +1,9 @@
 import asyncio
+import os
+import re
+import sys
+from datetime import datetime
+from time import perf_counter
 
 import asyncpg
 
@@ -6,15 +11,126 @@ from config import DB_BIND
 
 QUERIES = open('migrate.sql', 'r').read()
 
+MIGRATIONS = 'migrations'
+
+# migrations starting with this line run statement by statement outside a transaction, needed for CREATE INDEX CONCURRENTLY
+NO_TRANSACTION = '-- no transaction'
+
+# how long a statement may wait for a lock before giving up, so a migration never queues behind a long transaction
+LOCK_TIMEOUT = '5s'
+
+MIGRATION_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+INDEX_RE = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE)
+
+
+class Migration:
+	def __init__(self, version, name, sql):
+		self.version = version
+		self.name = name
+		self.sql = sql
+
+	@property
+	def transactional(self):
+		return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+	@property
+	def statements(self):
+		# split naively on semicolons, fine for the plain DDL these migrations hold
+		for statement in self.sql.split(';'):
+			lines = [line for line in statement.splitlines() if line.strip() and not line.strip().startswith('--')]
+
+			# skip fragments that are only comments
+			if lines:
+				yield '\n'.join(lines)
+
+	def __str__(self):
+		return '{0:04d}_{1}'.format(self.version, self.name)
+
 
 def log(connection, message):
 	print(message)
 
 
-async def main():
-	db = await asyncpg.connect(DB_BIND)
-	db.add_log_listener(log)
+def load_migrations():
+	migrations = list()
+
+	for file in sorted(os.listdir(MIGRATIONS)):
+		match = MIGRATION_RE.match(file)
+		if match is None:
+			continue
+
+		with open(os.path.join(MIGRATIONS, file), 'r') as f:
+			migrations.append(Migration(int(match.group(1)), match.group(2), f.read()))
+
+	migrations.sort(key=lambda migration: migration.version)
+
+	return migrations
+
+
+async def applied_versions(db):
+	if await db.fetchval('SELECT to_regclass(\'schema_migration\')') is None:
+		return set()
+
+	return set(record.get('version') for record in await db.fetch('SELECT version FROM schema_migration'))
+
+
+async def drop_invalid_index(db, statement):
+	'''A failed concurrent build leaves an invalid index behind which IF NOT EXISTS would keep, so drop it first.'''
+
+	match = INDEX_RE.search(statement)
+	if match is None:
+		return
+
+	invalid = await db.fetchval(
+		'''
+		SELECT EXISTS (
+			SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+			WHERE pg_class.relname = $1 AND NOT pg_index.indisvalid
+		)
+		''',
+		match.group(1)
+	)
+
+	if invalid:
+		print('Dropping invalid index {0} left by an earlier attempt'.format(match.group(1)))
+		await db.execute('DROP INDEX CONCURRENTLY IF EXISTS {0}'.format(match.group(1)))
 
+
+async def apply(db, migration):
+	start = perf_counter()
+
+	if migration.transactional:
+		async with db.transaction():
+			await db.execute(migration.sql)
+			await record_migration(db, migration, perf_counter() - start)
+	else:
+		for statement in migration.statements:
+			await drop_invalid_index(db, statement)
+
+			statement_start = perf_counter()
+			await db.execute(statement)
+			print('  {0:>9.3f}s  {1}'.format(perf_counter() - statement_start, ' '.join(statement.split())[:100]))
+
+		await record_migration(db, migration, perf_counter() - start)
+
+	return perf_counter() - start
+
+
+async def record_migration(db, migration, duration):
+	await db.execute(
+		'INSERT INTO schema_migration (version, name, applied_at, duration) VALUES ($1, $2, $3, make_interval(secs => $4))',
+		migration.version, migration.name, datetime.utcnow(), duration
+	)
+
+
+async def status(db):
+	applied = await applied_versions(db)
+
+	for migration in load_migrations():
+		print('{0:<8} {1}'.format('applied' if migration.version in applied else 'pending', migration))
+
+
+async def migrate(db):
 	async with db.transaction():
 		await db.execute(QUERIES)
 
@@ -23,6 +139,37 @@ async def main():
 			for fact in facts.split('\n'):
 				await db.execute('INSERT INTO facts (content) VALUES ($1)', fact)
 
+	await db.execute('SET lock_timeout = \'{0}\''.format(LOCK_TIMEOUT))
+
+	applied = await applied_versions(db)
+	total = 0.0
+
+	for migration in load_migrations():
+		if migration.version in applied:
+			continue
+
+		print('Applying {0}{1}'.format(migration, '' if migration.transactional else ' (no transaction)'))
+
+		elapsed = await apply(db, migration)
+		total += elapsed
+
+		print('Applied {0} in {1:.3f}s'.format(migration, elapsed))
+
+	print('Migrations done in {0:.3f}s'.format(total))
+
+
+async def main():
+	db = await asyncpg.connect(DB_BIND)
+	db.add_log_listener(log)
+
+	try:
+		if '--status' in sys.argv[1:]:
+			await status(db)
+		else:
+			await migrate(db)
+	finally:
+		await db.close()
+
 
 facts = """
 If you somehow found a way to extract all of the gold from the bubbling core of our lovely little planet, you would be able to cover all of the land in a layer of gold up to your knees.
@@ -49,6 +49,7 @@ CREATE TABLE IF NOT EXISTS mod_timer (
 
 	created_at	TIMESTAMP NOT NULL,
 	duration	INTERVAL NULL,
+	due_at		TIMESTAMP NULL,
 
 	reason		TEXT NULL,
 	userdata	JSON NULL,
@@ -228,3 +229,11 @@ CREATE TABLE IF NOT EXISTS trivia_stats (
 	question_hash	BIGINT NOT NULL,
 	result			BOOL NOT NULL
 );
+
+-- versioned migrations from the migrations folder that have been applied
+CREATE TABLE IF NOT EXISTS schema_migration (
+	version		INT UNIQUE NOT NULL,
+	name		TEXT NOT NULL,
+	applied_at	TIMESTAMP NOT NULL,
+	duration	INTERVAL NOT NULL
+);
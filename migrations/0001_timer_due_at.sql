@@ -0,0 +1,3 @@
+-- created_at + duration, stored so the event timer can use an index. backfilled for rows from before the column existed
+ALTER TABLE mod_timer ADD COLUMN IF NOT EXISTS due_at TIMESTAMP NULL;
+UPDATE mod_timer SET due_at = created_at + duration WHERE duration IS NOT NULL AND due_at IS NULL;
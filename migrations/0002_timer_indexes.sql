@@ -0,0 +1,5 @@
+-- no transaction
+
+-- next due records for the event and reminder timers
+CREATE INDEX CONCURRENTLY IF NOT EXISTS mod_timer_due_at_idx ON mod_timer (due_at) WHERE due_at IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS remind_remind_on_idx ON remind (remind_on);
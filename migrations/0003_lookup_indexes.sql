@@ -0,0 +1,21 @@
+-- no transaction
+
+-- per user and per server command stats
+CREATE INDEX CONCURRENTLY IF NOT EXISTS log_guild_id_user_id_timestamp_idx ON log (guild_id, user_id, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS log_guild_id_timestamp_idx ON log (guild_id, timestamp);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS log_command_guild_id_idx ON log (command, guild_id);
+
+-- tag lookups by name or alias, tag lists ranked by uses and the similar tag search
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tag_guild_id_name_idx ON tag (guild_id, name);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tag_guild_id_alias_idx ON tag (guild_id, alias) WHERE alias IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tag_guild_id_uses_idx ON tag (guild_id, uses DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tag_name_trgm_idx ON tag USING gin (name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tag_alias_trgm_idx ON tag USING gin (alias gin_trgm_ops) WHERE alias IS NOT NULL;
+
+-- starred messages looked up by their starboard message, the purger and the starring cooldown
+CREATE INDEX CONCURRENTLY IF NOT EXISTS star_msg_star_message_id_idx ON star_msg (star_message_id) WHERE star_message_id IS NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS star_msg_guild_id_starred_at_idx ON star_msg (guild_id, starred_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS star_msg_guild_id_starrer_id_idx ON star_msg (guild_id, starrer_id, id);
+
+-- highlighted messages removed by their author
+CREATE INDEX CONCURRENTLY IF NOT EXISTS highlight_msg_user_id_message_id_idx ON highlight_msg (user_id, message_id);
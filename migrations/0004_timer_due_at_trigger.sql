@@ -0,0 +1,14 @@
+-- keep due_at in step with created_at + duration whatever writes the row, including code from before the column
+CREATE OR REPLACE FUNCTION mod_timer_set_due_at() RETURNS TRIGGER AS $$
+BEGIN
+	NEW.due_at := NEW.created_at + NEW.duration;
+	RETURN NEW;
+END$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mod_timer_due_at ON mod_timer;
+
+CREATE TRIGGER mod_timer_due_at BEFORE INSERT OR UPDATE ON mod_timer
+	FOR EACH ROW EXECUTE PROCEDURE mod_timer_set_due_at();
+
+-- rows written by older code since the backfill in 0001
+UPDATE mod_timer SET due_at = created_at + duration WHERE duration IS NOT NULL AND due_at IS NULL;
@@ -0,0 +1,288 @@
+import asyncio
+import logging
+from enum import IntEnum
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
+
+from utils.metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+ACTIONS = REGISTRY.counter('acebot_actions_total', 'Scheduled Discord actions by priority and result.', ('priority', 'result'))
+ACTION_WAIT = REGISTRY.histogram('acebot_action_wait_seconds', 'Time actions spent queued before starting.', ('priority',))
+
+# route paths as the lib names them, used to build rate limit bucket keys
+MEMBER = '/guilds/{guild_id}/members/{user_id}'
+MEMBER_ROLE = '/guilds/{guild_id}/members/{user_id}/roles/{role_id}'
+BAN = '/guilds/{guild_id}/bans/{user_id}'
+MESSAGES = '/channels/{channel_id}/messages'
+MESSAGE = '/channels/{channel_id}/messages/{message_id}'
+BULK_DELETE = '/channels/{channel_id}/messages/bulk-delete'
+
+
+def bucket(path, channel=None, guild=None):
+	'''The rate limit bucket the lib puts a route in. Pass the channel for channel routes and the guild for guild routes.'''
+
+	return '{0}:{1}:{2}'.format(
+		None if channel is None else channel.id,
+		None if guild is None else guild.id,
+		path
+	)
+
+
+class Priority(IntEnum):
+	'''Lower goes first. Moderation actions and replies also ignore the concurrency limit.'''
+
+	MODERATION = 0
+	ROLES = 1
+	STARBOARD = 2
+	REPLY = 3
+	BACKGROUND = 4
+
+
+class PriorityStats:
+	__slots__ = ('scheduled', 'coalesced', 'completed', 'failed', 'waited', 'max_wait')
+
+	def __init__(self):
+		self.scheduled = 0
+		self.coalesced = 0
+		self.completed = 0
+		self.failed = 0
+		self.waited = 0.0
+		self.max_wait = 0.0
+
+	@property
+	def avg_wait(self):
+		started = self.completed + self.failed
+		return self.waited / started if started else 0.0
+
+
+class _Action:
+	__slots__ = ('priority', 'seq', 'bucket', 'coalesce', 'func', 'args', 'kwargs', 'future', 'queued_at')
+
+	def __init__(self, priority, seq, bucket, coalesce, func, args, kwargs, future):
+		self.priority = priority
+		self.seq = seq
+		self.bucket = bucket
+		self.coalesce = coalesce
+		self.func = func
+		self.args = args
+		self.kwargs = kwargs
+		self.future = future
+		self.queued_at = monotonic()
+
+	def __lt__(self, other):
+		return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _Bucket:
+	__slots__ = ('queue', 'busy')
+
+	def __init__(self):
+		self.queue = list()
+		self.busy = False
+
+
+class ActionScheduler:
+	'''Runs outbound Discord actions in priority order.
+
+	Actions in the same rate limit bucket run one at a time, most urgent first, instead of racing for the lib's lock.
+	Across buckets at most max_concurrency actions run at once, except moderation and replies which always start right
+	away. Buckets the lib is using, for another request or to sleep off a rate limit, are set aside until the lib lets
+	go of them so they don't hold up a slot.
+
+	Actions scheduled with a coalesce key replace a queued action with the same key, so a burst of edits to one message
+	only sends the last one. Everyone awaiting gets its result.'''
+
+	MAX_CONCURRENCY = 6
+
+	UNCAPPED = (Priority.MODERATION, Priority.REPLY)
+
+	def __init__(self, loop, http=None, max_concurrency=MAX_CONCURRENCY):
+		self.loop = loop
+		self.http = http
+		self.max_concurrency = max_concurrency
+
+		self.stats = {priority: PriorityStats() for priority in Priority}
+
+		self._seq = count()
+		self._buckets = dict()
+		# heaps of actions at the head of an idle bucket, may hold stale entries
+		self._urgent = list()  # ones that ignore the concurrency limit
+		self._ready = list()
+		self._pending = dict()  # coalesce key -> queued action
+		self._running = 0
+		self._capped = 0  # running actions that count towards max_concurrency
+		self._watchers = dict()  # what parked actions wait on -> task
+
+	async def run(self, priority, bucket, func, *args, coalesce=None, **kwargs):
+		'''Schedule await func(*args, **kwargs) and return its result. Exceptions are raised here as well.'''
+
+		stats = self.stats[priority]
+		stats.scheduled += 1
+
+		action = None if coalesce is None else self._pending.get(coalesce)
+
+		if action is not None:
+			action.func, action.args, action.kwargs = func, args, kwargs
+
+			stats.coalesced += 1
+			ACTIONS.inc(priority=priority.name.lower(), result='coalesced')
+		else:
+			action = _Action(priority, next(self._seq), bucket, coalesce, func, args, kwargs, self.loop.create_future())
+
+			if coalesce is not None:
+				self._pending[coalesce] = action
+
+			self._submit(action)
+
+		# the action goes through even if the caller is cancelled, others might be waiting on it
+		return await asyncio.shield(action.future)
+
+	@property
+	def queued(self):
+		return sum(len(bucket.queue) for bucket in self._buckets.values())
+
+	@property
+	def running(self):
+		return self._running
+
+	def _submit(self, action):
+		bucket = self._buckets.get(action.bucket)
+
+		if bucket is None:
+			bucket = self._buckets[action.bucket] = _Bucket()
+
+		heappush(bucket.queue, action)
+
+		if not bucket.busy and bucket.queue[0] is action:
+			self._push_ready(action)
+
+		self._pump()
+
+	def _held_by_lib(self, key):
+		'''What the lib is holding up requests in this bucket with, or None if a request would go out right away.
+
+		Nothing of ours runs in the bucket when this is asked, so a held lock is either another request in flight or the
+		lib sleeping off a rate limit. Either way an action started now would only wait on the lock while taking a slot.'''
+
+		if self.http is None:
+			return None
+
+		if not self.http._global_over.is_set():
+			return self.http._global_over
+
+		lock = self.http._locks.get(key)
+		return lock if lock is not None and lock.locked() else None
+
+	def _watch(self, held):
+		if held not in self._watchers:
+			self._watchers[held] = self.loop.create_task(self._unpark(held))
+
+	async def _unpark(self, held):
+		try:
+			if isinstance(held, asyncio.Event):
+				await held.wait()
+			else:
+				# the lock is fair, so this gets it after every request that was already waiting on it
+				async with held:
+					pass
+		finally:
+			del self._watchers[held]
+			self._pump()
+
+	def _push_ready(self, action):
+		heappush(self._urgent if action.priority in self.UNCAPPED else self._ready, action)
+
+	def _is_head(self, action):
+		# if not, it's stale: either started already or something more urgent came in ahead of it
+		bucket = self._buckets.get(action.bucket)
+		return bucket is not None and not bucket.busy and bucket.queue[0] is action
+
+	def _pump(self):
+		while self._urgent:
+			action = heappop(self._urgent)
+
+			if self._is_head(action):
+				self._start(action, capped=False)
+
+		parked = list()
+
+		while self._ready and self._capped < self.max_concurrency:
+			action = heappop(self._ready)
+
+			if not self._is_head(action):
+				continue
+
+			held = self._held_by_lib(action.bucket)
+
+			if held is not None:
+				parked.append(action)
+				self._watch(held)
+				continue
+
+			self._start(action, capped=True)
+
+		for action in parked:
+			heappush(self._ready, action)
+
+	def _start(self, action, capped):
+		bucket = self._buckets[action.bucket]
+		heappop(bucket.queue)
+		bucket.busy = True
+
+		self._running += 1
+
+		if capped:
+			self._capped += 1
+
+		if action.coalesce is not None:
+			self._pending.pop(action.coalesce, None)
+
+		waited = monotonic() - action.queued_at
+
+		stats = self.stats[action.priority]
+		stats.waited += waited
+		stats.max_wait = max(stats.max_wait, waited)
+
+		ACTION_WAIT.observe(waited, priority=action.priority.name.lower())
+
+		self.loop.create_task(self._execute(action, capped))
+
+	async def _execute(self, action, capped):
+		stats = self.stats[action.priority]
+		name = action.priority.name.lower()
+
+		try:
+			result = await action.func(*action.args, **action.kwargs)
+		except asyncio.CancelledError:
+			action.future.cancel()
+			raise
+		except Exception as exc:
+			stats.failed += 1
+			ACTIONS.inc(priority=name, result='failed')
+			action.future.set_exception(exc)
+		else:
+			stats.completed += 1
+			ACTIONS.inc(priority=name, result='completed')
+			action.future.set_result(result)
+		finally:
+			self._running -= 1
+
+			if capped:
+				self._capped -= 1
+
+			self._finish(action.bucket)
+
+	def _finish(self, key):
+		bucket = self._buckets[key]
+		bucket.busy = False
+
+		if bucket.queue:
+			self._push_ready(bucket.queue[0])
+		else:
+			del self._buckets[key]
+
+		self._pump()
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from uuid import uuid4
+
+from discord.ext import commands
+
+from utils.pglistener import PostgresListener
+
+
+log = logging.getLogger(__name__)
+
+
+def shard_slices(shard_count, cluster_count):
+	'''Split shard ids into cluster_count contiguous, evenly sized lists.'''
+
+	per, extra = divmod(shard_count, cluster_count)
+	slices, start = list(), 0
+
+	for cluster_id in range(cluster_count):
+		end = start + per + (1 if cluster_id < extra else 0)
+		slices.append(list(range(start, end)))
+		start = end
+
+	return slices
+
+
+class IPCUnavailable(commands.CommandError):
+	pass
+
+
+class ClusterIPC(PostgresListener):
+	'''Request/response messaging between the processes of a cluster, over Postgres notifications.
+
+	A request is handled by every cluster, including the one sending it.'''
+
+	CHANNEL = 'cluster_ipc'
+
+	def __init__(self, bot, dsn, cluster_id, cluster_count):
+		super().__init__(bot, dsn, self.CHANNEL)
+
+		self.cluster_id = cluster_id
+		self.cluster_count = cluster_count
+
+		self.handlers = dict()
+		self._waiting = dict()
+
+	def register(self, name, handler):
+		self.handlers[name] = handler
+
+	async def request(self, name, data=None, timeout=5.0):
+		'''Returns a dict of cluster id to handler result. Clusters that don't respond in time are left out.
+
+		Raises IPCUnavailable right away if the listener is down, since no response could arrive.'''
+
+		if not self.connected:
+			raise IPCUnavailable('Cluster IPC is not connected, try again in a bit.')
+
+		nonce = uuid4().hex
+		responses = dict()
+		done = asyncio.Event()
+
+		self._waiting[nonce] = (responses, done)
+
+		try:
+			await self.notify((dict(op='request', nonce=nonce, name=name, data=data),))
+
+			try:
+				await asyncio.wait_for(done.wait(), timeout=timeout)
+			except asyncio.TimeoutError:
+				log.warning('IPC request %s got %s of %s responses', name, len(responses), self.cluster_count)
+
+			return dict(responses)
+		finally:
+			self._waiting.pop(nonce, None)
+
+	def on_notification(self, data, own):
+		op = data.get('op')
+
+		if op == 'request':
+			self.bot.loop.create_task(self._respond(data))
+
+		elif op == 'response':
+			waiting = self._waiting.get(data.get('nonce'))
+			if waiting is None:
+				return
+
+			responses, done = waiting
+			responses[data.get('cluster_id')] = data.get('result')
+
+			if len(responses) >= self.cluster_count:
+				done.set()
+
+	async def _respond(self, data):
+		name = data.get('name')
+		handler = self.handlers.get(name)
+
+		if handler is None:
+			log.warning('No IPC handler for %s', name)
+			result = None
+		else:
+			try:
+				result = await handler(data.get('data'))
+			except Exception:
+				log.exception('IPC handler %s failed', name)
+				result = None
+
+		await self.notify((dict(op='response', nonce=data.get('nonce'), cluster_id=self.cluster_id, result=result),))
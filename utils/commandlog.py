@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from datetime import datetime
+from time import perf_counter
+
+import asyncpg
+
+
+log = logging.getLogger(__name__)
+
+
+class CommandLogBuffer:
+	'''Queues command log records in memory and writes them to the log table in bulk.'''
+
+	COLUMNS = ('guild_id', 'channel_id', 'user_id', 'timestamp', 'command')
+
+	# errors from the database being briefly unreachable, anything else is a bug and logged as one
+	TRANSIENT = (asyncpg.PostgresConnectionError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+	# if the database is unreachable, keep at most this many records around before dropping the oldest
+	MAX_PENDING = 50000
+
+	def __init__(self, bot, max_size=256, interval=15.0):
+		self.bot = bot
+		self.max_size = max_size
+		self.interval = interval
+
+		self.records = list()
+		self.flushed = 0
+		self.dropped = 0
+		self.last_flush_size = 0
+		self.last_flush_latency = None
+		self.max_flush_latency = 0.0
+
+		self._lock = asyncio.Lock()
+		self._full = asyncio.Event()
+		self._closing = False
+
+		self.task = self.bot.loop.create_task(self.flusher())
+
+	@property
+	def depth(self):
+		'''Amount of records waiting to be written.'''
+
+		return len(self.records)
+
+	def add(self, ctx):
+		self.records.append((
+			ctx.guild.id, ctx.channel.id, ctx.author.id, datetime.utcnow(), ctx.command.qualified_name
+		))
+
+		self._trim()
+
+		if len(self.records) >= self.max_size:
+			self._full.set()
+
+	def _trim(self):
+		overflow = len(self.records) - self.MAX_PENDING
+		if overflow > 0:
+			del self.records[:overflow]
+			self.dropped += overflow
+
+	async def flusher(self):
+		while not self._closing:
+			try:
+				await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+			except asyncio.TimeoutError:
+				pass
+
+			self._full.clear()
+
+			try:
+				await self.flush()
+			except asyncio.CancelledError:
+				raise
+			except self.TRANSIENT as exc:
+				log.warning('Failed writing %s command log records: %r', self.depth, exc)
+			except Exception:
+				log.exception('Failed writing %s command log records', self.depth)
+
+	async def flush(self):
+		'''Write all queued records. Returns the amount of records written.'''
+
+		async with self._lock:
+			if not self.records:
+				return 0
+
+			records, self.records = self.records, list()
+			start = perf_counter()
+
+			try:
+				# the pool has no copy methods in our asyncpg version, only connections do
+				async with self.bot.db.acquire() as con:
+					await con.copy_records_to_table('log', records=records, columns=self.COLUMNS)
+			except Exception:
+				# put them back in front so nothing is lost on transient failures
+				self.records[:0] = records
+				self._trim()
+
+				raise
+
+			latency = perf_counter() - start
+
+			self.flushed += len(records)
+			self.last_flush_size = len(records)
+			self.last_flush_latency = latency
+			self.max_flush_latency = max(self.max_flush_latency, latency)
+
+			log.debug('Wrote %s command log records in %.2f ms', len(records), latency * 1000)
+
+			return len(records)
+
+	async def close(self):
+		# let the flusher finish a write it's in the middle of instead of cancelling it
+		self._closing = True
+		self._full.set()
+
+		await self.task
+
+		try:
+			await self.flush()
+		except Exception as exc:
+			log.warning('Failed writing %s command log records on shutdown: %r', self.depth, exc)
@@ -0,0 +1,41 @@
+import logging
+
+from utils.pglistener import PostgresListener
+
+
+log = logging.getLogger(__name__)
+
+
+class ConfigSync(PostgresListener):
+	'''Keeps ConfigTable caches in sync across processes using Postgres LISTEN/NOTIFY.
+
+	Every write to a config table is announced on a notification channel, and other processes drop their cached
+	copy of that entry when they receive it.'''
+
+	CHANNEL = 'config_changed'
+
+	def __init__(self, bot, dsn):
+		super().__init__(bot, dsn, self.CHANNEL)
+
+	async def publish(self, table, keys_list, con=None):
+		'''Announce changes to the given entries. If con is in a transaction, delivery happens on commit.'''
+
+		await self.notify((dict(table=table, keys=list(keys)) for keys in keys_list), con=con)
+
+	def on_notification(self, data, own):
+		if own:
+			return
+
+		name = data.get('table')
+		keys = tuple(data.get('keys', ()))
+
+		for table in self.bot.config_tables:
+			if table.table == name:
+				table.invalidate(keys)
+
+	def on_reconnect(self):
+		# we may have missed notifications while disconnected, so start over
+		log.info('Clearing all config caches')
+
+		for table in self.bot.config_tables:
+			table.invalidate_all()
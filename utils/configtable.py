@@ -1,5 +1,8 @@
 import asyncio
 import logging
+from collections import OrderedDict, defaultdict
+from itertools import chain
+from time import monotonic
 
 
 log = logging.getLogger(__name__)
@@ -13,6 +16,9 @@ class ConfigTableRecord(object):
 		self._data = dict()
 		self._dirty = set()
 
+		# future done when a write of this record that's under way finishes
+		self._writing = None
+
 		for key, value in record.items():
 			self._data[key] = value
 
@@ -26,8 +32,29 @@ class ConfigTableRecord(object):
 		else:
 			self.__dict__[key] = value
 
-	def _build_dirty(self, start_at=1):
-		return ', '.join('{} = ${}'.format(key, idx + start_at) for idx, key in enumerate(self._dirty))
+	def _build_dirty(self, dirty, start_at=1):
+		return ', '.join('{} = ${}'.format(key, idx + start_at) for idx, key in enumerate(dirty))
+
+	def _keys(self):
+		return self._config.get_keys_from_record(self._data)
+
+	def _take_dirty(self):
+		'''Returns the dirty keys, update query and query arguments, and clears the dirty keys.'''
+
+		# sorted so records with the same dirty keys produce the same query and can be batched
+		dirty = sorted(self._dirty)
+
+		query = 'UPDATE {} SET {} WHERE {}'.format(
+			self._config.table,
+			self._build_dirty(dirty, len(self._config.primary) + 1),
+			self._config.build_predicate()
+		)
+
+		args = self._keys() + tuple(self._data[key] for key in dirty)
+
+		self._clear_dirty()
+
+		return dirty, query, args
 
 	def _set_dirty(self, key):
 		if key not in self._data:
@@ -57,22 +84,59 @@ class ConfigTableRecord(object):
 		if not self._dirty:
 			raise ValueError('No values dirty for table {}'.format(self._config.table))
 
-		query = 'UPDATE {} SET {} WHERE {}'.format(
-			self._config.table,
-			self._build_dirty(len(self._config.primary) + 1),
-			self._config.build_predicate()
-		)
+		if self._config.write_delay is None:
+			await self.flush()
+		else:
+			self._config.schedule_write(self)
 
-		keys = tuple(self._data[primary] for primary in self._config.primary)
-		values = tuple(self._data[key] for key in self._dirty)
+	async def flush(self):
+		'''Write pending changes of this record to the database right away.'''
 
-		await self._config.bot.db.execute(query, *keys, *values)
+		# changes already taken by another write are only known to be written once that write is done. if it fails they're
+		# marked dirty again and written below
+		while self._writing is not None:
+			await asyncio.wait((self._writing,))
 
-		self._clear_dirty()
+		self._config._pending.pop(self._keys(), None)
+
+		if not self._dirty:
+			return
+
+		dirty, query, args = self._take_dirty()
+		writing = self._start_write()
+
+		try:
+			async with self._config.bot.db.acquire() as con:
+				async with con.transaction():
+					await con.execute(query, *args)
+					await self._config.bot.config_sync.publish(self._config.table, (self._keys(),), con=con)
+		except Exception:
+			self._dirty.update(dirty)
+
+			if self._config.write_delay is not None:
+				self._config.schedule_write(self)
+
+			raise
+		finally:
+			self._end_write(writing)
+
+	def _start_write(self, writing=None):
+		if writing is None:
+			writing = self._config.bot.loop.create_future()
+
+		self._writing = writing
+		return self._writing
+
+	def _end_write(self, writing):
+		if not writing.done():
+			writing.set_result(None)
+
+		if self._writing is writing:
+			self._writing = None
 
 
 class ConfigTable:
-	def __init__(self, bot, table, primary, record_class=None):
+	def __init__(self, bot, table, primary, record_class=None, preload=False, max_size=None, ttl=None, write_delay=None):
 		record_class = record_class or ConfigTableRecord
 
 		if record_class is not ConfigTableRecord and not issubclass(record_class, ConfigTableRecord):
@@ -86,11 +150,34 @@ class ConfigTable:
 		self.bot = bot
 		self.table = table
 		self.primary = primary
-		self.entries = dict()
+		self.entries = OrderedDict()
+		self.preload = preload
+
+		# least recently used entries are evicted past max_size, and entries older than ttl seconds are refetched
+		self.max_size = max_size
+		self.ttl = ttl
+
+		# if set, updates are held back for this many seconds and written together with other updates
+		self.write_delay = write_delay
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.writes = 0
 
 		self._record_class = record_class
-		self._lock = asyncio.Lock()
-		self._non_existent = set()
+		self._non_existent = OrderedDict()
+		self._loaded_at = dict()
+
+		# keys currently being fetched from the database, mapped to an event set when the fetch is done
+		self._loading = dict()
+
+		# keys invalidated by another process while being fetched here
+		self._stale = set()
+
+		# records with changes not yet written, by keys
+		self._pending = dict()
+		self._write_task = None
 
 		log.debug('Constructed ConfigTable for table %s with keys %s', table, primary)
 
@@ -108,19 +195,200 @@ class ConfigTable:
 			', '.join('${}'.format(idx + 1) for idx, _ in enumerate(self.primary))
 		)
 
+	@property
+	def _insert_returning_query(self):
+		return self._insert_query + ' ON CONFLICT DO NOTHING RETURNING *'
+
+	async def preload_entries(self, guild_ids):
+		'''Fetch rows for many guilds in one query. Returns amount of entries loaded.
+
+		Guilds without a row are put in the negative cache, unless the table has more than one primary key.'''
+
+		guild_ids = list(guild_ids)
+
+		if not guild_ids:
+			return 0
+
+		query = 'SELECT * FROM {} WHERE {} = ANY($1::BIGINT[])'.format(self.table, self.primary[0])
+		records = await self.bot.db.fetch(query, guild_ids)
+
+		loaded = 0
+
+		for record in records:
+			keys = self.get_keys_from_record(record)
+
+			# don't clobber entries that were loaded (and possibly modified) in the meantime
+			if keys not in self.entries:
+				await self.insert_record(record, keys=keys)
+				loaded += 1
+
+		if len(self.primary) == 1:
+			found = set(record.get(self.primary[0]) for record in records)
+
+			for guild_id in guild_ids:
+				if guild_id not in found and (guild_id,) not in self.entries:
+					self._add_non_existent((guild_id,))
+
+		log.info('Preloaded %s entries for table %s', loaded, self.table)
+
+		return loaded
+
 	async def insert_record(self, record, keys=None):
 		keys = keys or self.get_keys_from_record(record)
 
-		if keys in self._non_existent:
-			self._non_existent.remove(keys)
+		self._non_existent.pop(keys, None)
 
 		log.debug('Inserting record with keys %s for table %s', keys, self.table)
 
 		entry = self._record_class(self, record)
+		self._cache(keys, entry)
+
+		return entry
+
+	def _cache(self, keys, entry):
 		self.entries[keys] = entry
+		self.entries.move_to_end(keys)
+		self._loaded_at[keys] = monotonic()
+
+		if self.max_size is not None:
+			while len(self.entries) > self.max_size:
+				self._evict(next(iter(self.entries)))
+
+	def _add_non_existent(self, keys):
+		self._non_existent[keys] = None
+		self._non_existent.move_to_end(keys)
+
+		if self.max_size is not None:
+			while len(self._non_existent) > self.max_size:
+				self._non_existent.popitem(last=False)
+				self.evictions += 1
+
+	def _evict(self, keys):
+		self.entries.pop(keys, None)
+		self._loaded_at.pop(keys, None)
+		self.evictions += 1
 
+	def _get_cached(self, keys):
+		entry = self.entries.get(keys)
+
+		if entry is None:
+			# an evicted record with unwritten changes is still the most recent version
+			entry = self._pending.get(keys)
+			if entry is not None:
+				self._cache(keys, entry)
+
+			return entry
+
+		if self.ttl is not None and monotonic() - self._loaded_at[keys] > self.ttl:
+			# refetching would throw away changes that aren't in the database yet, so those are kept until written
+			if keys not in self._pending and entry._writing is None:
+				self._evict(keys)
+				return None
+
+		self.entries.move_to_end(keys)
 		return entry
 
+	def peek(self, *keys):
+		'''Returns the cached entry for keys, or None if not cached. Never touches the database.'''
+
+		return self._get_cached(tuple(keys))
+
+	def known_missing(self, *keys):
+		'''True if keys are known to have no row.'''
+
+		return tuple(keys) in self._non_existent
+
+	@property
+	def stats(self):
+		return dict(
+			entries=len(self.entries),
+			non_existent=len(self._non_existent),
+			hits=self.hits,
+			misses=self.misses,
+			evictions=self.evictions,
+			pending=len(self._pending),
+			writes=self.writes,
+		)
+
+	def schedule_write(self, record):
+		self._pending[record._keys()] = record
+
+		if self._write_task is None or self._write_task.done():
+			self._write_task = self.bot.loop.create_task(self._write_later())
+
+	async def _write_later(self):
+		while self._pending:
+			await asyncio.sleep(self.write_delay)
+
+			try:
+				await self.flush()
+			except asyncio.CancelledError:
+				raise
+			except Exception as exc:
+				log.warning('Failed writing %s records for table %s: %r', len(self._pending), self.table, exc)
+
+	async def flush(self):
+		'''Write all records with pending changes in one transaction. Returns amount of records written.'''
+
+		# writes already in flight have to land first, both so they're done once this returns and so newer changes to the
+		# same records aren't written before them
+		while True:
+			writing = set(
+				record._writing for record in chain(self.entries.values(), self._pending.values())
+				if record._writing is not None
+			)
+
+			if not writing:
+				break
+
+			await asyncio.wait(writing)
+
+		if not self._pending:
+			return 0
+
+		pending, self._pending = self._pending, dict()
+
+		taken = list()
+		batches = defaultdict(list)
+
+		for record in pending.values():
+			if not record._dirty:
+				continue
+
+			dirty, query, args = record._take_dirty()
+
+			taken.append((record, dirty))
+			batches[query].append(args)
+
+		writing = self.bot.loop.create_future()
+
+		for record, _ in taken:
+			record._start_write(writing)
+
+		try:
+			async with self.bot.db.acquire() as con:
+				async with con.transaction():
+					for query, args in batches.items():
+						await con.executemany(query, args)
+
+					await self.bot.config_sync.publish(self.table, (record._keys() for record, _ in taken), con=con)
+		except Exception:
+			# put everything back so it's retried later
+			for record, dirty in taken:
+				record._dirty.update(dirty)
+				self._pending.setdefault(record._keys(), record)
+
+			raise
+		finally:
+			for record, _ in taken:
+				record._end_write(writing)
+
+		self.writes += len(taken)
+
+		log.debug('Wrote %s records for table %s', len(taken), self.table)
+
+		return len(taken)
+
 	async def get_entry(self, *keys, construct=True):
 		keys = tuple(keys)
 
@@ -128,29 +396,91 @@ class ConfigTable:
 			if not isinstance(key, int):
 				raise TypeError('Primary key must be int.')
 
-		if not construct and keys in self._non_existent:
-			return None
+		while True:
+			# cache hits never wait on anything
+			entry = self._get_cached(keys)
+			if entry is not None:
+				self.hits += 1
+				return entry
 
-		async with self._lock:
-			if keys in self.entries:
-				return self.entries[keys]
+			if not construct and keys in self._non_existent:
+				self.hits += 1
+				self._non_existent.move_to_end(keys)
+				return None
 
-			get_query = 'SELECT * FROM {} WHERE '.format(self.table) + self.build_predicate()
+			# if someone else is already loading this key, wait for them and check the cache again
+			loading = self._loading.get(keys)
+			if loading is None:
+				break
 
-			record = await self.bot.db.fetchrow(get_query, *keys)
+			await loading.wait()
 
-			if record is None:
-				if not construct:
-					self._non_existent.add(keys)
-					return None
-				elif keys in self._non_existent:
-					self._non_existent.remove(keys)
+		self.misses += 1
 
-				await self.bot.db.execute(self._insert_query, *keys)
+		loading = asyncio.Event()
+		self._loading[keys] = loading
+
+		try:
+			entry = await self._load_entry(keys, construct)
+
+			# invalidated while we were fetching, so what we got may be outdated. don't keep it around
+			if keys in self._stale:
+				self.entries.pop(keys, None)
+				self._non_existent.pop(keys, None)
+
+			return entry
+		finally:
+			self._loading.pop(keys, None)
+			self._stale.discard(keys)
+			loading.set()
+
+	async def _load_entry(self, keys, construct):
+		get_query = 'SELECT * FROM {} WHERE '.format(self.table) + self.build_predicate()
+
+		# we already know there's no row, so go straight to creating it
+		if construct and keys in self._non_existent:
+			record = await self.bot.db.fetchrow(self._insert_returning_query, *keys)
+
+			if record is None:
 				record = await self.bot.db.fetchrow(get_query, *keys)
+			else:
+				await self.bot.config_sync.publish(self.table, (keys,))
 
 			return await self.insert_record(record, keys=keys)
 
+		record = await self.bot.db.fetchrow(get_query, *keys)
+
+		if record is None:
+			if not construct:
+				self._add_non_existent(keys)
+				return None
+
+			await self.bot.db.execute(self._insert_query, *keys)
+			record = await self.bot.db.fetchrow(get_query, *keys)
+
+			await self.bot.config_sync.publish(self.table, (keys,))
+
+		return await self.insert_record(record, keys=keys)
+
+	def invalidate(self, keys):
+		'''Drop cached state for keys without writing anything. Used when another process changed the row.'''
+
+		if keys in self._loading:
+			self._stale.add(keys)
+
+		self.entries.pop(keys, None)
+		self._loaded_at.pop(keys, None)
+		self._non_existent.pop(keys, None)
+
+		log.debug('Invalidated entry %s for table %s', keys, self.table)
+
+	def invalidate_all(self):
+		self._stale.update(self._loading.keys())
+
+		self.entries.clear()
+		self._loaded_at.clear()
+		self._non_existent.clear()
+
 	def has_entry(self, *keys):
 		return tuple(keys) in self.entries
 
@@ -159,16 +489,19 @@ class ConfigTable:
 
 		keys = tuple(keys)
 
-		async with self._lock:
-			if keys in self._non_existent:
-				log.info('Clearing non-existent entry %s for table %s', keys, self.table)
-				self._non_existent.remove(keys)
-
-			removed = bool(self.entries.pop(keys, False))
+		# write any held back changes before dropping the record
+		record = self._pending.get(keys)
+		if record is not None:
+			await record.flush()
 
-			if removed:
-				log.info('Clearing entry %s for table %s', keys, self.table)
+		if keys in self._non_existent:
+			log.info('Clearing non-existent entry %s for table %s', keys, self.table)
+			del self._non_existent[keys]
 
-			return removed
+		removed = bool(self.entries.pop(keys, False))
+		self._loaded_at.pop(keys, None)
 
+		if removed:
+			log.info('Clearing entry %s for table %s', keys, self.table)
 
+		return removed
@@ -37,6 +37,9 @@ class AceContext(commands.Context):
 	def __init__(self, **kwargs):
 		super().__init__(**kwargs)
 
+		# perf_counter() at on_command, for command latency metrics
+		self.invoked_at = None
+
 	@property
 	def db(self):
 		return self.bot.db
@@ -45,6 +48,10 @@ class AceContext(commands.Context):
 	def http(self):
 		return self.bot.aiohttp
 
+	@property
+	def web(self):
+		return self.bot.web.interactive
+
 	@property
 	def perms(self):
 		return self.channel.permissions_for(self.guild.me)
@@ -87,6 +94,9 @@ class AceContext(commands.Context):
 	async def send_help(self, command=None):
 		'''Convenience method for sending help.'''
 
+		# help should list every command
+		self.bot.load_deferred_extensions()
+
 		perms = self.perms
 		missing_perms = list(perm for perm in STATIC_PERMS if not getattr(perms, perm))
 
@@ -35,7 +35,7 @@ def _make_int(converter, ctx, argument):
 
 class MaybeMemberConverter(commands.MemberConverter):
 	async def resolve_id(self, ctx, member_id):
-		member = ctx.guild.get_member(member_id)
+		member = await ctx.bot.member_policy.resolve(ctx.guild, member_id)
 		if member is not None:
 			return member
 
@@ -4,6 +4,8 @@ import asyncpg
 import logging
 
 from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from itertools import count
 
 from utils.time import pretty_timedelta
 
@@ -12,81 +14,222 @@ log = logging.getLogger(__name__)
 
 
 class DatabaseTimer:
+	'''Deletes each record when it's due and passes it to the listeners of an event.
+
+	The earliest WINDOW_SIZE records are kept in a heap. New and changed records are passed to add() and removed ones to
+	remove(), which go into the heap directly without querying again. The database is only read when the window runs
+	out and there might be more records after it.
+
+	When a record is due, it and other records that are due by then are deleted and returned in one query, and handed
+	to the event's listeners right away. At most MAX_CONCURRENCY records are handled at a time, and only as many are
+	claimed as there's room for, so nothing that isn't being handled yet is missing from the database if the bot goes
+	down.'''
+
 	MAX_SLEEP = timedelta(days=40)
 
+	WINDOW_SIZE = 1000
+
+	MAX_CONCURRENCY = 20
+
 	def __init__(self, bot, event_name):
 		self.bot = bot
 		self.event_name = event_name
 
-		self.record = None
+		self._heap = list()  # (when, seq, id)
+		self._entries = dict()  # id -> (seq, record)
+		self._seq = count()
+
+		# when the window is full, records at or after the horizon are left in the database
+		self._full = False
+		self._horizon = None
+
+		self._stale = True
+		self._wakeup = asyncio.Event()
+
+		self._handlers = set()
+
 		self.task = self.start_task()
 
 	def start_task(self):
 		return self.bot.loop.create_task(self.dispatch())
 
 	def restart_task(self):
-		self.task.cancel()
-		self.task = self.start_task()
+		'''Throw away the window and load it again.'''
+
+		self._stale = True
+		self._wakeup.set()
+
+	@property
+	def pending(self):
+		return len(self._entries)
+
+	def add(self, record):
+		'''Schedule a new record, or reschedule one that changed.'''
+
+		self._forget(record.get('id'))
+
+		when = self.when(record)
+
+		if when is None:
+			return
+
+		# not in the window, it will be loaded when the window gets to it
+		if self._full and when >= self._horizon:
+			return
+
+		self._push(record, when)
+		self._wakeup.set()
+
+		# in case the dispatcher died anyway, the old timer restarted it on every new record too
+		if self.task.done():
+			self._stale = True
+			self.task = self.start_task()
+
+	def remove(self, record_id):
+		'''Unschedule a record that was deleted.'''
+
+		self._forget(record_id)
+
+	def _push(self, record, when):
+		seq = next(self._seq)
+		self._entries[record.get('id')] = (seq, record)
+		heappush(self._heap, (when, seq, record.get('id')))
+
+	def _forget(self, record_id):
+		# the heap entry is skipped once it comes up
+		self._entries.pop(record_id, None)
+
+	def _next(self):
+		while self._heap:
+			when, seq, record_id = self._heap[0]
+			entry = self._entries.get(record_id)
+
+			if entry is not None and entry[0] == seq:
+				return entry[1]
+
+			heappop(self._heap)
+
+		return None
+
+	async def _load(self):
+		if self._stale:
+			self._heap.clear()
+			self._entries.clear()
+
+		records = await self.get_records(self.WINDOW_SIZE)
+
+		self._stale = False
+		self._full = len(records) == self.WINDOW_SIZE
+		self._horizon = self.when(records[-1]) if self._full else None
+
+		for record in records:
+			# keep records added while the query ran
+			if record.get('id') not in self._entries:
+				self._push(record, self.when(record))
+
+		log.debug('Loaded %s records for %s', len(records), self.event_name)
+
+	async def _wait(self, timeout):
+		self._wakeup.clear()
 
-	async def dispatch(self):
 		try:
-			while True:
-				# fetch next record
-				record = await self.get_record()
+			await asyncio.wait_for(self._wakeup.wait(), timeout)
+		except asyncio.TimeoutError:
+			pass
+
+	async def dispatch(self):
+		while True:
+			try:
+				if self._stale:
+					await self._load()
+
+				record = self._next()
 
-				# if none was found, sleep for 40 days and check again
 				if record is None:
+					# the window is used up, but there might be more in the database
+					if self._full:
+						await self._load()
+						continue
+
 					log.debug('No record found for %s, sleeping', self.event_name)
-					await asyncio.sleep(self.MAX_SLEEP.total_seconds())
+					await self._wait(self.MAX_SLEEP.total_seconds())
 					continue
 
-				# we are now with this record
-				self.record = record
-
-				# get datetime again in case query took a lot of time
-				now = datetime.utcnow()
 				then = self.when(record)
-				dt = then - now
+				now = datetime.utcnow()
 
-				# if the next record is in the future, sleep until it should be invoked
+				# if the next record is in the future, sleep until it should be invoked or an earlier one comes in
 				if now < then:
 					log.debug('%s dispatching in %s', self.event_name, pretty_timedelta(then - now))
-					await asyncio.sleep(dt.total_seconds())
+					await self._wait(min(then - now, self.MAX_SLEEP).total_seconds())
+					continue
 
-				await self.cleanup_record(record)
-				self.record = None
+				free = self.MAX_CONCURRENCY - len(self._handlers)
 
-				log.debug('Dispatching event %s', self.event_name)
+				# claimed records are gone from the database, so they're only claimed once they can be handled
+				if free <= 0:
+					await asyncio.wait(self._handlers, return_when=asyncio.FIRST_COMPLETED)
+					continue
 
-				# run it
-				self.bot.dispatch(self.event_name, record)
+				records = await self.claim_records(now, free)
 
-		except (discord.ConnectionClosed, asyncpg.PostgresConnectionError) as e:
-			# if anything happened, sleep for 15 seconds then attempt a restart
-			log.warning('DatabaseTimer got exception %s: attempting restart in 15 seconds', str(e))
+				# the head might have been deleted by someone else, in which case it's not among them
+				self._forget(record.get('id'))
 
-			await asyncio.sleep(15)
-			self.restart_task()
+				for claimed in records:
+					self._forget(claimed.get('id'))
+					self._spawn(claimed)
 
-	async def get_record(self):
-		raise NotImplementedError
+				log.debug('Dispatching %s %s events', len(records), self.event_name)
 
-	async def cleanup_record(self, record):
-		raise NotImplementedError
+			except asyncio.CancelledError:
+				raise
+			except (discord.ConnectionClosed, asyncpg.PostgresConnectionError) as e:
+				# if anything happened, sleep for 15 seconds then load everything again
+				log.warning('DatabaseTimer got exception %s: attempting restart in 15 seconds', str(e))
+
+				await asyncio.sleep(15)
+				self._stale = True
+			except Exception:
+				log.exception('DatabaseTimer for %s failed: attempting restart in 15 seconds', self.event_name)
+
+				await asyncio.sleep(15)
+				self._stale = True
+
+	def _spawn(self, record):
+		task = self.bot.loop.create_task(self._handle(record))
+
+		self._handlers.add(task)
+		task.add_done_callback(self._handlers.discard)
+
+	async def _handle(self, record):
+		# the listeners are awaited here instead of being dispatched, so the dispatcher knows when there's room for more
+		for listener in self.bot.extra_events.get('on_' + self.event_name, list()):
+			try:
+				await listener(record)
+			except asyncio.CancelledError:
+				raise
+			except Exception:
+				log.exception('Listener for %s failed on record %s', self.event_name, record.get('id'))
+
+	@property
+	def handling(self):
+		return len(self._handlers)
+
+	async def get_records(self, limit):
+		'''The first limit records ordered by when they're due.'''
 
-	def when(self, record):
 		raise NotImplementedError
 
-	def maybe_restart(self, dt):
-		if self.record is None:
-			self.restart_task()
+	async def claim_records(self, until, limit):
+		'''Delete and return up to limit records due before until, earliest first.
 
-		elif dt < self.when(self.record):
-			self.restart_task()
+		Rows locked by another process claiming them are skipped.'''
 
-	def restart_if(self, pred):
-		if self.record is None or pred(self.record):
-			self.restart_task()
+		raise NotImplementedError
+
+	def when(self, record):
+		raise NotImplementedError
 
 
 class ColumnTimer(DatabaseTimer):
@@ -95,14 +238,21 @@ class ColumnTimer(DatabaseTimer):
 		self.table = table
 		self.column = column
 
-	async def get_record(self):
-		return await self.bot.db.fetchrow(
-			'SELECT * FROM {0} WHERE {1} < $1 AND {1} IS NOT NULL ORDER BY {1} LIMIT 1'.format(self.table, self.column),
-			datetime.utcnow() + self.MAX_SLEEP
+	async def get_records(self, limit):
+		return await self.bot.db.fetch(
+			'SELECT * FROM {0} WHERE {1} IS NOT NULL AND {2} ORDER BY {1} LIMIT $1'.format(
+				self.table, self.column, self.bot.shard_filter()
+			),
+			limit
 		)
 
-	async def cleanup_record(self, record):
-		await self.bot.db.execute('DELETE FROM {0} WHERE id=$1'.format(self.table), record.get('id'))
+	async def claim_records(self, until, limit):
+		return await self.bot.db.fetch(
+			'DELETE FROM {0} WHERE id IN ('
+			'SELECT id FROM {0} WHERE {1} <= $1 AND {2} ORDER BY {1} LIMIT $2 FOR UPDATE SKIP LOCKED'
+			') RETURNING *'.format(self.table, self.column, self.bot.shard_filter()),
+			until, limit
+		)
 
 	def when(self, record):
 		return record.get(self.column)
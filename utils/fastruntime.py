@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+
+import aiohttp
+import discord
+
+from utils import webclient
+
+try:
+	import uvloop
+except ImportError:
+	uvloop = None
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+try:
+	import aiodns
+except ImportError:
+	aiodns = None
+
+
+log = logging.getLogger(__name__)
+
+
+class _FastJSON:
+	'''Stands in for the json module where the lib decodes payloads. Only loads is swapped.'''
+
+	def __init__(self, loads):
+		self.loads = loads
+
+	def __getattr__(self, name):
+		return getattr(json, name)
+
+
+def _orjson_dumps(obj, **kwargs):
+	# orjson ignores separators and always writes compact output, which is what the lib asks for anyway
+	return orjson.dumps(obj).decode('utf-8')
+
+
+class FastResponse(aiohttp.ClientResponse):
+	async def json(self, *, loads=None, **kwargs):
+		return await super().json(loads=loads or orjson.loads, **kwargs)
+
+
+class Runtime:
+	'''Which speedups are active. The default profile has none of them.'''
+
+	def __init__(self, uvloop=False, json=False, dns=False):
+		self.uvloop = uvloop
+		self.json = json
+		self.dns = dns
+
+	@property
+	def name(self):
+		enabled = [name for name in ('uvloop', 'json', 'dns') if getattr(self, name)]
+		return 'fast ({0})'.format(', '.join(enabled)) if enabled else 'default'
+
+	def session_kwargs(self):
+		'''Extra arguments for creating an aiohttp.ClientSession. Must be called with a running or current loop.'''
+
+		kwargs = dict()
+
+		if self.dns:
+			kwargs['connector'] = aiohttp.TCPConnector(resolver=aiohttp.AsyncResolver())
+
+		if self.json:
+			kwargs['response_class'] = FastResponse
+			kwargs['json_serialize'] = _orjson_dumps
+
+		return kwargs
+
+
+def enable_fast_runtime():
+	'''Swap in uvloop, orjson and aiodns where installed. Call before the event loop is created.
+
+	Anything missing is logged and skipped, so this never fails.'''
+
+	runtime = Runtime()
+
+	if uvloop is None:
+		log.warning('uvloop not installed, using the default event loop')
+	else:
+		asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+		runtime.uvloop = True
+
+	if orjson is None:
+		log.warning('orjson not installed, using the standard json module')
+	else:
+		# gateway payloads and REST responses are decoded through these module references
+		for module in (discord.gateway, discord.http):
+			if hasattr(module, 'json'):
+				module.json = _FastJSON(orjson.loads)
+
+		discord.utils.to_json = _orjson_dumps
+		webclient.json_loads = orjson.loads
+		runtime.json = True
+
+	if aiodns is None:
+		log.warning('aiodns not installed, resolving hosts in a thread pool')
+	else:
+		runtime.dns = True
+
+	log.info('Using %s runtime', runtime.name)
+
+	return runtime
@@ -22,7 +22,7 @@ class HelpPager(Pager):
 		name = f'{cog_name} Commands'
 
 		desc = ''
-		if self.ctx.guild.owner != self.ctx.author:
+		if self.ctx.guild.owner_id != self.ctx.author.id:
 			desc += self.craft_invite_string()
 
 		if cog_desc is not None:
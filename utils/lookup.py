@@ -5,10 +5,13 @@ from datetime import datetime, timedelta
 
 
 class DiscordLookup:
-	def __init__(self, ctx, query):
+	def __init__(self, ctx, query, members=None):
 		self.ctx = ctx
 		self.query = query
 
+		if members is None:
+			members = ctx.guild.members
+
 		all_roles = list(reversed(ctx.guild.roles[1:]))
 
 		self.namespace = dict(
@@ -18,7 +21,7 @@ class DiscordLookup:
 			guild=ctx.guild,
 			author=ctx.author,
 			message=ctx.message,
-			members=ctx.guild.members,
+			members=members,
 			emojis=ctx.guild.emojis,
 			channels=ctx.guild.channels,
 			roles=all_roles,
@@ -40,7 +43,7 @@ class DiscordLookup:
 			past=lambda *args, **kwargs: datetime.utcnow() - timedelta(*args, **kwargs),
 			guild=lambda ident: self.get_object(ctx.bot.guilds, ident),
 			role=lambda ident: self.get_object(all_roles, ident),
-			member=lambda ident: self.get_object(ctx.guild.members, ident),
+			member=lambda ident: self.get_object(members, ident),
 			user=lambda ident: self.get_object(ctx.bot.users, ident),
 			channel=lambda ident: self.get_object(list(ctx.bot.get_all_channels()), ident),
 			emoji=lambda ident: self.get_object(ctx.guild.emojis, ident),
@@ -0,0 +1,171 @@
+import asyncio
+import heapq
+import logging
+import sys
+import threading
+import traceback
+import weakref
+from datetime import datetime
+from time import perf_counter
+
+from discord.ext import tasks
+
+from utils.metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+	'acebot_loop_lag_seconds', 'How late the event loop woke up the lag monitor.',
+	buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+
+class Stall:
+	__slots__ = ('duration', 'at', 'stack')
+
+	def __init__(self, duration, at, stack):
+		self.duration = duration
+		self.at = at
+		self.stack = stack
+
+	def __lt__(self, other):
+		return self.duration < other.duration
+
+
+class LoopMonitor:
+	'''Samples event loop lag and keeps the worst stalls along with what the loop was running during them.
+
+	A coroutine on the loop beats every interval. A watchdog thread looks at the beat, and when the loop has been
+	stuck for longer than the threshold it grabs the stack of the loop thread, which is whatever is blocking it.'''
+
+	def __init__(self, loop, interval=0.25, threshold=0.25, keep=10):
+		self.loop = loop
+		self.interval = interval
+		self.threshold = threshold
+		self.keep = keep
+
+		self.samples = 0
+		self.total_lag = 0.0
+		self.max_lag = 0.0
+		self.stalls = list()  # min-heap of the worst stalls
+
+		self.created_at = weakref.WeakKeyDictionary()
+
+		self._beat = perf_counter()
+		self._stack = None
+		self._loop_thread = None
+		self._task = None
+		self._thread = None
+		self._stopping = threading.Event()
+
+	def start(self):
+		'''Start sampling. Must be called from the loop thread.'''
+
+		if self._task is not None:
+			return
+
+		self._loop_thread = threading.get_ident()
+		self._install_task_factory()
+
+		self._task = self.loop.create_task(self._sampler())
+
+		self._thread = threading.Thread(target=self._watchdog, name='loop-monitor', daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._stopping.set()
+
+		if self._task is not None:
+			self._task.cancel()
+
+	def _install_task_factory(self):
+		'''Remember when each task was created, so task ages can be shown.'''
+
+		previous = self.loop.get_task_factory()
+		created_at = self.created_at
+
+		def factory(loop, coro, **kwargs):
+			task = asyncio.Task(coro, loop=loop, **kwargs) if previous is None else previous(loop, coro, **kwargs)
+			created_at[task] = datetime.utcnow()
+			return task
+
+		self.loop.set_task_factory(factory)
+
+	async def _sampler(self):
+		while True:
+			self._beat = perf_counter()
+			await asyncio.sleep(self.interval)
+
+			lag = max(0.0, perf_counter() - self._beat - self.interval)
+			stack, self._stack = self._stack, None
+
+			self.samples += 1
+			self.total_lag += lag
+			self.max_lag = max(self.max_lag, lag)
+			LOOP_LAG.observe(lag)
+
+			if lag >= self.threshold:
+				self._add_stall(lag, stack)
+
+	def _add_stall(self, lag, stack):
+		if stack is None:
+			# stall fell between two watchdog checks
+			stack = ['(no stack captured)\n']
+
+		log.warning('Event loop was blocked for %.0f ms in:\n%s', lag * 1000, ''.join(stack[-4:]).rstrip())
+
+		stall = Stall(lag, datetime.utcnow(), stack)
+
+		if len(self.stalls) < self.keep:
+			heapq.heappush(self.stalls, stall)
+		else:
+			heapq.heappushpop(self.stalls, stall)
+
+	def _watchdog(self):
+		while not self._stopping.wait(self.interval):
+			overdue = perf_counter() - self._beat - self.interval
+
+			if overdue < self.threshold or self._stack is not None:
+				continue
+
+			frame = sys._current_frames().get(self._loop_thread)
+
+			if frame is not None:
+				self._stack = traceback.format_stack(frame)
+
+	@property
+	def avg_lag(self):
+		return self.total_lag / self.samples if self.samples else 0.0
+
+	def worst_stalls(self):
+		return sorted(self.stalls, reverse=True)
+
+	def reset(self):
+		self.samples = 0
+		self.total_lag = 0.0
+		self.max_lag = 0.0
+		self.stalls.clear()
+
+
+def task_origin(task):
+	'''Readable name of what a task is running.'''
+
+	# get_coro() is 3.8+, the Dockerfile runs 3.7
+	coro = getattr(task, 'get_coro', lambda: task._coro)()
+	name = getattr(coro, '__qualname__', None) or repr(coro)
+	frame = getattr(coro, 'cr_frame', None)
+
+	if frame is None:
+		return name
+
+	owner = frame.f_locals.get('self')
+
+	# tasks.loop and event listeners run our coroutines through wrappers from the lib
+	if isinstance(owner, tasks.Loop):
+		return '{0} (loop)'.format(owner.coro.__qualname__)
+
+	if name.endswith('._run_event'):
+		return 'event {0}'.format(frame.f_locals.get('event_name'))
+
+	return name
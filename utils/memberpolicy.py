@@ -0,0 +1,172 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+
+class MemberPolicy:
+	'''Decides which guilds keep their full member list in memory.
+
+	When lazy, only guilds that a check asks for are chunked. Everywhere else members are cached as they are seen or
+	looked up, in an LRU of bounded size. When not lazy, every guild is fully cached like before and the methods here
+	just read the cache.'''
+
+	def __init__(self, bot, lazy=False, max_size=50000):
+		self.bot = bot
+		self.lazy = lazy
+		self.max_size = max_size
+
+		self.full_guilds = set()
+		self.checks = dict()
+
+		# (guild id, member id) of lazily cached members, least recently seen first
+		self._seen = OrderedDict()
+
+		self.lookups = 0
+		self.queried = 0
+		self.evicted = 0
+
+	@staticmethod
+	def cache_flags(intents):
+		'''Member cache flags for lazy mode: nothing but the members in voice channels.'''
+
+		flags = discord.MemberCacheFlags.none()
+		flags.voice = intents.voice_states
+		return flags
+
+	def add_check(self, name, check):
+		'''Add a function taking a guild and returning whether it needs its full member list. Replaces any check of the same name.'''
+
+		self.checks[name] = check
+
+	def needs_full(self, guild):
+		return guild.id in self.full_guilds or any(check(guild) for check in self.checks.values())
+
+	def require_full(self, guild):
+		'''Fully cache the members of a guild from now on.'''
+
+		if not self.lazy or guild.id in self.full_guilds:
+			return
+
+		self.full_guilds.add(guild.id)
+
+		if not guild.chunked:
+			self.bot.loop.create_task(self._chunk(guild))
+
+	async def _chunk(self, guild):
+		try:
+			await guild.chunk()
+		except (discord.ClientException, asyncio.TimeoutError) as exc:
+			log.warning('Failed chunking guild %s: %s', guild.id, str(exc))
+
+	async def start(self):
+		'''Chunk all guilds that need their full member list. Run after extensions and configs are loaded.'''
+
+		if not self.lazy:
+			return
+
+		for guild in self.bot.guilds:
+			if self.needs_full(guild):
+				self.full_guilds.add(guild.id)
+
+		guilds = list(guild for guild in self.bot.guilds if guild.id in self.full_guilds and not guild.chunked)
+
+		log.info('Chunking %s of %s guilds', len(guilds), len(self.bot.guilds))
+
+		for guild in guilds:
+			await self._chunk(guild)
+
+	def on_guild_join(self, guild):
+		if self.lazy and self.needs_full(guild):
+			self.require_full(guild)
+
+	def on_member_join(self, member):
+		# the lib doesn't cache joining members in lazy mode
+		if self.lazy and member.guild.id in self.full_guilds:
+			member.guild._add_member(member)
+		else:
+			self.touch(member)
+
+	def touch(self, member):
+		'''Cache a member of a lazily cached guild, or mark it as recently seen.'''
+
+		if not self.lazy or not isinstance(member, discord.Member):
+			return
+
+		guild = member.guild
+
+		if guild.id in self.full_guilds:
+			return
+
+		key = (guild.id, member.id)
+
+		if key in self._seen:
+			self._seen.move_to_end(key)
+		else:
+			self._seen[key] = None
+
+		guild._add_member(member)
+
+		while len(self._seen) > self.max_size:
+			(guild_id, member_id), _ = self._seen.popitem(last=False)
+			self._evict(guild_id, member_id)
+
+	def _evict(self, guild_id, member_id):
+		guild = self.bot.get_guild(guild_id)
+
+		# a guild might have been fully chunked since the member was seen
+		if guild is None or guild_id in self.full_guilds or member_id == self.bot.user.id:
+			return
+
+		member = guild.get_member(member_id)
+
+		# keep members in voice, the lib tracks those itself
+		if member is not None and member.voice is None:
+			guild._remove_member(member)
+			self.evicted += 1
+
+	async def resolve(self, guild, user_id):
+		'''Get a member from cache, or ask the gateway for it. Returns None if they're not in the guild.'''
+
+		self.lookups += 1
+
+		member = guild.get_member(user_id)
+
+		if member is not None:
+			self.touch(member)
+			return member
+
+		# the cache is complete for these
+		if not self.lazy or guild.id in self.full_guilds:
+			return None
+
+		self.queried += 1
+
+		try:
+			members = await guild.query_members(user_ids=[user_id], cache=False)
+		except asyncio.TimeoutError:
+			return None
+
+		if not members:
+			return None
+
+		member = members[0]
+		self.touch(member)
+
+		return member
+
+	async def members_of(self, guild):
+		'''Full member list of a guild. For lazily cached guilds this requests it from the gateway without caching it.'''
+
+		if not self.lazy or guild.id in self.full_guilds or guild.chunked:
+			return guild.members
+
+		return await guild.chunk(cache=False) or list()
+
+	@property
+	def cached(self):
+		return len(self._seen)
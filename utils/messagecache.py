@@ -0,0 +1,184 @@
+import logging
+from collections import OrderedDict, deque
+
+from discord.shard import AutoShardedConnectionState
+
+from utils.metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+LOOKUPS = REGISTRY.counter('acebot_message_cache_lookups_total', 'Message cache lookups by result.', ('result',))
+
+
+class CachePolicy:
+	'''Which channels get priority in the message cache, and how it's been doing.
+
+	Outlives the cache itself, which the lib throws away and rebuilds on ready and on guild removal.'''
+
+	# share of the cache reserved for messages in priority channels
+	PRIORITY_SHARE = 0.25
+
+	# share of each part one guild keeps when the cache is full
+	GUILD_SHARE = 0.05
+	PRIORITY_GUILD_SHARE = 0.25
+
+	def __init__(self):
+		self.priority_channels = set()
+		self.priority_categories = set()
+
+		self.hits = 0
+		self.misses = 0
+
+	def is_priority(self, message):
+		channel = message.channel
+		return channel.id in self.priority_channels or getattr(channel, 'category_id', None) in self.priority_categories
+
+	@property
+	def hit_rate(self):
+		lookups = self.hits + self.misses
+		return self.hits / lookups if lookups else None
+
+
+class _Pool:
+	'''Messages in insertion order with a total cap. Guilds may go over their quota until the pool is full.'''
+
+	def __init__(self, max_size, guild_quota):
+		self.max_size = max_size
+		self.guild_quota = guild_quota
+
+		self.messages = OrderedDict()  # message id -> message
+		self.guilds = dict()  # guild id -> OrderedDict of message ids
+
+		self.evicted = 0
+
+	def add(self, message):
+		guild_id = None if message.guild is None else message.guild.id
+
+		ids = self.guilds.get(guild_id)
+		if ids is None:
+			ids = self.guilds[guild_id] = OrderedDict()
+
+		self.messages[message.id] = message
+		ids[message.id] = None
+
+		if len(self.messages) <= self.max_size:
+			return
+
+		# when full, a guild above its quota makes room from its own messages, others push out the oldest overall
+		if len(ids) > self.guild_quota:
+			message_id, _ = ids.popitem(last=False)
+			del self.messages[message_id]
+		else:
+			_, oldest = self.messages.popitem(last=False)
+			self._forget(oldest)
+
+		self.evicted += 1
+
+	def remove(self, message):
+		if self.messages.pop(message.id, None) is not None:
+			self._forget(message)
+			return True
+
+		return False
+
+	def _forget(self, message):
+		guild_id = None if message.guild is None else message.guild.id
+		ids = self.guilds[guild_id]
+
+		del ids[message.id]
+
+		if not ids:
+			del self.guilds[guild_id]
+
+
+class MessageCache:
+	'''Stands in for the lib's message deque, split into a normal and a priority pool with per guild quotas.'''
+
+	def __init__(self, max_size, policy):
+		self.policy = policy
+
+		priority_size = int(max_size * policy.PRIORITY_SHARE)
+		normal_size = max_size - priority_size
+
+		self.normal = _Pool(normal_size, max(1, int(normal_size * policy.GUILD_SHARE)))
+		self.priority = _Pool(priority_size, max(1, int(priority_size * policy.PRIORITY_GUILD_SHARE)))
+
+	def append(self, message):
+		if self.policy.is_priority(message):
+			self.priority.add(message)
+		else:
+			self.normal.add(message)
+
+	def remove(self, message):
+		if not self.normal.remove(message) and not self.priority.remove(message):
+			raise ValueError('message not in cache')
+
+	def get(self, message_id):
+		message = self.normal.messages.get(message_id) or self.priority.messages.get(message_id)
+
+		if message is None:
+			self.policy.misses += 1
+			LOOKUPS.inc(result='miss')
+		else:
+			self.policy.hits += 1
+			LOOKUPS.inc(result='hit')
+
+		return message
+
+	def guild_counts(self):
+		'''Dict of guild id to cached message count.'''
+
+		counts = dict()
+
+		for pool in (self.normal, self.priority):
+			for guild_id, ids in pool.guilds.items():
+				counts[guild_id] = counts.get(guild_id, 0) + len(ids)
+
+		return counts
+
+	def __iter__(self):
+		yield from self.normal.messages.values()
+		yield from self.priority.messages.values()
+
+	def __reversed__(self):
+		yield from reversed(self.priority.messages.values())
+		yield from reversed(self.normal.messages.values())
+
+	def __len__(self):
+		return len(self.normal.messages) + len(self.priority.messages)
+
+	def __contains__(self, message):
+		return message.id in self.normal.messages or message.id in self.priority.messages
+
+	def __getitem__(self, idx):
+		# only here so client.cached_messages works as a sequence
+		return list(self)[idx]
+
+
+class PolicyConnectionState(AutoShardedConnectionState):
+	'''Connection state that keeps cached messages in a MessageCache instead of one shared deque.'''
+
+	def __init__(self, *args, **kwargs):
+		self.message_policy = CachePolicy()
+		super().__init__(*args, **kwargs)
+
+	@property
+	def _messages(self):
+		return self._message_cache
+
+	@_messages.setter
+	def _messages(self, messages):
+		# the lib replaces the cache with a plain deque on ready and when a guild is removed
+		if isinstance(messages, deque):
+			cache = MessageCache(self.max_messages, self.message_policy)
+
+			for message in messages:
+				cache.append(message)
+
+			messages = cache
+
+		self._message_cache = messages
+
+	def _get_message(self, msg_id):
+		return self._message_cache.get(msg_id) if self._message_cache is not None else None
@@ -0,0 +1,254 @@
+import logging
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+from aiohttp import web
+
+
+log = logging.getLogger(__name__)
+
+# latency buckets in seconds, shared by all histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+	return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+	pairs = list(zip(names, values))
+
+	if extra is not None:
+		pairs.append(extra)
+
+	if not pairs:
+		return ''
+
+	return '{' + ','.join('{0}="{1}"'.format(name, _escape(value)) for name, value in pairs) + '}'
+
+
+class Metric:
+	kind = None
+
+	def __init__(self, name, doc, labels=()):
+		self.name = name
+		self.doc = doc
+		self.label_names = tuple(labels)
+
+	def _key(self, labels):
+		return tuple(labels[name] for name in self.label_names)
+
+	def header(self):
+		return ['# HELP {0} {1}'.format(self.name, self.doc), '# TYPE {0} {1}'.format(self.name, self.kind)]
+
+	def samples(self):
+		raise NotImplementedError
+
+
+class Counter(Metric):
+	kind = 'counter'
+
+	def __init__(self, name, doc, labels=()):
+		super().__init__(name, doc, labels)
+		self.values = dict()
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		self.values[key] = self.values.get(key, 0) + amount
+
+	def samples(self):
+		for key, value in self.values.items():
+			yield '{0}{1} {2}'.format(self.name, _labels(self.label_names, key), value)
+
+
+class Histogram(Metric):
+	kind = 'histogram'
+
+	def __init__(self, name, doc, labels=(), buckets=BUCKETS):
+		super().__init__(name, doc, labels)
+		self.buckets = buckets
+		self.values = dict()
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		entry = self.values.get(key)
+
+		if entry is None:
+			# bucket counts, then sum
+			entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+		entry[0][bisect_left(self.buckets, value)] += 1
+		entry[1] += value
+
+	def samples(self):
+		for key, (counts, total) in self.values.items():
+			cumulative = 0
+
+			for bound, count in zip(self.buckets + ('+Inf',), counts):
+				cumulative += count
+				yield '{0}_bucket{1} {2}'.format(self.name, _labels(self.label_names, key, ('le', bound)), cumulative)
+
+			labels = _labels(self.label_names, key)
+			yield '{0}_sum{1} {2}'.format(self.name, labels, total)
+			yield '{0}_count{1} {2}'.format(self.name, labels, cumulative)
+
+
+class Gauge(Metric):
+	'''Value read at scrape time. The callback returns a number, or a dict of label value tuples to numbers.'''
+
+	kind = 'gauge'
+
+	def __init__(self, name, doc, callback, labels=()):
+		super().__init__(name, doc, labels)
+		self.callback = callback
+
+	def samples(self):
+		values = self.callback()
+
+		if not isinstance(values, dict):
+			values = {(): values}
+
+		for key, value in values.items():
+			yield '{0}{1} {2}'.format(self.name, _labels(self.label_names, key), value)
+
+
+class Registry:
+	def __init__(self):
+		self.metrics = dict()
+
+	def register(self, metric):
+		self.metrics[metric.name] = metric
+		return metric
+
+	def counter(self, name, doc, labels=()):
+		return self.register(Counter(name, doc, labels))
+
+	def histogram(self, name, doc, labels=(), buckets=BUCKETS):
+		return self.register(Histogram(name, doc, labels, buckets))
+
+	def gauge(self, name, doc, callback, labels=()):
+		return self.register(Gauge(name, doc, callback, labels))
+
+	def render(self):
+		lines = list()
+
+		for metric in self.metrics.values():
+			try:
+				samples = list(metric.samples())
+			except Exception:
+				log.exception('Failed collecting metric %s', metric.name)
+				continue
+
+			lines.extend(metric.header())
+			lines.extend(samples)
+
+		return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+COMMANDS = REGISTRY.counter('acebot_commands_total', 'Command invocations by outcome.', ('command', 'status'))
+COMMAND_LATENCY = REGISTRY.histogram('acebot_command_seconds', 'Time from invoke to completion or error.', ('command',))
+GATEWAY_EVENTS = REGISTRY.counter('acebot_gateway_events_total', 'Gateway dispatch events received by type.', ('type',))
+HTTP_REQUESTS = REGISTRY.counter('acebot_http_requests_total', 'Outbound HTTP requests by host and status.', ('host', 'status'))
+HTTP_LATENCY = REGISTRY.histogram('acebot_http_request_seconds', 'Outbound HTTP request latency.', ('host',))
+TASK_RUNS = REGISTRY.counter('acebot_task_runs_total', 'Background task runs by outcome.', ('task', 'status'))
+TASK_LATENCY = REGISTRY.histogram('acebot_task_seconds', 'Background task run time.', ('task',))
+
+
+def timed_task(name):
+	'''Decorator recording run count and time of a background task's coroutine. Put it below @tasks.loop.'''
+
+	def decorator(coro):
+		@wraps(coro)
+		async def wrapper(*args, **kwargs):
+			start = perf_counter()
+			status = 'error'
+
+			try:
+				result = await coro(*args, **kwargs)
+				status = 'ok'
+				return result
+			finally:
+				TASK_RUNS.inc(task=name, status=status)
+				TASK_LATENCY.observe(perf_counter() - start, task=name)
+
+		return wrapper
+
+	return decorator
+
+
+def install_bot_metrics(bot):
+	'''Register gauges that read the state of the bot, its database pool and its query stats when scraped.'''
+
+	def pool():
+		db = bot.db
+
+		if db is None:
+			return dict()
+
+		# the pool makes a holder for every slot up front and only connects them as needed. holders that aren't acquired
+		# wait in the queue, connected or not
+		size = sum(1 for ch in db._holders if ch._con is not None)
+		in_use = len(db._holders) - db._queue.qsize()
+
+		return {('size',): size, ('in_use',): in_use, ('max',): db._maxsize}
+
+	def queries():
+		if bot.query_stats is None:
+			return dict()
+
+		stats = bot.query_stats.statements.values()
+		return {('calls',): sum(stat.calls for stat in stats), ('seconds',): sum(stat.total for stat in stats)}
+
+	def messages():
+		cache = bot._connection._messages
+
+		if cache is None:
+			return dict()
+
+		return {('normal',): len(cache.normal.messages), ('priority',): len(cache.priority.messages)}
+
+	REGISTRY.gauge('acebot_db_pool_connections', 'Database pool connections.', pool, ('state',))
+	REGISTRY.gauge('acebot_db_queries', 'Statements run and time spent in them since start.', queries, ('value',))
+	REGISTRY.gauge('acebot_message_cache_size', 'Cached messages by pool.', messages, ('pool',))
+	REGISTRY.gauge('acebot_lazy_members', 'Members cached by the member policy LRU.', lambda: bot.member_policy.cached)
+	REGISTRY.gauge('acebot_guilds', 'Guilds in this process.', lambda: len(bot.guilds))
+	REGISTRY.gauge('acebot_latency_seconds', 'Gateway heartbeat latency by shard.', lambda: {
+		(shard_id,): latency for shard_id, latency in bot.latencies
+	}, ('shard',))
+	REGISTRY.gauge('acebot_command_log_pending', 'Command log records waiting to be written.', lambda: bot.command_log.depth)
+	REGISTRY.gauge('acebot_actions_in_scheduler', 'Discord actions in the action scheduler.', lambda: {
+		('queued',): bot.actions.queued, ('running',): bot.actions.running
+	}, ('state',))
+
+
+class MetricsServer:
+	'''Serves the registry in the Prometheus text format on the bot's event loop.'''
+
+	def __init__(self, host, port, registry=REGISTRY):
+		self.host = host
+		self.port = port
+		self.registry = registry
+
+		self.runner = None
+
+	async def handle(self, request):
+		return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+	async def start(self):
+		app = web.Application()
+		app.router.add_get('/metrics', self.handle)
+
+		self.runner = web.AppRunner(app, access_log=None)
+		await self.runner.setup()
+
+		site = web.TCPSite(self.runner, self.host, self.port)
+		await site.start()
+
+		log.info('Serving metrics on http://%s:%s/metrics', self.host, self.port)
+
+	async def close(self):
+		if self.runner is not None:
+			await self.runner.cleanup()
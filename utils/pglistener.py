@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+from uuid import uuid4
+
+import asyncpg
+
+
+log = logging.getLogger(__name__)
+
+
+class PostgresListener:
+	'''Listens on a Postgres notification channel with a dedicated connection, reconnecting when it drops.
+
+	Payloads are JSON objects tagged with a per-process origin id so a process can tell its own notifications apart.'''
+
+	KEEPALIVE = 30.0
+	RECONNECT_DELAY = 15.0
+
+	def __init__(self, bot, dsn, channel):
+		self.bot = bot
+		self.dsn = dsn
+		self.channel = channel
+
+		self.origin = uuid4().hex
+
+		self.received = 0
+		self.published = 0
+
+		self.con = None
+		self.task = None
+
+		self._listening = False
+
+	@property
+	def connected(self):
+		'''True while the connection is up and listening.'''
+
+		return self._listening and not self.con.is_closed()
+
+	def start(self):
+		if self.task is None or self.task.done():
+			self.task = self.bot.loop.create_task(self.run())
+
+	async def close(self):
+		if self.task is not None:
+			self.task.cancel()
+
+		if self.con is not None and not self.con.is_closed():
+			await self.con.close()
+
+	async def run(self):
+		connected_before = False
+
+		while True:
+			try:
+				self.con = await asyncpg.connect(self.dsn)
+				await self.con.add_listener(self.channel, self._on_notification)
+				self._listening = True
+			except asyncio.CancelledError:
+				raise
+			except Exception as exc:
+				log.warning(
+					'Listener for %s failed connecting: %r, retrying in %s seconds',
+					self.channel, exc, self.RECONNECT_DELAY
+				)
+
+				self._terminate()
+
+				await asyncio.sleep(self.RECONNECT_DELAY)
+				continue
+
+			if connected_before:
+				log.info('Listener for %s reconnected', self.channel)
+				self.on_reconnect()
+
+			connected_before = True
+
+			try:
+				while True:
+					await asyncio.sleep(self.KEEPALIVE)
+					await self.con.execute('SELECT 1', timeout=self.KEEPALIVE)
+			except asyncio.CancelledError:
+				raise
+			except Exception as exc:
+				log.warning('Listener for %s lost connection: %r', self.channel, exc)
+
+			self._terminate()
+
+	def _terminate(self):
+		self._listening = False
+
+		if self.con is not None and not self.con.is_closed():
+			self.con.terminate()
+
+	async def notify(self, payloads, con=None):
+		'''Send payloads (dicts) on the channel. If con is in a transaction, delivery happens on commit.'''
+
+		payloads = list(json.dumps(dict(origin=self.origin, **payload)) for payload in payloads)
+
+		if not payloads:
+			return
+
+		await (con or self.bot.db).execute(
+			'SELECT pg_notify($1, payload) FROM unnest($2::TEXT[]) AS payload', self.channel, payloads
+		)
+
+		self.published += len(payloads)
+
+	def _on_notification(self, con, pid, channel, payload):
+		try:
+			data = json.loads(payload)
+		except ValueError:
+			log.warning('Listener for %s got malformed payload: %s', self.channel, payload)
+			return
+
+		self.received += 1
+		self.on_notification(data, data.pop('origin', None) == self.origin)
+
+	def on_notification(self, data, own):
+		'''Called with each payload received on the channel. own is True if this process sent it.'''
+
+		pass
+
+	def on_reconnect(self):
+		'''Called after the connection came back, notifications sent while it was down are lost.'''
+
+		pass
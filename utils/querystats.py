@@ -0,0 +1,158 @@
+import logging
+import re
+import sys
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+import asyncpg
+
+
+log = logging.getLogger(__name__)
+
+# qualified name of the command currently being invoked, set by the bot before invoking
+current_command = ContextVar('current_command', default=None)
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class StatementStats:
+	__slots__ = ('query', 'calls', 'total', 'max', 'rows', 'buckets', 'origins')
+
+	def __init__(self, query, bucket_count):
+		self.query = query
+		self.calls = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.rows = 0
+		self.buckets = [0] * bucket_count
+		self.origins = Counter()
+
+	@property
+	def avg(self):
+		return self.total / self.calls if self.calls else 0.0
+
+	def percentile(self, bounds, pct):
+		'''Upper bound of the histogram bucket the percentile falls in. None if past the last bucket.'''
+
+		target = self.calls * pct
+		seen = 0
+
+		for bound, count in zip(bounds, self.buckets):
+			seen += count
+			if seen >= target:
+				return bound
+
+		return None
+
+
+class QueryStats:
+	'''Records latency, call count, rows and origin of every statement run through asyncpg connections.'''
+
+	# histogram bucket upper bounds, in seconds. the last bucket catches everything slower
+	BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+	# distinct statements tracked before the rest gets lumped together
+	MAX_STATEMENTS = 2000
+	OTHER = '<other statements>'
+
+	def __init__(self, slow_threshold=0.25):
+		self.slow_threshold = slow_threshold
+		self.statements = dict()
+
+	def install(self):
+		'''Wrap asyncpg's statement execution so every query gets recorded.'''
+
+		stats = self
+
+		old_execute = asyncpg.Connection._execute
+		old_executemany = asyncpg.Connection._executemany
+
+		async def _execute(con, query, args, limit, timeout, return_status=False):
+			log.debug(query)
+
+			start = perf_counter()
+			result = await old_execute(con, query, args, limit, timeout, return_status)
+
+			stats.record(query, perf_counter() - start, result, return_status)
+			return result
+
+		async def _executemany(con, query, args, timeout):
+			log.debug(query)
+
+			start = perf_counter()
+			result = await old_executemany(con, query, args, timeout)
+
+			stats.record(query, perf_counter() - start, None, False)
+			return result
+
+		asyncpg.Connection._execute = _execute
+		asyncpg.Connection._executemany = _executemany
+
+	def record(self, query, elapsed, result, with_status):
+		rows = self._count_rows(result, with_status)
+		origin = self._origin()
+
+		key = WHITESPACE.sub(' ', query).strip()
+		stat = self.statements.get(key)
+
+		if stat is None:
+			if len(self.statements) >= self.MAX_STATEMENTS:
+				key = self.OTHER
+				stat = self.statements.get(key)
+
+			if stat is None:
+				stat = self.statements[key] = StatementStats(key, len(self.BOUNDS) + 1)
+
+		stat.calls += 1
+		stat.total += elapsed
+		stat.max = max(stat.max, elapsed)
+		stat.rows += rows
+		stat.buckets[bisect_left(self.BOUNDS, elapsed)] += 1
+		stat.origins[origin] += 1
+
+		if self.slow_threshold is not None and elapsed >= self.slow_threshold:
+			log.warning('Slow query (%.0f ms, %s rows) from %s: %s', elapsed * 1000, rows, origin, key)
+
+	def _count_rows(self, result, with_status):
+		if with_status:
+			# (records, status, completed). status looks like 'UPDATE 3'
+			records, status = result[0], result[1]
+
+			if records:
+				return len(records)
+
+			if status:
+				count = status.rpartition(b' ' if isinstance(status, bytes) else ' ')[2]
+				if count.isdigit():
+					return int(count)
+
+			return 0
+
+		return len(result) if isinstance(result, list) else 0
+
+	def _origin(self):
+		'''Name of the cog module that ran the query, and the command it ran under if any.'''
+
+		command = current_command.get()
+		frame = sys._getframe(3)
+
+		while frame is not None:
+			module = frame.f_globals.get('__name__', '')
+			if module.startswith('cogs.'):
+				break
+			frame = frame.f_back
+
+		cog = 'bot' if frame is None else frame.f_globals['__name__']
+
+		if command is None:
+			return cog
+
+		return '{0} ({1})'.format(cog, command)
+
+	def top(self, count=10, key='total'):
+		return sorted(self.statements.values(), key=lambda stat: getattr(stat, key), reverse=True)[:count]
+
+	def reset(self):
+		self.statements.clear()
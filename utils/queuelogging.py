@@ -0,0 +1,39 @@
+import logging.handlers
+import queue
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+	'''Hands log records to a background thread through a bounded queue.
+
+	Formatting and I/O happen on the listener thread. If the queue is full the record is dropped and counted, so the
+	thread that logged never blocks.'''
+
+	def __init__(self, handlers, max_size=10000):
+		super().__init__(queue.Queue(maxsize=max_size))
+
+		self.max_size = max_size
+		self.dropped = 0
+
+		self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+	@property
+	def depth(self):
+		return self.queue.qsize()
+
+	def prepare(self, record):
+		# formatting is the listener's job
+		return record
+
+	def enqueue(self, record):
+		try:
+			self.queue.put_nowait(record)
+		except queue.Full:
+			self.dropped += 1
+
+	def start(self):
+		self.listener.start()
+
+	def stop(self):
+		'''Stops the listener thread after it has handled everything already queued.'''
+
+		self.listener.stop()
@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import sys
+from collections import OrderedDict
+from time import monotonic
+
+
+log = logging.getLogger(__name__)
+
+
+# rough size of a cached row apart from its content: the dict, its other values and the name lookups
+ROW_OVERHEAD = 1000
+
+
+def record_size(record):
+	return ROW_OVERHEAD + sys.getsizeof(record['content'])
+
+
+class _GuildTags:
+	__slots__ = ('by_id', 'by_name', 'size')
+
+	def __init__(self):
+		self.by_id = dict()  # tag id -> record
+		self.by_name = dict()  # name and alias -> tag id
+		self.size = 0
+
+	def add(self, record):
+		self.by_id[record['id']] = record
+		self.by_name[record['name']] = record['id']
+
+		if record['alias'] is not None:
+			self.by_name[record['alias']] = record['id']
+
+		self.size += record_size(record)
+
+	def discard(self, tag_id):
+		record = self.by_id.pop(tag_id, None)
+
+		if record is None:
+			return None
+
+		for name in (record['name'], record['alias']):
+			if name is not None and self.by_name.get(name) == tag_id:
+				del self.by_name[name]
+
+		self.size -= record_size(record)
+
+		return record
+
+	def get(self, name):
+		tag_id = self.by_name.get(name)
+		return None if tag_id is None else self.by_id[tag_id]
+
+
+class TagIndex:
+	'''Every tag of recently used guilds in memory, looked up by name or alias.
+
+	A guild's tags are loaded in one query the first time one of them is looked up. The least recently used guilds are
+	evicted once the cached rows take up more than about max_size bytes, mostly their content. Guilds too big for that on
+	their own are queried per lookup, and checked again after OVERSIZED_TTL seconds in case they shrank.
+
+	Anything that writes to the tag table has to tell the index afterwards through put(), update() or remove(). Guilds
+	only live on one cluster, so there's nobody else to tell.'''
+
+	GET_QUERY = 'SELECT * FROM tag WHERE guild_id=$1 AND (name=$2 OR alias=$2)'
+
+	SIZE_QUERY = 'SELECT COUNT(id) * {0} + COALESCE(SUM(octet_length(content)), 0) FROM tag WHERE guild_id=$1'.format(
+		ROW_OVERHEAD
+	)
+
+	OVERSIZED_TTL = 600.0
+
+	def __init__(self, bot, max_size=16 * 1024 * 1024):
+		self.bot = bot
+		self.max_size = max_size
+
+		self._guilds = OrderedDict()
+		self._size = 0
+		self._tags = 0
+
+		# guilds too big to index, mapped to when that was found
+		self._oversized = dict()
+
+		# guilds currently being loaded, mapped to an event set when the load is done
+		self._loading = dict()
+
+		# guilds written to while being loaded
+		self._stale = set()
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	@property
+	def stats(self):
+		return dict(
+			guilds=len(self._guilds),
+			tags=self._tags,
+			size=self._size,
+			oversized=len(self._oversized),
+			hits=self.hits,
+			misses=self.misses,
+			evictions=self.evictions,
+		)
+
+	async def get(self, guild_id, name):
+		'''The tag with this name or alias, or None.'''
+
+		guild = await self._get_guild(guild_id)
+
+		if guild is None:
+			record = await self.bot.db.fetchrow(self.GET_QUERY, guild_id, name)
+			return None if record is None else dict(record)
+
+		return guild.get(name)
+
+	def put(self, record):
+		'''Index a newly created tag.'''
+
+		guild = self._touch(record['guild_id'])
+
+		if guild is None:
+			return
+
+		self._resize(guild, lambda: guild.add(dict(record)))
+		self._tags += 1
+
+		self._trim()
+
+	def update(self, guild_id, tag_id, **changes):
+		'''Change columns of an indexed tag.'''
+
+		guild = self._touch(guild_id)
+
+		if guild is None:
+			return
+
+		record = guild.by_id.get(tag_id)
+
+		if record is None:
+			return
+
+		def change():
+			guild.discard(tag_id)
+			record.update(changes)
+			guild.add(record)
+
+		self._resize(guild, change)
+		self._trim()
+
+	def remove(self, guild_id, tag_id):
+		'''Forget a deleted tag.'''
+
+		guild = self._touch(guild_id)
+
+		if guild is not None and tag_id in guild.by_id:
+			self._resize(guild, lambda: guild.discard(tag_id))
+			self._tags -= 1
+
+	def evict(self, guild_id):
+		guild = self._guilds.pop(guild_id, None)
+
+		if guild is not None:
+			self._size -= guild.size
+			self._tags -= len(guild.by_id)
+			self.evictions += 1
+
+	def _touch(self, guild_id):
+		if guild_id in self._loading:
+			self._stale.add(guild_id)
+
+		return self._guilds.get(guild_id)
+
+	def _resize(self, guild, change):
+		before = guild.size
+		change()
+		self._size += guild.size - before
+
+	def _trim(self):
+		# the size estimates differ a little from the size query, so the newest guild is kept even if it's a bit over
+		while self._size > self.max_size and len(self._guilds) > 1:
+			self.evict(next(iter(self._guilds)))
+
+	async def _get_guild(self, guild_id):
+		while True:
+			guild = self._guilds.get(guild_id)
+
+			if guild is not None:
+				self.hits += 1
+				self._guilds.move_to_end(guild_id)
+				return guild
+
+			if self._is_oversized(guild_id):
+				self.misses += 1
+				return None
+
+			# if someone else is already loading this guild, wait for them and check again
+			loading = self._loading.get(guild_id)
+			if loading is None:
+				break
+
+			await loading.wait()
+
+		self.misses += 1
+
+		loading = asyncio.Event()
+		self._loading[guild_id] = loading
+
+		try:
+			guild = await self._load(guild_id)
+		finally:
+			self._loading.pop(guild_id, None)
+			loading.set()
+
+		return guild
+
+	def _is_oversized(self, guild_id):
+		found_at = self._oversized.get(guild_id)
+
+		if found_at is None:
+			return False
+
+		if monotonic() - found_at > self.OVERSIZED_TTL:
+			del self._oversized[guild_id]
+			return False
+
+		return True
+
+	async def _load(self, guild_id):
+		# sized up first so a huge guild isn't pulled into memory only to be thrown away
+		if await self.bot.db.fetchval(self.SIZE_QUERY, guild_id) > self.max_size:
+			log.info('Guild %s has too many tags to index', guild_id)
+			self._oversized[guild_id] = monotonic()
+			self._stale.discard(guild_id)
+			return None
+
+		records = await self.bot.db.fetch('SELECT * FROM tag WHERE guild_id=$1', guild_id)
+
+		guild = _GuildTags()
+
+		for record in records:
+			guild.add(dict(record))
+
+		# written to while we were fetching, so what we got may be outdated. use it this once but don't keep it
+		if guild_id in self._stale:
+			self._stale.discard(guild_id)
+			return guild
+
+		self._guilds[guild_id] = guild
+		self._size += guild.size
+		self._tags += len(records)
+
+		self._trim()
+
+		log.debug('Indexed %s tags for guild %s', len(records), guild_id)
+
+		return guild
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from time import perf_counter
+
+
+log = logging.getLogger(__name__)
+
+
+class _Uses:
+	__slots__ = ('guild_id', 'count', 'viewed_at')
+
+	def __init__(self, guild_id):
+		self.guild_id = guild_id
+		self.count = 0
+		self.viewed_at = None
+
+
+class TagUseBuffer:
+	'''Counts tag uses in memory and adds them to the tag table in one statement every interval seconds.
+
+	Counts are added to what's in the database instead of overwriting it, so concurrent views are never lost. Until
+	they're written, use uses() and viewed_at() to see a tag's counts including the pending ones. If an index is given,
+	its rows are updated with the written values after every flush.'''
+
+	FLUSH_QUERY = '''
+		UPDATE tag SET uses = tag.uses + pending.count, viewed_at = GREATEST(tag.viewed_at, pending.viewed_at)
+		FROM unnest($1::INT[], $2::INT[], $3::TIMESTAMP[]) AS pending (id, count, viewed_at)
+		WHERE tag.id = pending.id
+		RETURNING tag.id, tag.guild_id, tag.uses, tag.viewed_at
+	'''
+
+	def __init__(self, bot, index=None, interval=30.0):
+		self.bot = bot
+		self.index = index
+		self.interval = interval
+
+		self._pending = dict()  # tag id -> _Uses
+
+		# uses being written right now, still counted as pending until the index has the written values
+		self._flushing = dict()
+
+		self.added = 0
+		self.flushed = 0
+		self.last_flush_latency = None
+
+		self._lock = asyncio.Lock()
+		self._closing = asyncio.Event()
+
+		self.task = self.bot.loop.create_task(self.flusher())
+
+	@property
+	def depth(self):
+		'''Amount of tags with uses waiting to be written.'''
+
+		return len(self._pending)
+
+	def add(self, record, viewed_at):
+		uses = self._pending.get(record.get('id'))
+
+		if uses is None:
+			uses = self._pending[record.get('id')] = _Uses(record.get('guild_id'))
+
+		uses.count += 1
+		uses.viewed_at = viewed_at if uses.viewed_at is None else max(uses.viewed_at, viewed_at)
+
+		self.added += 1
+
+	def discard(self, tag_id):
+		'''Drop pending uses of a deleted tag.'''
+
+		self._pending.pop(tag_id, None)
+
+	def _all_pending(self, tag_id):
+		return (uses for uses in (self._flushing.get(tag_id), self._pending.get(tag_id)) if uses is not None)
+
+	def pending(self, tag_id):
+		return sum(uses.count for uses in self._all_pending(tag_id))
+
+	def uses(self, record):
+		'''Uses of a tag record including pending ones.'''
+
+		return record.get('uses') + self.pending(record.get('id'))
+
+	def viewed_at(self, record):
+		'''Last view of a tag record including pending ones.'''
+
+		views = list(uses.viewed_at for uses in self._all_pending(record.get('id')))
+
+		if record.get('viewed_at') is not None:
+			views.append(record.get('viewed_at'))
+
+		return max(views, default=None)
+
+	def guild_pending(self, guild_id):
+		'''Pending use counts of a guild's tags, by tag id.'''
+
+		counts = dict()
+
+		for pending in (self._flushing, self._pending):
+			for tag_id, uses in pending.items():
+				if uses.guild_id == guild_id:
+					counts[tag_id] = counts.get(tag_id, 0) + uses.count
+
+		return counts
+
+	async def flusher(self):
+		while not self._closing.is_set():
+			try:
+				await asyncio.wait_for(self._closing.wait(), timeout=self.interval)
+			except asyncio.TimeoutError:
+				pass
+
+			try:
+				await self.flush()
+			except asyncio.CancelledError:
+				raise
+			except Exception as exc:
+				log.warning('Failed writing uses of %s tags: %r', self.depth, exc)
+
+	async def flush(self):
+		'''Write all pending uses. Returns the amount of tags updated.'''
+
+		async with self._lock:
+			if not self._pending:
+				return 0
+
+			pending, self._pending = self._pending, dict()
+			self._flushing = pending
+
+			start = perf_counter()
+
+			ids = list(pending.keys())
+
+			try:
+				records = await self.bot.db.fetch(
+					self.FLUSH_QUERY,
+					ids, [pending[tag_id].count for tag_id in ids], [pending[tag_id].viewed_at for tag_id in ids]
+				)
+			except Exception:
+				self._flushing = dict()
+
+				# merge them back in with anything counted in the meantime so nothing is lost
+				for tag_id, uses in pending.items():
+					current = self._pending.get(tag_id)
+
+					if current is None:
+						self._pending[tag_id] = uses
+					else:
+						current.count += uses.count
+						current.viewed_at = max(current.viewed_at, uses.viewed_at)
+
+				raise
+
+			if self.index is not None:
+				for record in records:
+					self.index.update(record.get('guild_id'), record.get('id'), uses=record.get('uses'), viewed_at=record.get('viewed_at'))
+
+			self._flushing = dict()
+
+			latency = perf_counter() - start
+
+			self.flushed += len(records)
+			self.last_flush_latency = latency
+
+			log.debug('Wrote uses of %s tags in %.2f ms', len(records), latency * 1000)
+
+			return len(records)
+
+	async def close(self):
+		# let the flusher finish a write it's in the middle of instead of cancelling it
+		self._closing.set()
+
+		await self.task
+
+		try:
+			await self.flush()
+		except Exception as exc:
+			log.warning('Failed writing uses of %s tags on shutdown: %r', self.depth, exc)
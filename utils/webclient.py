@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import random
+from collections import OrderedDict
+from time import monotonic, perf_counter
+
+import aiohttp
+from yarl import URL
+
+from utils.metrics import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+CACHE_RESULTS = REGISTRY.counter(
+	'acebot_web_cache_total', 'Outbound GET cache results by host.', ('host', 'result')
+)
+
+# statuses worth trying again
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# decoder for WebResponse.json, swapped for a faster one by the fast runtime
+json_loads = json.loads
+
+
+class WebResponse:
+	'''A fully read response. Safe to keep around and hand out more than once.'''
+
+	__slots__ = ('status', 'url', 'headers', 'body')
+
+	def __init__(self, status, url, headers, body):
+		self.status = status
+		self.url = url
+		self.headers = headers
+		self.body = body
+
+	def text(self, encoding='utf-8'):
+		return self.body.decode(encoding, errors='replace')
+
+	def json(self, loads=None):
+		return (loads or json_loads)(self.body)
+
+
+class HostStats:
+	__slots__ = ('requests', 'hits', 'revalidated', 'misses', 'retries', 'errors', 'total', 'max')
+
+	def __init__(self):
+		self.requests = 0
+		self.hits = 0
+		self.revalidated = 0
+		self.misses = 0
+		self.retries = 0
+		self.errors = 0
+		self.total = 0.0
+		self.max = 0.0
+
+	@property
+	def avg(self):
+		return self.total / self.requests if self.requests else 0.0
+
+	@property
+	def hit_rate(self):
+		lookups = self.hits + self.revalidated + self.misses
+		return (self.hits + self.revalidated) / lookups if lookups else None
+
+
+class _Entry:
+	__slots__ = ('response', 'expires', 'etag', 'last_modified')
+
+	def __init__(self, response, expires, etag, last_modified):
+		self.response = response
+		self.expires = expires
+		self.etag = etag
+		self.last_modified = last_modified
+
+
+class WebClient:
+	'''Wraps the bot's aiohttp session with per-host concurrency limits, retries and a response cache for GETs.
+
+	Responses asked for with a ttl are served from memory until it runs out. After that, if the server sent an ETag or
+	Last-Modified header, the next request is a conditional one and a 304 keeps the cached body.
+
+	A response asking to retry after more than max_retry_after seconds is returned as is instead of waited on.'''
+
+	# concurrent requests per host, unless listed in host_limits
+	DEFAULT_HOST_LIMIT = 8
+
+	def __init__(self, session, max_entries=512, retries=2, backoff=0.5, host_limits=None, max_retry_after=30.0):
+		self.session = session
+		self.max_entries = max_entries
+		self.retries = retries
+		self.backoff = backoff
+		self.host_limits = host_limits or dict()
+		self.max_retry_after = max_retry_after
+
+		self.stats = dict()
+
+		self._cache = OrderedDict()
+		self._semaphores = dict()
+
+		self.interactive = InteractiveWebClient(self)
+
+	def _semaphore(self, host):
+		semaphore = self._semaphores.get(host)
+
+		if semaphore is None:
+			semaphore = self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.DEFAULT_HOST_LIMIT))
+
+		return semaphore
+
+	def _stats(self, host):
+		stats = self.stats.get(host)
+
+		if stats is None:
+			stats = self.stats[host] = HostStats()
+
+		return stats
+
+	async def get(self, url, *, params=None, headers=None, ttl=None, **kwargs):
+		'''GET a url. With a ttl (in seconds) the response is cached. Only 200 responses are cached.
+
+		Raises aiohttp.ClientError or asyncio.TimeoutError if all attempts fail.'''
+
+		url = URL(url)
+		if params:
+			url = url.update_query(params)
+
+		host = url.host
+		stats = self._stats(host)
+
+		key = None
+		entry = None
+
+		if ttl is not None:
+			key = (str(url), tuple(sorted((headers or dict()).items())))
+			entry = self._cache.get(key)
+
+			if entry is not None:
+				self._cache.move_to_end(key)
+
+				if entry.expires > monotonic():
+					stats.hits += 1
+					CACHE_RESULTS.inc(host=host, result='hit')
+					return entry.response
+
+				# stale, but the server might tell us it's unchanged
+				if entry.etag is not None or entry.last_modified is not None:
+					headers = dict(headers or dict())
+
+					if entry.etag is not None:
+						headers['If-None-Match'] = entry.etag
+
+					if entry.last_modified is not None:
+						headers['If-Modified-Since'] = entry.last_modified
+
+		response = await self.request('GET', url, headers=headers, **kwargs)
+
+		if key is None:
+			return response
+
+		if response.status == 304 and entry is not None:
+			stats.revalidated += 1
+			CACHE_RESULTS.inc(host=host, result='revalidated')
+
+			entry.expires = monotonic() + ttl
+			return entry.response
+
+		stats.misses += 1
+		CACHE_RESULTS.inc(host=host, result='miss')
+
+		if response.status == 200:
+			self._cache[key] = _Entry(
+				response, monotonic() + ttl, response.headers.get('ETag'), response.headers.get('Last-Modified')
+			)
+
+			while len(self._cache) > self.max_entries:
+				self._cache.popitem(last=False)
+
+		return response
+
+	async def request(self, method, url, *, retries=None, max_retry_after=None, **kwargs):
+		'''Make a request and read the body. Connection errors, timeouts and 429/5xx responses are retried.'''
+
+		url = URL(url)
+		stats = self._stats(url.host)
+
+		attempts = 1 + (self.retries if retries is None else retries)
+		max_retry_after = self.max_retry_after if max_retry_after is None else max_retry_after
+
+		for attempt in range(attempts):
+			last = attempt == attempts - 1
+
+			try:
+				response = await self._attempt(method, url, stats, **kwargs)
+			except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+				stats.errors += 1
+
+				if last:
+					raise
+
+				log.debug('%s %s failed with %s, retrying', method, url, exc.__class__.__name__)
+				delay = self._delay(attempt)
+			else:
+				if response.status not in RETRY_STATUSES or last:
+					return response
+
+				delay = self._delay(attempt, response.headers.get('Retry-After'))
+
+				if delay > max_retry_after:
+					log.debug('%s %s got %s, not waiting %.1fs to retry', method, url, response.status, delay)
+					return response
+
+				log.debug('%s %s got %s, retrying', method, url, response.status)
+
+			stats.retries += 1
+			await asyncio.sleep(delay)
+
+	async def _attempt(self, method, url, stats, **kwargs):
+		async with self._semaphore(url.host):
+			stats.requests += 1
+			start = perf_counter()
+
+			try:
+				async with self.session.request(method, url, **kwargs) as resp:
+					return WebResponse(resp.status, resp.url, resp.headers, await resp.read())
+			finally:
+				elapsed = perf_counter() - start
+				stats.total += elapsed
+				stats.max = max(stats.max, elapsed)
+
+	def _delay(self, attempt, retry_after=None):
+		if retry_after is not None:
+			try:
+				return float(retry_after)
+			except ValueError:
+				pass
+
+		# full jitter, so a burst of failing requests doesn't retry in lockstep
+		return random.uniform(0, self.backoff * 2 ** attempt)
+
+	def clear(self):
+		self._cache.clear()
+
+
+class InteractiveWebClient:
+	'''The web client as used by commands. Someone is waiting on the reply, so long Retry-After waits fail fast.'''
+
+	def __init__(self, client, max_retry_after=3.0):
+		self.client = client
+		self.max_retry_after = max_retry_after
+
+	async def get(self, url, **kwargs):
+		kwargs.setdefault('max_retry_after', self.max_retry_after)
+		return await self.client.get(url, **kwargs)
+
+	async def request(self, method, url, **kwargs):
+		kwargs.setdefault('max_retry_after', self.max_retry_after)
+		return await self.client.request(method, url, **kwargs)